@@ -0,0 +1,364 @@
+from importlib.util import find_spec
+from collections import defaultdict, Counter
+from difflib import SequenceMatcher, get_close_matches
+from dotenv import dotenv_values
+import numpy as np
+import subprocess
+import threading
+import random
+import json
+import time
+import sys
+import os
+import re
+
+try:
+    from Backend.Tracing import Span
+except ModuleNotFoundError:
+    from Tracing import Span
+
+# Installed-application index for Automation.OpenApp and CloseApp.
+#
+# AppOpener reads its whole app list (AppOpener\Data\data.json) and runs
+# difflib.get_close_matches over every name on each command. AppIndex loads
+# that list once, keeps it in Data\AppIndex.json together with the learned
+# aliases, and checks in the background whether AppOpener's list has changed.
+#
+# FuzzyIndex returns exactly what get_close_matches(word, names, n=1,
+# cutoff=0.6) returns, without comparing against every name: a trigram index
+# picks a few likely names whose difflib ratio sets a score to beat, and a
+# per-name character count matrix gives difflib's quick_ratio (an upper bound
+# of the real ratio) for all names at once. Only names whose bound reaches
+# the best score so far are compared with SequenceMatcher.
+#
+#   python AppIndex.py bench [apps] [queries]   synthetic catalogue benchmark
+#   python AppIndex.py find <name>
+#   python AppIndex.py alias "<spoken name>" "<app name>"
+
+env_vars = dotenv_values(".env")
+AppIndexRefreshMinutes = float(env_vars.get("AppIndexRefreshMinutes") or 30)
+APP_INDEX_FILE = os.path.join("Data", "AppIndex.json")
+APP_ALIASES_FILE = os.path.join("Data", "AppAliases.json")
+CUTOFF = 0.6
+SEED_CANDIDATES = 8
+
+# AppOpener's own clean-up of an app name given to open() and close()
+OPEN_NAME_CHARS = re.compile(r'[^a-zA-Z-^0-9?,>&]')
+CLOSE_NAME_CHARS = re.compile(r'[^a-zA-Z-^0-9?,>&+.]')
+EXPLORER_NAMES = ("file explorer", "explorer")
+
+def NormalizeAppName(name):
+    return OPEN_NAME_CHARS.sub(" ", name.lower()).strip()
+
+def Trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class FuzzyIndex:
+    def __init__(self, names):
+        self.names = list(dict.fromkeys(names))
+        self.positions = {name: i for i, name in enumerate(self.names)}
+        self.lengths = np.array([len(name) for name in self.names], dtype=np.float64)
+        self.alphabet = {c: i for i, c in enumerate(sorted(set("".join(self.names))))}
+        # One row per character, one column per name, so a query reads whole rows
+        self.counts = np.zeros((max(1, len(self.alphabet)), len(self.names)), dtype=np.uint16)
+        postings = defaultdict(list)
+        for row, name in enumerate(self.names):
+            for c, count in Counter(name).items():
+                self.counts[self.alphabet[c], row] = min(count, 65535)
+            for trigram in Trigrams(name):
+                postings[trigram].append(row)
+        self.postings = {trigram: np.array(rows, dtype=np.int32) for trigram, rows in postings.items()}
+        # Trigrams shared by a large share of the names don't tell them apart
+        self.common = max(50, len(self.names) // 10)
+
+    def __len__(self):
+        return len(self.names)
+
+    def Ratio(self, matcher, row):
+        matcher.set_seq1(self.names[row])
+        return matcher.ratio()
+
+    def Match(self, word, cutoff=CUTOFF):
+        # Same result as get_close_matches(word, names, n=1, cutoff=cutoff), or None
+        if not self.names:
+            return None
+        if word in self.positions:
+            return word
+        matcher = SequenceMatcher()
+        matcher.set_seq2(word)
+        best = (cutoff, "")  # (ratio, name); ties go to the larger name, like nlargest
+        found = False
+
+        # Seed the score to beat from the names sharing the most trigrams
+        lists = [rows for rows in map(self.postings.get, Trigrams(word))
+                 if rows is not None and len(rows) <= self.common]
+        checked = set()
+        if lists:
+            shared = np.bincount(np.concatenate(lists), minlength=len(self.names))
+            seeds = np.argpartition(-shared, SEED_CANDIDATES)[:SEED_CANDIDATES] if len(self.names) > SEED_CANDIDATES else np.arange(len(self.names))
+            seeds = [row for row in seeds.tolist() if shared[row]]
+        else:
+            seeds = []
+        for row in seeds:
+            checked.add(row)
+            score = self.Ratio(matcher, row)
+            if (score, self.names[row]) >= best:
+                best, found = (score, self.names[row]), True
+
+        # quick_ratio for every name: 2 * shared characters / total length
+        common = np.zeros(len(self.names), dtype=np.int32)
+        for c, count in Counter(word).items():
+            if c in self.alphabet:
+                common += np.minimum(self.counts[self.alphabet[c]], min(count, 65535))
+        bounds = 2.0 * common / (self.lengths + len(word))
+        rows = np.nonzero(bounds >= best[0])[0]
+        for row in rows[np.argsort(-bounds[rows], kind="stable")]:
+            if bounds[row] < best[0]:
+                break
+            if row in checked:
+                continue
+            score = self.Ratio(matcher, row)
+            if (score, self.names[row]) >= best:
+                best, found = (score, self.names[row]), True
+        return best[1] if found else None
+
+def AppOpenerCatalogue():
+    # AppOpener's app list (name -> AppID), without importing AppOpener, which
+    # rebuilds the list with PowerShell on import when it is missing
+    spec = find_spec("AppOpener")
+    if spec is None or not spec.submodule_search_locations:
+        return None
+    return os.path.join(list(spec.submodule_search_locations)[0], "Data", "data.json")
+
+class AppIndex:
+    def __init__(self, apps, aliases=None, source=None, mtime=None):
+        self.apps = apps  # normalized name -> launch target (AppID)
+        self.aliases = aliases or {}  # spoken name -> {"app": name, "learned": bool}
+        self.source = source
+        self.mtime = mtime
+        self.fuzzy = FuzzyIndex(apps)
+        self.lock = threading.Lock()
+
+    def Resolve(self, spoken):
+        # (app name, launch target) for a spoken name, or None; fuzzy matches are learned
+        name = NormalizeAppName(spoken)
+        if not name:
+            return None
+        if name in self.apps:
+            return name, self.apps[name]
+        with self.lock:
+            alias = self.aliases.get(name)
+        if alias and alias["app"] in self.apps:
+            return alias["app"], self.apps[alias["app"]]
+        match = self.fuzzy.Match(name)
+        if match is None:
+            return None
+        with self.lock:
+            self.aliases[name] = {"app": match, "learned": True}
+        SaveAliases(self.aliases)
+        return match, self.apps[match]
+
+    def Teach(self, spoken, app):
+        # A hand-made alias, e.g. Teach("browser", "google chrome")
+        name = NormalizeAppName(app)
+        if name not in self.apps:
+            raise KeyError(f"{app} is not an installed application")
+        with self.lock:
+            self.aliases[NormalizeAppName(spoken)] = {"app": name, "learned": False}
+        SaveAliases(self.aliases)
+
+    def Launch(self, spoken):
+        # Opens the app the way AppOpener does; False if nothing matched
+        with Span("automation.app_lookup"):
+            resolved = self.Resolve(spoken)
+        if resolved is None:
+            return False
+        name, target = resolved
+        subprocess.Popen(["explorer", f"shell:appsFolder\\{target}"])
+        print(f"[AppIndex] Opening {name}")
+        return True
+
+def RunningProcessNames():
+    # One pass over the process table; processes we can't read are skipped, as in AppOpener
+    import psutil
+    return [p.info["name"] for p in psutil.process_iter(["name"]) if p.info.get("name")]
+
+def CloseRunningApp(spoken):
+    # AppOpener's close(match_closest=True): the closest running "<name>.exe".
+    # The running processes change all the time, so they aren't indexed; a
+    # plain get_close_matches over a few hundred names is fast enough.
+    name = CLOSE_NAME_CHARS.sub(" ", spoken.lower()).strip()
+    if not name:
+        return False
+    wanted = name if name.endswith(".exe") else name + ".exe"
+    with Span("automation.app_lookup", action="close"):
+        match = get_close_matches(wanted, RunningProcessNames(), n=1, cutoff=CUTOFF)
+    if not match:
+        return False
+    if match[0].replace(".exe", "").strip() in EXPLORER_NAMES:
+        # Explorer windows are closed one by one rather than killing the shell
+        from AppOpener import close
+        close(spoken, match_closest=True, output=True, throw_error=True)
+        return True
+    result = subprocess.run(["taskkill", "/f", "/im", match[0]], capture_output=True)
+    if result.returncode == 0:
+        print(f"[AppIndex] Closed {match[0]}")
+    return result.returncode == 0
+
+def LoadJson(path, default):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return default
+
+def WriteJson(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp = path + ".tmp"
+    with open(temp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=1)
+    os.replace(temp, path)
+
+AliasLock = threading.Lock()
+
+def SaveAliases(aliases):
+    with AliasLock:
+        WriteJson(APP_ALIASES_FILE, dict(aliases))
+
+def BuildIndex(source):
+    # Reads AppOpener's list; the names there are already in AppOpener's form
+    mtime = os.path.getmtime(source)
+    apps = {NormalizeAppName(name): target for name, target in LoadJson(source, {}).items() if target}
+    WriteJson(APP_INDEX_FILE, {"source": source, "mtime": mtime, "apps": apps})
+    return apps, mtime
+
+def LoadIndex():
+    aliases = LoadJson(APP_ALIASES_FILE, {})
+    source = AppOpenerCatalogue()
+    saved = LoadJson(APP_INDEX_FILE, {})
+    if saved.get("apps") and saved.get("source") == source:
+        return AppIndex(saved["apps"], aliases, source, saved.get("mtime"))
+    if source and os.path.exists(source):
+        apps, mtime = BuildIndex(source)
+        return AppIndex(apps, aliases, source, mtime)
+    return AppIndex({}, aliases, source)
+
+Index = None
+IndexLock = threading.Lock()
+Refresher = None
+
+def RefreshLoop():
+    # Rebuilds the index when AppOpener's list changes; learned aliases may
+    # point at the wrong app after that, so only hand-made ones are kept
+    global Index
+    while True:
+        time.sleep(AppIndexRefreshMinutes * 60)
+        try:
+            current = Index
+            source = current.source or AppOpenerCatalogue()
+            if not source or not os.path.exists(source) or os.path.getmtime(source) == current.mtime:
+                continue
+            apps, mtime = BuildIndex(source)
+            aliases = {k: v for k, v in current.aliases.items() if not v.get("learned")}
+            SaveAliases(aliases)
+            Index = AppIndex(apps, aliases, source, mtime)
+            print(f"[AppIndex] Reloaded {len(apps)} applications")
+        except Exception as e:
+            print(f"[AppIndex] Refresh failed: {e}")
+
+def GetAppIndex():
+    global Index, Refresher
+    with IndexLock:
+        if Index is None:
+            Index = LoadIndex()
+            Refresher = threading.Thread(target=RefreshLoop, daemon=True, name="AppIndexRefresh")
+            Refresher.start()
+        return Index
+
+# --- Benchmark ---
+VENDORS = ["microsoft", "adobe", "google", "mozilla", "jetbrains", "autodesk", "oracle", "valve", "epic", "corel",
+           "zoom", "slack", "spotify", "nvidia", "intel", "amd", "logitech", "razer", "dell", "hp"]
+PRODUCTS = ["studio", "editor", "player", "manager", "viewer", "browser", "office", "photo", "video", "music",
+            "cloud", "sync", "center", "tools", "launcher", "monitor", "designer", "notes", "mail", "chat"]
+
+def SyntheticCatalogue(count, rng):
+    names = set()
+    while len(names) < count:
+        words = [rng.choice(VENDORS), rng.choice(PRODUCTS)]
+        if rng.random() < 0.6:
+            words.append(rng.choice(PRODUCTS + ["pro", "lite", "beta", str(rng.randint(2010, 2025))]))
+        if rng.random() < 0.3:
+            words.append("".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(3, 7))))
+        names.add(" ".join(words))
+    return sorted(names)
+
+def Misspell(name, rng):
+    chars = list(name)
+    for _ in range(rng.randint(1, 3)):
+        i = rng.randrange(len(chars))
+        op = rng.random()
+        if op < 0.4:
+            del chars[i]
+        elif op < 0.7:
+            chars.insert(i, rng.choice("abcdefghijklmnopqrstuvwxyz"))
+        else:
+            chars[i] = rng.choice("abcdefghijklmnopqrstuvwxyz")
+    return "".join(chars).strip() or name
+
+def SyntheticQueries(names, count, rng):
+    queries = []
+    for _ in range(count):
+        name = rng.choice(names)
+        kind = rng.random()
+        if kind < 0.2:
+            queries.append(name)
+        elif kind < 0.6:
+            queries.append(Misspell(name, rng))
+        elif kind < 0.85:
+            queries.append(" ".join(name.split()[1:]) or name)
+        else:
+            queries.append("".join(rng.choice("abcdefghijklmnopqrstuvwxyz ") for _ in range(rng.randint(4, 14))).strip() or "x")
+    return queries
+
+def Benchmark(apps=10000, queries=2000, seed=7):
+    rng = random.Random(seed)
+    names = SyntheticCatalogue(apps, rng)
+    words = [NormalizeAppName(q) for q in SyntheticQueries(names, queries, rng)]
+    started = time.perf_counter()
+    index = FuzzyIndex(names)
+    build = time.perf_counter() - started
+
+    def Timed(function):
+        results, times = [], []
+        for word in words:
+            t = time.perf_counter()
+            results.append(function(word))
+            times.append(time.perf_counter() - t)
+        times.sort()
+        return results, times
+
+    expected, difflib_times = Timed(lambda w: (get_close_matches(w, names, n=1, cutoff=CUTOFF) or [None])[0])
+    actual, index_times = Timed(index.Match)
+    mismatches = [(w, e, a) for w, e, a in zip(words, expected, actual) if e != a]
+    pick = lambda times, q: times[min(len(times) - 1, int(q * len(times)))] * 1000
+    print(f"[AppIndex] {apps} apps, {queries} queries, index built in {build * 1000:.0f} ms")
+    print(f"{'':<10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for label, times in (("difflib", difflib_times), ("AppIndex", index_times)):
+        print(f"{label:<10}{pick(times, 0.5):>10.3f}{pick(times, 0.95):>10.3f}{times[-1] * 1000:>10.3f}")
+    print(f"Matches: {sum(1 for a in actual if a)}/{queries}  Different from difflib: {len(mismatches)}")
+    for word, e, a in mismatches[:10]:
+        print(f"  {word!r}: difflib={e!r} index={a!r}")
+    return not mismatches
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "bench":
+        ok = Benchmark(*(int(a) for a in sys.argv[2:4]))
+        sys.exit(0 if ok else 1)
+    elif len(sys.argv) >= 3 and sys.argv[1] == "find":
+        print(GetAppIndex().Resolve(" ".join(sys.argv[2:])))
+    elif len(sys.argv) == 4 and sys.argv[1] == "alias":
+        GetAppIndex().Teach(sys.argv[2], sys.argv[3])
+        print(f"[AppIndex] {sys.argv[2]} -> {NormalizeAppName(sys.argv[3])}")
+    else:
+        print("usage: python AppIndex.py bench [apps] [queries] | find <name> | alias <spoken> <app>")
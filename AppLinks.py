@@ -0,0 +1,180 @@
+from collections import Counter
+from dotenv import dotenv_values
+from html import unescape
+import threading
+import requests
+import sqlite3
+import time
+import sys
+import os
+import re
+
+try:
+    from Backend.Tracing import RecordSpan
+except ModuleNotFoundError:
+    from Tracing import RecordSpan
+
+# Web fallback of Automation.OpenApp: the first Google result for an app name
+# that isn't installed ("open netflix" opens netflix.com).
+#
+# Resolved links are kept in Data\AppLinks.sqlite3 for AppLinkTTLHours, and
+# names Google gave no result for are remembered for AppLinkMissMinutes, so
+# only the first request for a name waits on Google. On a miss the results
+# page is streamed and scanned as raw bytes for the first result link
+# (<a jsname="UWckNb" href=...>, the same link OpenApp took from
+# BeautifulSoup); the download stops as soon as it is found. Like the HTML
+# parser, the scan skips comments and the contents of <script> and <style>,
+# where Google's inline JavaScript often carries the same markup in strings.
+#
+#   python AppLinks.py <app name>   resolves a name and prints the timing
+
+env_vars = dotenv_values(".env")
+AppLinkTTLHours = float(env_vars.get("AppLinkTTLHours") or 7 * 24)
+AppLinkMissMinutes = float(env_vars.get("AppLinkMissMinutes") or 60)
+APP_LINKS_FILE = os.path.join("Data", "AppLinks.sqlite3")
+RESULT_JSNAME = re.compile(rb"""\sjsname\s*=\s*["']?UWckNb["'\s>]""", re.I)
+ANCHOR = re.compile(rb"<a\s", re.I)
+HREF = re.compile(rb"""\shref\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))""", re.I)
+# Where text stops being markup, and where it starts again
+RAW_START = re.compile(rb"<!--|<(script|style)[\s/>]", re.I)
+RAW_END = {
+    None: re.compile(rb"--!?>"),
+    b"script": re.compile(rb"</script[\s/>]", re.I),
+    b"style": re.compile(rb"</style[\s/>]", re.I),
+}
+RAW_END_KEEP = 16
+CHUNK_SIZE = 16 * 1024
+FETCH_TIMEOUT = 10
+
+useragent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36"
+
+def LinkKey(app):
+    return " ".join(re.sub(r"[^\w\s]", " ", app.lower()).split())
+
+def FirstResultLink(chunks):
+    # The href of the first <a jsname="UWckNb"> in a stream of HTML bytes, or
+    # None; stops reading at the first one that has an href
+    buffer = b""
+    raw_end = None  # set while inside a comment, <script> or <style>
+    for chunk in chunks:
+        buffer += chunk
+        while True:
+            if raw_end is not None:
+                end = raw_end.search(buffer)
+                if end is None:
+                    # The end marker may be split across chunks
+                    buffer = buffer[-RAW_END_KEEP:]
+                    break
+                buffer = buffer[end.end():]
+                raw_end = None
+            match = RESULT_JSNAME.search(buffer)
+            raw = RAW_START.search(buffer, 0, match.start() if match else len(buffer))
+            if raw is not None:
+                name = raw.group(1)
+                raw_end = RAW_END[name.lower() if name else None]
+                buffer = buffer[raw.end():]
+                continue
+            if match is None:
+                # Keep the last, maybe unfinished, tag for the next chunk
+                start = buffer.rfind(b"<")
+                buffer = buffer[start:] if start >= 0 else b""
+                break
+            start = buffer.rfind(b"<", 0, match.start())
+            if start < 0:
+                buffer = buffer[match.end():]
+                continue
+            end = buffer.find(b">", match.start())
+            if end < 0:
+                buffer = buffer[start:]
+                break
+            tag = buffer[start:end + 1]
+            href = HREF.search(tag) if ANCHOR.match(tag) else None
+            if href:
+                value = next(group for group in href.groups() if group is not None)
+                if value:
+                    return unescape(value.decode("utf-8", "replace"))
+            buffer = buffer[end + 1:]
+    return None
+
+class AppLinkCache:
+    def __init__(self, path=APP_LINKS_FILE, ttl=AppLinkTTLHours * 3600, miss_ttl=AppLinkMissMinutes * 60):
+        self.ttl = ttl
+        self.miss_ttl = miss_ttl
+        self.lock = threading.Lock()
+        self.stats = Counter()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        # url is NULL for a name Google had no result for
+        self.db.execute("CREATE TABLE IF NOT EXISTS links (key TEXT PRIMARY KEY, expires REAL, url TEXT)")
+        self.db.execute("DELETE FROM links WHERE expires < ?", (time.time(),))
+        self.db.commit()
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = useragent
+
+    def Get(self, app):
+        # (found, url): found is False on a miss, url is None for a remembered "no result"
+        with self.lock:
+            row = self.db.execute("SELECT expires, url FROM links WHERE key = ?", (LinkKey(app),)).fetchone()
+            if row and row[0] > time.time():
+                self.stats["hits" if row[1] else "negative_hits"] += 1
+                return True, row[1]
+            self.stats["misses"] += 1
+            return False, None
+
+    def Put(self, app, url):
+        expires = time.time() + (self.ttl if url else self.miss_ttl)
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO links VALUES (?, ?, ?)", (LinkKey(app), expires, url))
+            self.db.commit()
+
+    def Fetch(self, app):
+        # First result link from Google; raises on network errors and non-200
+        # answers, which aren't cached
+        response = self.session.get("https://www.google.com/search", params={"q": app},
+                                    stream=True, timeout=FETCH_TIMEOUT)
+        with response:
+            response.raise_for_status()
+            return FirstResultLink(response.iter_content(CHUNK_SIZE))
+
+    def Resolve(self, app):
+        # The link to open for app, or None if Google had no result
+        started = time.perf_counter()
+        found, url = self.Get(app)
+        if found:
+            outcome = "hit" if url else "negative_hit"
+        else:
+            url = self.Fetch(app)
+            self.Put(app, url)
+            outcome = "miss"
+        elapsed = time.perf_counter() - started
+        RecordSpan(f"automation.app_link.{outcome}", elapsed)
+        print(f"[AppLinks] {app}: {outcome} in {elapsed * 1000:.1f} ms")
+        return url
+
+    def Clear(self):
+        with self.lock:
+            self.db.execute("DELETE FROM links")
+            self.db.commit()
+
+    def Stats(self):
+        with self.lock:
+            entries = self.db.execute("SELECT COUNT(*) FROM links").fetchone()[0]
+            return dict(self.stats, entries=entries)
+
+Cache = None
+CacheLock = threading.Lock()
+
+def GetAppLinks():
+    global Cache
+    with CacheLock:
+        if Cache is None:
+            Cache = AppLinkCache()
+        return Cache
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("usage: python AppLinks.py <app name>")
+        sys.exit(1)
+    links = GetAppLinks()
+    print(links.Resolve(" ".join(sys.argv[1:])))
+    print(links.Stats())
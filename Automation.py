@@ -1,101 +1,180 @@
-from AppOpener import close, open as appopen
+from concurrent.futures import ThreadPoolExecutor
 from webbrowser import open as webopen
-from pywhatkit import search, playonyt
 from dotenv import dotenv_values
-from bs4 import BeautifulSoup
+from functools import partial
 from rich import print
-from groq import Groq
 import webbrowser
 import subprocess
+import threading
 import requests
 import keyboard
 import asyncio
+import time
 import os
 
+try:
+    from Backend.Streaming import StreamDeltas, SentenceEvents
+    from Backend.Tracing import Span
+    from Backend.Startup import Mark
+    from Backend.Cancellation import Cancellable, TurnCancelled
+    from Backend.AppIndex import GetAppIndex, CloseRunningApp
+    from Backend.AppLinks import GetAppLinks
+except ModuleNotFoundError:
+    from Streaming import StreamDeltas, SentenceEvents
+    from Tracing import Span
+    from Startup import Mark
+    from Cancellation import Cancellable, TurnCancelled
+    from AppIndex import GetAppIndex, CloseRunningApp
+    from AppLinks import GetAppLinks
+
 env_vars = dotenv_values(".env")
 GroqAPIKey = env_vars.get("GroqAPIKey")
+ContentConcurrency = int(env_vars.get("ContentConcurrency") or 2)
+
+Client = None
+ClientLock = threading.Lock()
+
+def GetClient():
+    # The Groq client is built on first use instead of at import, so importing
+    # this module never touches the network
+    global Client
+    with ClientLock:
+        if Client is None:
+            from groq import Groq
+            Mark("client: groq (Automation)")
+            Client = Groq(api_key=GroqAPIKey)
+        return Client
 
-useragent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36"
-client = Groq(api_key=GroqAPIKey)
-
-messages = []
 SystemChatBot = [{"role": "system", "content": f"Hello, I am {os.environ.get('Username', 'User')}, You're a content writer."}]
 
+# pywhatkit checks the internet connection when it is imported, so it is
+# only imported by the commands that use it
 def GoogleSearch(Topic):
+    from pywhatkit import search
     search(Topic)
     return True
 
-def Content(Topic):
+# Streams the content writer's answer as ("delta", text) and ("sentence", text) events.
+# Every document is written from its own prompt alone; earlier documents are
+# not sent again, so jobs don't grow each other's context and can run at once.
+def ContentWriterAIStream(prompt, token=None):
+    token = Cancellable(token)
+    token.Check()
+    started = time.perf_counter()
+    completion = GetClient().chat.completions.create(
+        model="llama3-8b-8192",
+        messages=SystemChatBot + [{"role": "user", "content": prompt}],
+        max_tokens=2048,
+        temperature=0.7,
+        top_p=1,
+        stream=True,
+        stop=None
+    )
+    yield from SentenceEvents(StreamDeltas(completion, "llm.content", started, token))
+
+def WithoutEndTokens(events):
+    # Drops "</s>" from an event stream, even when it is split across deltas
+    pending = ""
+    for kind, text in events:
+        if kind != "delta":
+            yield kind, text.replace("</s>", "")
+            continue
+        pending = (pending + text).replace("</s>", "")
+        cut = pending.rfind("<")
+        if cut >= 0 and "</s>".startswith(pending[cut:]):
+            text, pending = pending[:cut], pending[cut:]
+        else:
+            text, pending = pending, ""
+        if text:
+            yield kind, text
+    if pending:
+        yield "delta", pending
+
+def Content(Topic, token=None):
+    # Writes the document to Data\<topic>.txt while it is generated, so the
+    # answer is never held in memory; Notepad reads a file only once, so it is
+    # opened when the document is complete
     def OpenNotepad(File):
         subprocess.Popen(['notepad.exe', File])
 
-    def ContentWriterAI(prompt):
-        messages.append({"role": "user", "content": prompt})
-        completion = client.chat.completions.create(
-            model="llama3-8b-8192",
-            messages=SystemChatBot + messages,
-            max_tokens=2048,
-            temperature=0.7,
-            top_p=1,
-            stream=True,
-            stop=None
-        )
-        Answer = ""
-        for chunk in completion:
-            if chunk.choices[0].delta.content:
-                Answer += chunk.choices[0].delta.content
-        Answer = Answer.replace("</s>", "")
-        messages.append({"role": "assistant", "content": Answer})
-        return Answer
-
+    token = Cancellable(token)
     Topic = Topic.replace("Content", "").strip()
-    ContentByAI = ContentWriterAI(Topic)
     filepath = rf"Data\{Topic.lower().replace(' ', '_')}.txt"
-    with open(filepath, "w", encoding="utf-8") as file:
-        file.write(ContentByAI)
+    try:
+        with open(filepath, "w", encoding="utf-8") as file:
+            for kind, text in WithoutEndTokens(ContentWriterAIStream(Topic, token)):
+                if kind == "delta":
+                    file.write(text)
+    except BaseException:
+        # A cancelled or failed job leaves no half-written file behind
+        if os.path.exists(filepath):
+            os.remove(filepath)
+        raise
     OpenNotepad(filepath)
     return True
 
+def ContentBatch(Topics, token=None, limit=None):
+    # Several documents at once, at most ContentConcurrency generating together
+    Topics = list(dict.fromkeys(topic.strip() for topic in Topics if topic.strip()))
+    if not Topics:
+        return []
+    token = Cancellable(token)
+    workers = max(1, min(limit or ContentConcurrency, len(Topics)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="Content") as pool:
+        jobs = [pool.submit(RunTask, "content", partial(Content, token=token), topic, token) for topic in Topics]
+        results = []
+        for topic, job in zip(Topics, jobs):
+            try:
+                results.append(job.result())
+            except TurnCancelled:
+                raise
+            except Exception as e:
+                print(f"[Automation] Content for {topic} failed: {e}")
+                results.append(False)
+        return results
+
 def YouTubeSearch(Topic):
     url = f"https://www.youtube.com/results?search_query={Topic}"
     webbrowser.open(url)
     return True
 
 def PlayYoutube(query):
+    from pywhatkit import playonyt
     playonyt(query)
     return True
 
-def OpenApp(app, sess=requests.session()):
+def OpenApp(app):
     try:
-        appopen(app, match_closest=True, output=True, throw_error=True)
+        index = GetAppIndex()
+        if index.apps:
+            # Same lookup as AppOpener's match_closest, from the cached index
+            if not index.Launch(app):
+                raise LookupError(app)
+        else:
+            # AppOpener hasn't listed the installed apps yet; importing it does
+            from AppOpener import open as appopen
+            appopen(app, match_closest=True, output=True, throw_error=True)
         return True
     except:
         if "youtube" in app.lower():
             webbrowser.open("https://www.youtube.com")
             return True
 
-        def extract_links(html):
-            soup = BeautifulSoup(html or '', 'html.parser')
-            links = soup.find_all('a', {'jsname': 'UWckNb'})
-            return [link.get('href') for link in links if link.get('href')]
-
-        def search_google(query):
-            url = f"https://www.google.com/search?q={query}"
-            headers = {"User-Agent": useragent}
-            response = sess.get(url, headers=headers)
-            return response.text if response.status_code == 200 else None
-
-        html = search_google(app)
-        links = extract_links(html)
-        if links:
-            webopen(links[0])
+        try:
+            link = GetAppLinks().Resolve(app)
+        except requests.RequestException as e:
+            print(f"[Automation] Web search for {app} failed: {e}")
+            link = None
+        if link:
+            webopen(link)
         else:
             print("No links found.")
         return True
 
 def CloseApp(app):
     try:
-        close(app, match_closest=True, output=True, throw_error=True)
+        if not CloseRunningApp(app):
+            raise LookupError(app)
         return True
     except:
         print(f"Failed to close: {app}")
@@ -110,34 +189,65 @@ def system(command):
         keyboard.press_and_release("volume down")
     return True
 
-async def TranslateAndExecute(commands: list[str]):
+# Automation tasks run on their own pool rather than asyncio's default one:
+# asyncio.run() waits for the default pool's threads before it returns, which
+# would keep a cancelled turn alive until every task had finished.
+TaskPool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="Automation")
+
+# Runs one automation task on its worker thread and traces how long it took
+def RunTask(name, func, argument, token=None):
+    # Tasks that haven't started when the turn is cancelled are skipped
+    Cancellable(token).Check()
+    with Span(f"automation.{name}"):
+        return func(argument)
+
+async def TranslateAndExecute(commands: list[str], token=None):
+    loop = asyncio.get_running_loop()
+
+    def Task(name, func, argument):
+        return loop.run_in_executor(TaskPool, RunTask, name, func, argument, token)
+
     funcs = []
+    topics = []
     for command in commands:
         cmd = command.lower().strip()
         if cmd.startswith("open "):
-            funcs.append(asyncio.to_thread(OpenApp, cmd.removeprefix("open ").strip()))
+            funcs.append(Task("open", OpenApp, cmd.removeprefix("open ").strip()))
         elif cmd.startswith("close"):
-            funcs.append(asyncio.to_thread(CloseApp, cmd.removeprefix("close").strip()))
+            funcs.append(Task("close", CloseApp, cmd.removeprefix("close").strip()))
         elif cmd.startswith("play"):
-            funcs.append(asyncio.to_thread(PlayYoutube, cmd.removeprefix("play").strip()))
+            funcs.append(Task("play", PlayYoutube, cmd.removeprefix("play").strip()))
         elif cmd.startswith("content"):
-            funcs.append(asyncio.to_thread(Content, cmd.removeprefix("content").strip()))
+            topics.append(cmd.removeprefix("content").strip())
         elif cmd.startswith("google search"):
-            funcs.append(asyncio.to_thread(GoogleSearch, cmd.removeprefix("google search").strip()))
+            funcs.append(Task("google_search", GoogleSearch, cmd.removeprefix("google search").strip()))
         elif cmd.startswith("youtube search"):
-            funcs.append(asyncio.to_thread(YouTubeSearch, cmd.removeprefix("youtube search").strip()))
+            funcs.append(Task("youtube_search", YouTubeSearch, cmd.removeprefix("youtube search").strip()))
         elif cmd.startswith("system"):
-            funcs.append(asyncio.to_thread(system, cmd.removeprefix("system").strip()))
+            funcs.append(Task("system", system, cmd.removeprefix("system").strip()))
         elif cmd.startswith("general") or cmd.startswith("realtime"):
             continue  # Skip these types for automation
         else:
             print(f"No Function Found For: {command}")
-
-    results = await asyncio.gather(*funcs)
+    if topics:
+        # All documents of a turn go through one batch with its own concurrency limit
+        funcs.append(loop.run_in_executor(TaskPool, partial(ContentBatch, topics, token)))
+
+    # A cancel stops waiting for the tasks; the ones still running finish on
+    # their own (an app that is already opening can't be stopped halfway)
+    token = Cancellable(token)
+    gathered = asyncio.gather(*funcs)
+    detach = token.OnCancel(lambda: loop.call_soon_threadsafe(gathered.cancel))
+    try:
+        results = await gathered
+    except asyncio.CancelledError:
+        raise TurnCancelled(token.reason)
+    finally:
+        detach()
     for result in results:
         yield result
 
-async def Automation(commands: list[str]):
-    async for _ in TranslateAndExecute(commands):
+async def Automation(commands: list[str], token=None):
+    async for _ in TranslateAndExecute(commands, token):
         pass
     return True
@@ -0,0 +1,466 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, parse_qs
+import tempfile
+import argparse
+import platform
+import threading
+import random
+import shutil
+import json
+import time
+import uuid
+import sys
+import io
+import os
+
+# Offline end-to-end benchmark.
+#
+# Starts one local HTTP server that stands in for Groq (OpenAI style SSE),
+# Cohere (chat_stream NDJSON), Google search and the Hugging Face inference API,
+# each with configurable latency and streaming chunk sizes. The backend modules
+# are then imported in a scratch working directory whose .env points them at
+# that server, and scripted turns are driven through the same path as
+# Main.MainExecution: decision -> search/LLM streams -> image jobs.
+#
+#   python Benchmark.py [--turns N] [--script turns.json] [--profile profile.json]
+#                       [--save-baseline [path]] [--compare [path]] [--threshold 0.1]
+#                       [--barge-in MS]
+#
+# The report has throughput, p50/p95/p99 per traced stage and peak RSS. It can
+# be saved as a JSON baseline and later runs compared against it; --compare
+# exits with status 1 when a stage's p50 or p95 regressed by more than the threshold.
+# With --barge-in every turn is interrupted MS after it starts by the next one,
+# like a mic press during an answer, and turn.cancel shows how long aborting took.
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_FILE = os.path.join(PROJECT_DIR, "Data", "Benchmark", "baseline.json")
+
+# Latencies are {"mean", "sd"} in milliseconds, sizes are {"min", "max"}
+DEFAULT_PROFILE = {
+    "groq": {"ttft_ms": {"mean": 180, "sd": 60}, "chunk_ms": {"mean": 12, "sd": 4},
+             "chunk_chars": {"min": 3, "max": 14}, "answer_chars": {"min": 200, "max": 700}},
+    "cohere": {"ttft_ms": {"mean": 220, "sd": 70}, "chunk_ms": {"mean": 8, "sd": 3},
+               "chunk_chars": {"min": 3, "max": 10}},
+    "google": {"latency_ms": {"mean": 350, "sd": 120}},
+    "hf": {"latency_ms": {"mean": 1800, "sd": 500}, "image_kb": {"min": 150, "max": 400}},
+}
+
+# Scripted turns; decision is what the stand-in Cohere model answers
+DEFAULT_SCRIPT = [
+    {"query": "how are you doing today", "decision": ["general how are you doing today"]},
+    {"query": "who is the prime minister of india", "decision": ["realtime who is the prime minister of india"]},
+    {"query": "what is the capital of france and what is today's news",
+     "decision": ["general what is the capital of france", "realtime what is today's news"]},
+    {"query": "generate image of a red fox in the snow", "decision": ["generate image a red fox in the snow"]},
+    {"query": "explain how a transformer works", "decision": ["general explain how a transformer works"]},
+    {"query": "how are you doing today", "decision": ["general how are you doing today"]},
+    {"query": "what is the weather in bangalore", "decision": ["realtime what is the weather in bangalore"]},
+    {"query": "tell me a joke about computers", "decision": ["general tell me a joke about computers"]},
+]
+
+WORDS = ("the model answers each question with a short and clear explanation that covers the main "
+         "points and adds a little context so the reply sounds natural when it is spoken aloud").split()
+
+def Sample(spec):
+    if "sd" in spec:
+        return max(0.0, random.gauss(spec["mean"], spec["sd"]))
+    return random.uniform(spec["min"], spec["max"])
+
+def FakeText(chars):
+    words = []
+    length = 0
+    while length < chars:
+        word = random.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+        if random.random() < 0.12:
+            words[-1] += "."
+    return " ".join(words).capitalize() + "."
+
+def Chunks(text, spec):
+    position = 0
+    while position < len(text):
+        size = int(Sample(spec)) or 1
+        yield text[position:position + size]
+        position += size
+
+# --- Stand-in services ---
+class FakeServices(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, profile, decisions):
+        super().__init__(("127.0.0.1", 0), FakeServiceHandler)
+        self.profile = profile
+        self.decisions = decisions
+        self.requests = {"groq": 0, "cohere": 0, "google": 0, "hf": 0}
+        self.lock = threading.Lock()
+        self.image = self.BaseImage()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def handle_error(self, request, client_address):
+        # A cancelled turn closes its stream mid-response; that is not a server error
+        if isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            return
+        super().handle_error(request, client_address)
+
+    def Count(self, service):
+        with self.lock:
+            self.requests[service] += 1
+
+    def BaseImage(self):
+        # A real JPEG so thumbnails can be made; random trailing bytes make every
+        # response unique without breaking decoders.
+        try:
+            from PIL import Image
+            buffer = io.BytesIO()
+            Image.effect_noise((512, 512), 64).convert("RGB").save(buffer, "JPEG", quality=90)
+            return buffer.getvalue()
+        except ImportError:
+            return b"\xff\xd8\xff\xe0" + bytes(1024) + b"\xff\xd9"
+
+class FakeServiceHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def ReadJson(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        try:
+            return json.loads(body or b"{}")
+        except json.JSONDecodeError:
+            return {}
+
+    def StartChunked(self, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def WriteChunk(self, data):
+        data = data.encode("utf-8") if isinstance(data, str) else data
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def EndChunked(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def SendBody(self, content_type, body):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        if path.endswith("/chat/completions"):
+            self.Groq(self.ReadJson())
+        elif path.endswith("/chat"):
+            self.Cohere(self.ReadJson())
+        elif path.startswith("/hf"):
+            self.HuggingFace(self.ReadJson())
+        else:
+            self.send_error(404)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/search":
+            self.Google(parse_qs(url.query).get("q", [""])[0])
+        else:
+            self.send_error(404)
+
+    def Groq(self, request):
+        self.server.Count("groq")
+        profile = self.server.profile["groq"]
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        time.sleep(Sample(profile["ttft_ms"]) / 1000)
+        self.StartChunked("text/event-stream")
+        for piece in Chunks(FakeText(int(Sample(profile["answer_chars"]))), profile["chunk_chars"]):
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                     "model": request.get("model", "llama3-70b-8192"),
+                     "choices": [{"index": 0, "delta": {"role": "assistant", "content": piece}, "finish_reason": None}]}
+            self.WriteChunk(f"data: {json.dumps(chunk)}\n\n")
+            time.sleep(Sample(profile["chunk_ms"]) / 1000)
+        done = {"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                "model": request.get("model", "llama3-70b-8192"),
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        self.WriteChunk(f"data: {json.dumps(done)}\n\n")
+        self.WriteChunk("data: [DONE]\n\n")
+        self.EndChunked()
+
+    def Cohere(self, request):
+        self.server.Count("cohere")
+        profile = self.server.profile["cohere"]
+        message = request.get("message", "")
+        decision = ", ".join(self.server.decisions.get(message.strip().lower(), [f"general {message}"]))
+        generation_id = uuid.uuid4().hex
+        time.sleep(Sample(profile["ttft_ms"]) / 1000)
+        self.StartChunked("application/stream+json")
+        self.WriteChunk(json.dumps({"is_finished": False, "event_type": "stream-start", "generation_id": generation_id}) + "\n")
+        for piece in Chunks(decision, profile["chunk_chars"]):
+            self.WriteChunk(json.dumps({"is_finished": False, "event_type": "text-generation", "text": piece}) + "\n")
+            time.sleep(Sample(profile["chunk_ms"]) / 1000)
+        self.WriteChunk(json.dumps({"is_finished": True, "event_type": "stream-end", "finish_reason": "COMPLETE",
+                                    "response": {"text": decision, "generation_id": generation_id,
+                                                 "response_id": generation_id, "finish_reason": "COMPLETE",
+                                                 "chat_history": []}}) + "\n")
+        self.EndChunked()
+
+    def Google(self, query):
+        self.server.Count("google")
+        time.sleep(Sample(self.server.profile["google"]["latency_ms"]) / 1000)
+        results = [{"title": f"{query.title()} - result {i + 1}", "description": FakeText(160)} for i in range(5)]
+        self.SendBody("application/json", json.dumps(results).encode("utf-8"))
+
+    def HuggingFace(self, request):
+        self.server.Count("hf")
+        profile = self.server.profile["hf"]
+        time.sleep(Sample(profile["latency_ms"]) / 1000)
+        padding = max(0, int(Sample(profile["image_kb"]) * 1024) - len(self.server.image))
+        self.SendBody("image/jpeg", self.server.image + os.urandom(padding))
+
+# --- Backend setup ---
+def PrepareWorkdir(server_url):
+    # Every Data/ file (chat log, caches, traces, image store) lands in a scratch folder
+    workdir = tempfile.mkdtemp(prefix="jarvis-bench-")
+    with open(os.path.join(workdir, ".env"), "w", encoding="utf-8") as f:
+        f.write("Username=Bench\nAssistantname=Jarvis\n")
+        f.write("GroqAPIKey=bench\nCohereAPIKey=bench\nHuggingFaceAPIKey=bench\n")
+        f.write(f"HuggingFaceAPIURL={server_url}/hf\n")
+        f.write("TraceMetricsPort=0\n")
+    # The SDKs read these when they are imported or a client is created;
+    # load_dotenv() in ImageGeneration looks next to the module, not in the cwd
+    os.environ["GROQ_BASE_URL"] = server_url
+    os.environ["CO_API_URL"] = server_url
+    os.environ["HuggingFaceAPIURL"] = f"{server_url}/hf"
+    os.environ["HuggingFaceAPIKey"] = "bench"
+    os.makedirs(os.path.join(workdir, "Data"), exist_ok=True)
+    return workdir
+
+def LoadBackend(server_url):
+    # Imported only after the working directory and environment point at the fakes
+    if PROJECT_DIR not in sys.path:
+        sys.path.insert(0, PROJECT_DIR)
+    import requests
+    import Model
+    import Chatbot
+    import RealtimeSearchEngine
+    import ImageGeneration
+    import Streaming
+    import Tracing
+    import Cancellation
+
+    session = requests.Session()
+
+    # googlesearch has no endpoint setting, so the fetch step is swapped for one
+    # that asks the stand-in server over HTTP
+    def FetchSearchResults(query):
+        response = session.get(f"{server_url}/search", params={"q": query}, timeout=30)
+        response.raise_for_status()
+        return [[item["title"], item["description"]] for item in response.json()]
+
+    RealtimeSearchEngine.FetchSearchResults = FetchSearchResults
+    return {"Model": Model, "Chatbot": Chatbot, "RealtimeSearchEngine": RealtimeSearchEngine,
+            "ImageGeneration": ImageGeneration, "Streaming": Streaming, "Tracing": Tracing,
+            "Cancellation": Cancellation}
+
+# --- Turn driver ---
+def RunTurn(backend, query, images, token=None):
+    # Same order of work as Main.MainExecution, without the microphone, GUI and speech
+    Tracing = backend["Tracing"]
+    Streaming = backend["Streaming"]
+    token = backend["Cancellation"].Cancellable(token)
+    Tracing.StartTrace()
+    stats = {"chars": 0, "first_sentence": None}
+    started = time.perf_counter()
+    with Tracing.Span("turn"):
+        with Tracing.Span("decision"):
+            Decision = backend["Model"].FirstLayerDMM(query, token=token)
+        SubQueries = [(i.split()[0], " ".join(i.split()[1:])) for i in Decision if i.startswith(("general", "realtime"))]
+        for item in Decision:
+            if "generate image" in item:
+                prompt = item.replace("generate image", "").strip()
+                images.append(images.pool.submit(RunImageJob, backend, prompt))
+        streams = []
+        for kind, text in SubQueries:
+            factory = backend["RealtimeSearchEngine"].RealtimeSearchEngineStream if kind == "realtime" else backend["Chatbot"].ChatBotStream
+            streams.append(Streaming.BufferedStream(text, factory, token))
+        for stream in streams:
+            for kind, text in stream.Events():
+                token.Check()
+                if kind == "delta":
+                    stats["chars"] += len(text)
+                elif stats["first_sentence"] is None:
+                    stats["first_sentence"] = time.perf_counter() - started
+                    Tracing.RecordSpan("turn.first_sentence", stats["first_sentence"])
+            stream.Wait()
+    return stats
+
+def RunImageJob(backend, prompt):
+    with backend["Tracing"].Span("image"):
+        return backend["ImageGeneration"].GenerateImages(prompt, fresh=True)
+
+class ImageJobs(list):
+    def __init__(self):
+        super().__init__()
+        self.pool = ThreadPoolExecutor(max_workers=1)
+
+def PeakRss():
+    # Peak resident set size of this process in MB, if the platform reports it
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    except ImportError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return round(getattr(info, "peak_wset", info.rss) / (1024 * 1024), 1)
+    except ImportError:
+        return None
+
+def RunBargeIn(backend, script, turns, images, delay):
+    # Each turn is replaced by the next one delay seconds after it was submitted
+    results = []
+    scheduler = backend["Cancellation"].TurnScheduler(
+        lambda query, token: results.append(RunTurn(backend, query, images, token)))
+    scheduler.start()
+    for index in range(turns):
+        entry = script[index % len(script)]
+        scheduler.Submit(entry["query"])
+        print(f"[Benchmark] Turn {index + 1}/{turns}: {entry['query']!r}")
+        time.sleep(delay)
+    while scheduler.Busy() or not scheduler.requests.empty():
+        time.sleep(0.05)
+    return results
+
+def RunBenchmark(turns, script, profile, seed, barge_in=None):
+    random.seed(seed)
+    decisions = {entry["query"].strip().lower(): entry["decision"] for entry in script}
+    server = FakeServices(profile, decisions)
+    threading.Thread(target=server.serve_forever, daemon=True, name="FakeServices").start()
+    original_dir = os.getcwd()
+    workdir = PrepareWorkdir(server.url)
+    os.chdir(workdir)
+    try:
+        backend = LoadBackend(server.url)
+        images = ImageJobs()
+        chars = 0
+        first_sentences = []
+        started = time.perf_counter()
+        if barge_in:
+            finished = RunBargeIn(backend, script, turns, images, barge_in / 1000)
+        else:
+            finished = []
+            for index in range(turns):
+                entry = script[index % len(script)]
+                finished.append(RunTurn(backend, entry["query"], images))
+                print(f"[Benchmark] Turn {index + 1}/{turns}: {entry['query']!r}")
+        for stats in finished:
+            chars += stats["chars"]
+            if stats["first_sentence"] is not None:
+                first_sentences.append(stats["first_sentence"])
+        turns_elapsed = time.perf_counter() - started
+        for job in images:
+            job.result()
+        images.pool.shutdown()
+        elapsed = time.perf_counter() - started
+        Tracing = backend["Tracing"]
+        report = {
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "seed": seed,
+            "turns": turns,
+            "images": len(images),
+            "elapsed_s": round(elapsed, 3),
+            "turns_per_s": round(turns / turns_elapsed, 3) if turns_elapsed else 0.0,
+            "chars_per_s": round(chars / turns_elapsed, 1) if turns_elapsed else 0.0,
+            "peak_rss_mb": PeakRss(),
+            "requests": dict(server.requests),
+            "stages": Tracing.StageReport(Tracing.LoadSpans([Tracing.TRACE_FILE])),
+        }
+    finally:
+        os.chdir(original_dir)
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+# --- Report and baseline ---
+def PrintBenchmark(report):
+    print(f"\nTurns: {report['turns']}  Images: {report['images']}  Elapsed: {report['elapsed_s']}s")
+    print(f"Throughput: {report['turns_per_s']} turns/s, {report['chars_per_s']} chars/s")
+    print(f"Peak RSS: {report['peak_rss_mb']} MB  Requests: {report['requests']}\n")
+    print(f"{'stage':<24}{'count':>8}{'p50 ms':>12}{'p95 ms':>12}{'p99 ms':>12}{'max ms':>12}")
+    for stage in sorted(report["stages"]):
+        row = report["stages"][stage]
+        print(f"{stage:<24}{row['count']:>8}{row['p50']:>12.1f}{row['p95']:>12.1f}{row['p99']:>12.1f}{row['max']:>12.1f}")
+
+def CompareBaseline(report, baseline, threshold):
+    # Returns the list of regressions; stages missing on either side are skipped
+    regressions = []
+    print(f"\n{'stage':<24}{'p50 base':>10}{'p50 now':>10}{'change':>9}{'p95 base':>10}{'p95 now':>10}{'change':>9}")
+    for stage in sorted(set(report["stages"]) & set(baseline.get("stages", {}))):
+        now = report["stages"][stage]
+        base = baseline["stages"][stage]
+        changes = {}
+        for key in ("p50", "p95"):
+            changes[key] = (now[key] - base[key]) / base[key] if base[key] else 0.0
+            if changes[key] > threshold:
+                regressions.append(f"{stage} {key} {base[key]:.1f}ms -> {now[key]:.1f}ms ({changes[key]:+.0%})")
+        print(f"{stage:<24}{base['p50']:>10.1f}{now['p50']:>10.1f}{changes['p50']:>+9.0%}"
+              f"{base['p95']:>10.1f}{now['p95']:>10.1f}{changes['p95']:>+9.0%}")
+    if baseline.get("turns_per_s") and report["turns_per_s"] < baseline["turns_per_s"] * (1 - threshold):
+        regressions.append(f"throughput {baseline['turns_per_s']} -> {report['turns_per_s']} turns/s")
+    return regressions
+
+def LoadJson(path, default):
+    if not path:
+        return default
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark with stand-in services.")
+    parser.add_argument("--turns", type=int, default=len(DEFAULT_SCRIPT) * 3)
+    parser.add_argument("--script", help="JSON list of {\"query\", \"decision\"} turns")
+    parser.add_argument("--profile", help="JSON latency/chunk profile, merged over the default")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--save-baseline", nargs="?", const=BASELINE_FILE, help="write the report as a baseline")
+    parser.add_argument("--compare", nargs="?", const=BASELINE_FILE, help="compare against a baseline")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed slowdown before a stage counts as regressed")
+    parser.add_argument("--json", help="also write the report to this file")
+    parser.add_argument("--barge-in", type=float, metavar="MS", help="interrupt every turn this many ms after it starts")
+    args = parser.parse_args()
+
+    profile = json.loads(json.dumps(DEFAULT_PROFILE))
+    for service, settings in LoadJson(args.profile, {}).items():
+        profile.setdefault(service, {}).update(settings)
+
+    report = RunBenchmark(args.turns, LoadJson(args.script, DEFAULT_SCRIPT), profile, args.seed, args.barge_in)
+    PrintBenchmark(report)
+
+    for path in (args.json, args.save_baseline):
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+            print(f"\n[Benchmark] Report written to {path}")
+
+    if args.compare:
+        regressions = CompareBaseline(report, LoadJson(args.compare, {}), args.threshold)
+        if regressions:
+            print("\n[Benchmark] Regressions:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("\n[Benchmark] No regressions against the baseline.")
@@ -0,0 +1,176 @@
+from queue import Queue, Empty
+import threading
+import time
+
+try:
+    from Backend.Tracing import RecordSpan
+except ModuleNotFoundError:
+    from Tracing import RecordSpan
+
+# Cancellation for voice turns.
+#
+# Every turn runs with a CancelToken. The token is passed down to everything
+# the turn waits on (the decision model, LLM streams, the web search, speech
+# playback, automation tasks), and each of them registers how to abort itself
+# with OnCancel(): close the HTTP stream, stop the TTS engine, wake up a wait.
+# Cancel() runs those callbacks right away on the calling thread, so the
+# blocked turn thread returns within milliseconds and raises TurnCancelled.
+#
+# TurnScheduler runs one turn at a time on its own thread. Submitting a new
+# turn (mic press, wake word) cancels the running one first: barge-in.
+
+class TurnCancelled(BaseException):
+    # A BaseException, like asyncio.CancelledError, so the many
+    # "except Exception" error handlers in a turn don't swallow or retry it
+    pass
+
+class CancelToken:
+    def __init__(self, parent=None):
+        self.event = threading.Event()
+        self.lock = threading.Lock()
+        self.callbacks = {}
+        self.ids = 0
+        self.reason = None
+        self.cancelled_at = None
+        self.finished = False
+        self.detach = parent.OnCancel(self.Cancel) if parent is not None else None
+
+    @property
+    def cancelled(self):
+        return self.event.is_set()
+
+    def Cancel(self, reason="cancelled"):
+        with self.lock:
+            if self.event.is_set() or self.finished:
+                return
+            self.reason = reason
+            self.cancelled_at = time.perf_counter()
+            self.event.set()
+            callbacks = list(self.callbacks.values())
+            self.callbacks.clear()
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"[Cancellation] Cancel callback failed: {e}")
+
+    def Check(self):
+        if self.event.is_set():
+            raise TurnCancelled(self.reason)
+
+    def OnCancel(self, callback):
+        # Runs callback when the token is cancelled (at once if it already is);
+        # returns a function that unregisters it
+        with self.lock:
+            if not self.event.is_set():
+                self.ids += 1
+                key = self.ids
+                self.callbacks[key] = callback
+                return lambda: self.callbacks.pop(key, None)
+        callback()
+        return lambda: None
+
+    def Wait(self, event, timeout=None):
+        # event.wait() that also returns when the token is cancelled
+        remove = self.OnCancel(event.set)
+        try:
+            finished = event.wait(timeout)
+        finally:
+            remove()
+        self.Check()
+        return finished
+
+    def Await(self, func, *args, **kwargs):
+        # Runs a blocking call that can't be interrupted (an SDK request) on a
+        # helper thread; a cancel abandons it, and its result is thrown away
+        done = threading.Event()
+        outcome = {}
+
+        def Run():
+            try:
+                outcome["result"] = func(*args, **kwargs)
+            except BaseException as e:
+                outcome["error"] = e
+            finally:
+                done.set()
+
+        self.Check()
+        threading.Thread(target=Run, daemon=True, name="Cancellable").start()
+        self.Wait(done)
+        if "error" in outcome:
+            raise outcome["error"]
+        return outcome["result"]
+
+    def Finish(self):
+        # The work is over: later cancels do nothing and callbacks are released
+        with self.lock:
+            self.finished = True
+            self.callbacks.clear()
+        if self.detach is not None:
+            self.detach()
+
+def Cancellable(token):
+    # Callers that don't pass a token get one that is never cancelled
+    return token if token is not None else CancelToken()
+
+class TurnScheduler(threading.Thread):
+    def __init__(self, execute):
+        # execute(query, token) runs one turn; query None means "listen first"
+        super().__init__(daemon=True, name="TurnScheduler")
+        self.execute = execute
+        self.requests = Queue()
+        self.lock = threading.Lock()
+        self.token = None
+        self.turns = 0
+        self.cancelled = 0
+
+    def run(self):
+        # Blocks until a turn is requested; there is no polling
+        while True:
+            query = self.requests.get()
+            token = CancelToken()
+            with self.lock:
+                self.token = token
+            try:
+                self.execute(query, token)
+            except TurnCancelled:
+                pass
+            except Exception as e:
+                print(f"[Scheduler] Turn failed: {e}")
+            finally:
+                with self.lock:
+                    self.token = None
+                    self.turns += 1
+                token.Finish()
+            if token.cancelled:
+                # Time from the cancel to the turn thread being free again
+                latency = time.perf_counter() - token.cancelled_at
+                RecordSpan("turn.cancel", latency, reason=token.reason)
+                with self.lock:
+                    self.cancelled += 1
+                print(f"[Scheduler] Turn cancelled ({token.reason}) in {latency * 1000:.0f} ms")
+
+    def Submit(self, query=None, reason="barge-in"):
+        # Starts a new turn, cancelling the running one and any that haven't started
+        while True:
+            try:
+                self.requests.get_nowait()
+            except Empty:
+                break
+        self.Interrupt(reason)
+        self.requests.put(query)
+
+    def Interrupt(self, reason="interrupted"):
+        with self.lock:
+            token = self.token
+        if token is not None:
+            token.Cancel(reason)
+        return token is not None
+
+    def Busy(self):
+        with self.lock:
+            return self.token is not None
+
+    def Stats(self):
+        with self.lock:
+            return {"turns": self.turns, "cancelled": self.cancelled, "busy": self.token is not None}
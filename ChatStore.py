@@ -0,0 +1,202 @@
+import threading
+import struct
+import json
+import os
+import sys
+
+# Append-only conversation store that replaces full rewrites of Data\ChatLog.json.
+#
+# Messages live in numbered JSONL segments under Data\ChatLog. Every segment has a
+# sidecar .idx file holding one 8-byte offset per record, so an append is a single
+# line write plus an 8-byte index write, and the last N messages can be read by
+# seeking straight to their offsets instead of parsing the whole history.
+# A crash can at worst leave a partial last line, which is dropped on the next open.
+
+STORE_FOLDER = os.path.join("Data", "ChatLog")
+LEGACY_CHATLOG_FILE = r"Data\ChatLog.json"
+SEGMENT_MAX_RECORDS = 1000
+IMPORT_MARKER = "imported"
+OFFSET = struct.Struct("<Q")
+
+class ChatStore:
+    def __init__(self, folder=STORE_FOLDER, segment_max_records=SEGMENT_MAX_RECORDS, fsync=True):
+        self.folder = folder
+        self.segment_max_records = segment_max_records
+        self.fsync = fsync
+        self.lock = threading.RLock()
+        os.makedirs(self.folder, exist_ok=True)
+        # [(segment number, record count)] in ascending order
+        self.segments = []
+        for name in sorted(os.listdir(self.folder)):
+            if name.endswith(".jsonl"):
+                number = int(name[:-len(".jsonl")])
+                self.segments.append([number, self._recover(number)])
+        if not self.segments:
+            self.segments.append([1, 0])
+
+    def _paths(self, number):
+        base = os.path.join(self.folder, f"{number:08d}")
+        return base + ".jsonl", base + ".idx"
+
+    def _recover(self, number):
+        # Bring a segment and its index back in sync after an unclean shutdown
+        data_path, index_path = self._paths(number)
+        with open(data_path, "ab+") as data:
+            data.seek(0, os.SEEK_END)
+            size = data.tell()
+            data.seek(max(0, size - 1))
+            if size and data.read(1) != b"\n":
+                # Drop a partially written last line by scanning back to the previous newline
+                end = size
+                while end > 0:
+                    start = max(0, end - 65536)
+                    data.seek(start)
+                    cut = data.read(end - start).rfind(b"\n")
+                    if cut >= 0:
+                        end = start + cut + 1
+                        break
+                    end = start
+                size = end
+                data.truncate(size)
+
+        offsets = []
+        if os.path.exists(index_path):
+            with open(index_path, "rb") as index:
+                raw = index.read()
+            usable = len(raw) - len(raw) % OFFSET.size
+            offsets = [o for (o,) in OFFSET.iter_unpack(raw[:usable]) if o < size]
+
+        # Index entries are written after the data, so missing entries can only
+        # be at the tail. Rescan from the last known offset to fill them in.
+        with open(data_path, "rb") as data:
+            if offsets:
+                data.seek(offsets[-1])
+                data.readline()
+            position = data.tell()
+            for line in iter(data.readline, b""):
+                offsets.append(position)
+                position += len(line)
+
+        with open(index_path, "wb") as index:
+            index.write(b"".join(OFFSET.pack(o) for o in offsets))
+        return len(offsets)
+
+    def _append_records(self, records):
+        number, count = self.segments[-1]
+        if count >= self.segment_max_records:
+            number, count = number + 1, 0
+            self.segments.append([number, 0])
+        data_path, index_path = self._paths(number)
+        with open(data_path, "ab") as data, open(index_path, "ab") as index:
+            position = data.tell()
+            offsets = []
+            for record in records:
+                line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+                offsets.append(position)
+                data.write(line)
+                position += len(line)
+            data.flush()
+            if self.fsync:
+                os.fsync(data.fileno())
+            index.write(b"".join(OFFSET.pack(o) for o in offsets))
+        self.segments[-1][1] = count + len(records)
+
+    def Append(self, role, content):
+        self.AppendMany([{"role": role, "content": content}])
+
+    def AppendMany(self, entries):
+        # A user/assistant pair is written together so concurrent turns never interleave
+        with self.lock:
+            entries = list(entries)
+            while entries:
+                room = self.segment_max_records - self.segments[-1][1]
+                if room <= 0:
+                    room = self.segment_max_records
+                self._append_records(entries[:room])
+                entries = entries[room:]
+
+    def Count(self):
+        with self.lock:
+            return sum(count for _, count in self.segments)
+
+    def _read_segment(self, number, start, stop):
+        data_path, index_path = self._paths(number)
+        with open(index_path, "rb") as index:
+            index.seek(start * OFFSET.size)
+            (first,) = OFFSET.unpack(index.read(OFFSET.size))
+        records = []
+        with open(data_path, "rb") as data:
+            data.seek(first)
+            for _ in range(stop - start):
+                records.append(json.loads(data.readline()))
+        return records
+
+    def LoadRange(self, start, stop):
+        # Messages [start, stop) in chronological order
+        with self.lock:
+            records = []
+            base = 0
+            for number, count in self.segments:
+                lo, hi = max(start, base), min(stop, base + count)
+                if lo < hi:
+                    records.extend(self._read_segment(number, lo - base, hi - base))
+                base += count
+            return records
+
+    def Load(self, last=None):
+        with self.lock:
+            total = self.Count()
+            start = 0 if last is None else max(0, total - last)
+            return self.LoadRange(start, total)
+
+    def ImportJson(self, path=LEGACY_CHATLOG_FILE):
+        # One-time migration of the old ChatLog.json list into the store
+        with self.lock:
+            marker = os.path.join(self.folder, IMPORT_MARKER)
+            if os.path.exists(marker) or not os.path.exists(path):
+                return 0
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    entries = json.load(f)
+            except (json.JSONDecodeError, UnicodeDecodeError) as e:
+                print(f"[ChatStore] Could not import {path}: {e}")
+                entries = []
+            entries = [e for e in entries if isinstance(e, dict) and "role" in e and "content" in e]
+            if entries and self.Count() == 0:
+                self.AppendMany(entries)
+            else:
+                entries = []
+            with open(marker, "w", encoding="utf-8") as f:
+                f.write(path)
+            print(f"[ChatStore] Imported {len(entries)} messages from {path}")
+            return len(entries)
+
+Store = None
+StoreLock = threading.Lock()
+
+def GetChatStore():
+    global Store
+    with StoreLock:
+        if Store is None:
+            Store = ChatStore()
+            Store.ImportJson()
+        return Store
+
+def AppendMessages(entries):
+    GetChatStore().AppendMany(entries)
+
+def LoadMessages(last=None):
+    return GetChatStore().Load(last)
+
+def LoadMessageRange(start, stop):
+    return GetChatStore().LoadRange(start, stop)
+
+def MessageCount():
+    return GetChatStore().Count()
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "import":
+        GetChatStore().ImportJson(sys.argv[2])
+    print(f"[ChatStore] {MessageCount()} messages in {STORE_FOLDER}")
+    for entry in LoadMessages(last=10):
+        print(f"{entry['role']}: {entry['content']}")
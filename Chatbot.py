@@ -1,9 +1,26 @@
 import os
-import json  # Needed for JSONDecodeError
-from json import load, dump
+import re
 import datetime
+import difflib
+import hashlib
+import sys
+import threading
+import time
+from collections import OrderedDict
 from dotenv import dotenv_values
-from groq import Groq
+
+try:
+    from Backend.ChatStore import AppendMessages
+    from Backend.ContextBuilder import BuildContext
+    from Backend.Streaming import StreamDeltas, SentenceEvents, CollectAnswer
+    from Backend.Startup import Mark
+    from Backend.Cancellation import Cancellable
+except ModuleNotFoundError:
+    from ChatStore import AppendMessages
+    from ContextBuilder import BuildContext
+    from Streaming import StreamDeltas, SentenceEvents, CollectAnswer
+    from Startup import Mark
+    from Cancellation import Cancellable
 
 # Create Data folder if it doesn't exist
 os.makedirs("Data", exist_ok=True)
@@ -16,8 +33,20 @@ Username = env_vars.get("Username")
 Assistantname = env_vars.get("Assistantname")
 GroqAPIKey = env_vars.get("GroqAPIKey")
 
-# Initialize the Groq client
-client = Groq(api_key=GroqAPIKey)
+# Groq client, created lazily
+Client = None
+ClientLock = threading.Lock()
+
+def GetClient():
+    # The Groq client is built on first use instead of at import, so importing
+    # this module never touches the network
+    global Client
+    with ClientLock:
+        if Client is None:
+            from groq import Groq
+            Mark("client: groq (Chatbot)")
+            Client = Groq(api_key=GroqAPIKey)
+        return Client
 
 # System message for the AI
 System = f"""Hello, I am {Username}, You are a very accurate and advanced AI chatbot named {Assistantname} which also has real-time up-to-date information from the internet.
@@ -30,15 +59,6 @@ SystemChatBot = [
     {"role": "system", "content": System}
 ]
 
-# Load chat history if available
-try:
-    with open(r"Data\ChatLog.json", "r") as f:
-        messages = load(f)
-except (FileNotFoundError, json.decoder.JSONDecodeError):
-    with open(r"Data\ChatLog.json", "w") as f:
-        dump([], f)
-    messages = []
-
 # Function to return real-time information
 def RealtimeInformation():
     now = datetime.datetime.now()
@@ -57,17 +77,245 @@ def AnswerModifier(Answer):
     non_empty_lines = [line.strip() for line in lines if line.strip()]
     return '\n'.join(non_empty_lines)
 
-# Main chatbot function
-def ChatBot(Query, retry=False):
-    try:
-        with open(r"Data\ChatLog.json", "r") as fr:
-            messages = load(fr)
+# --- Near-duplicate answer cache for general queries ---
+# Paraphrased questions ("what is python" / "what's python programming language")
+# are answered from earlier completions. The key is the question form plus the
+# content words in order, with stopwords and generic descriptors ("programming
+# language", "meaning") dropped. Lookups try that key first, then MinHash
+# signatures over character 3-grams of the content words, bucketed with LSH
+# bands; a near match only counts when both queries have the same content words
+# in the same order, allowing nothing but small typos in words without digits,
+# so "25 times 4" never answers "25 times 5" and "celsius to fahrenheit" never
+# answers "fahrenheit to celsius".
+AnswerCacheSize = int(env_vars.get("AnswerCacheSize") or 512)
+AnswerCacheThreshold = float(env_vars.get("AnswerCacheThreshold") or 0.8)
+MINHASH_PERMUTATIONS = 64
+LSH_BANDS = 16
+MERSENNE_PRIME = (1 << 61) - 1
+MINHASH_SEEDS = [
+    (int.from_bytes(hashlib.blake2b(f"a{i}".encode(), digest_size=8).digest(), "little") % MERSENNE_PRIME | 1,
+     int.from_bytes(hashlib.blake2b(f"b{i}".encode(), digest_size=8).digest(), "little") % MERSENNE_PRIME)
+    for i in range(MINHASH_PERMUTATIONS)
+]
+
+# Answers to these depend on the clock or on the previous turn, so they are never cached
+TIME_SENSITIVE = re.compile(
+    r"\b(time|date|day|today|tonight|tomorrow|yesterday|now|current|currently|latest|recent|news|"
+    r"weather|week|month|year|he|she|him|her|his|it|that|this|they|them|again|more)\b"
+)
+# Only politeness is dropped from the key; "who is", "who was" and "what is"
+# ask different questions and must not share an answer
+POLITE_FILLER = re.compile(r"\b(please|kindly|can you|could you|would you|will you)\b")
+# The question word and its verb; near matches must agree on it
+QUESTION_FORM = re.compile(r"^(what|who|whom|whose|when|where|why|how|which)(?: (is|are|was|were|do|does|did|can|could|will|would|should|has|have|had))?\b")
+CONTRACTIONS = {"what's": "what is", "who's": "who is", "how's": "how is", "where's": "where is",
+                "whats": "what is", "whos": "who is", "hows": "how is", "wheres": "where is"}
+CONTRACTION = re.compile(r"\b(" + "|".join(re.escape(short) for short in CONTRACTIONS) + r")\b")
+# Words that carry no content of their own; the question form is kept separately
+STOPWORDS = set(
+    "a an the of in on at to for from by with about into and or is are was were be been being am "
+    "do does did can could will would should shall may might must has have had what who whom whose "
+    "when where why how which i me my we us our you your tell give explain define describe".split()
+)
+# Descriptors that don't change what is asked: "what is python programming language"
+GENERIC_WORDS = set(
+    "meaning definition mean means exactly actually really basically briefly simply short simple "
+    "programming language concept term word thing".split()
+)
+# Content words this close (difflib ratio) count as the same word misspelled
+TYPO_RATIO = 0.85
+
+def NormalizeQuestion(Query):
+    text = CONTRACTION.sub(lambda match: CONTRACTIONS[match.group(1)], Query.lower())
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+def ContentWords(text):
+    words = [word for word in text.split() if word not in STOPWORDS and word not in GENERIC_WORDS]
+    return tuple(words) or tuple(text.split())
+
+def SameContent(words, other):
+    # Same words in the same order; a word may differ only by a typo, never in a number
+    if len(words) != len(other):
+        return False
+    for word, other_word in zip(words, other):
+        if word == other_word:
+            continue
+        if any(c.isdigit() for c in word + other_word) or min(len(word), len(other_word)) < 5:
+            return False
+        if difflib.SequenceMatcher(None, word, other_word).ratio() < TYPO_RATIO:
+            return False
+    return True
+
+def MinHash(text):
+    shingles = {text[i:i + 3] for i in range(max(1, len(text) - 2))}
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), "little") for s in shingles]
+    return tuple(min((a * h + b) % MERSENNE_PRIME for h in hashes) for a, b in MINHASH_SEEDS)
+
+class AnswerCache:
+    def __init__(self, size=AnswerCacheSize, threshold=AnswerCacheThreshold):
+        self.size = size
+        self.threshold = threshold
+        self.entries = OrderedDict()  # exact key -> (signature, content words, answer)
+        self.bands = {}               # (band, band hash) -> set of exact keys
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+    def Key(self, Query):
+        # Returns (exact key, signature, content words), or None when the query must not be cached
+        text = NormalizeQuestion(Query)
+        if not text or TIME_SENSITIVE.search(text):
+            return None
+        core = " ".join(POLITE_FILLER.sub(" ", text).split()) or text
+        form = QUESTION_FORM.match(core)
+        form = form.group(0) if form else ""
+        words = ContentWords(core[len(form):])
+        content = " ".join(words)
+        # The signature starts with the question form, so LSH buckets never mix forms
+        return hashlib.sha1(f"{form}|{content}".encode()).hexdigest(), (form,) + MinHash(content), words
+
+    def BandKeys(self, signature):
+        rows = MINHASH_PERMUTATIONS // LSH_BANDS
+        form, hashes = signature[0], signature[1:]
+        return [(form, band, hashes[band * rows:(band + 1) * rows]) for band in range(LSH_BANDS)]
+
+    def Get(self, Query):
+        key = self.Key(Query)
+        if key is None:
+            return None
+        exact, signature, words = key
+        with self.lock:
+            if exact in self.entries:
+                self.entries.move_to_end(exact)
+                self.hits += 1
+                return self.entries[exact][2]
+            candidates = set()
+            for band_key in self.BandKeys(signature):
+                candidates |= self.bands.get(band_key, set())
+            best, best_similarity = None, 0.0
+            for candidate in candidates:
+                other, other_words, _ = self.entries[candidate]
+                if not SameContent(words, other_words):
+                    continue
+                similarity = sum(x == y for x, y in zip(signature[1:], other[1:])) / MINHASH_PERMUTATIONS
+                if similarity > best_similarity:
+                    best, best_similarity = candidate, similarity
+            if best is not None and best_similarity >= self.threshold:
+                self.entries.move_to_end(best)
+                self.near_hits += 1
+                return self.entries[best][2]
+            self.misses += 1
+            return None
+
+    def Put(self, Query, Answer):
+        key = self.Key(Query)
+        if key is None:
+            return
+        exact, signature, words = key
+        with self.lock:
+            if exact in self.entries:
+                self.Remove(exact)
+            self.entries[exact] = (signature, words, Answer)
+            for band_key in self.BandKeys(signature):
+                self.bands.setdefault(band_key, set()).add(exact)
+            while len(self.entries) > self.size:
+                self.Remove(next(iter(self.entries)))
 
-        messages.append({"role": "user", "content": Query})
+    def Remove(self, exact):
+        signature = self.entries.pop(exact)[0]
+        for band_key in self.BandKeys(signature):
+            bucket = self.bands.get(band_key)
+            if bucket:
+                bucket.discard(exact)
+                if not bucket:
+                    del self.bands[band_key]
 
-        completion = client.chat.completions.create(
+    def Stats(self):
+        with self.lock:
+            lookups = self.hits + self.near_hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "exact_hits": self.hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.near_hits) / lookups if lookups else 0.0,
+            }
+
+Answers = AnswerCache()
+
+# (cached question, new question, should the cached answer be reused)
+CACHE_CHECKS = [
+    ("what is python", "whats python programming language", True),
+    ("what is python", "what's python?", True),
+    ("please explain the theory of general relativity", "explain the theory of general relativty", True),
+    ("what is 25 times 4", "what is 25 times 5", False),
+    ("square root of 144", "square root of 169", False),
+    ("who is the president of india", "who is the president of indonesia", False),
+    ("convert celsius to fahrenheit", "convert fahrenheit to celsius", False),
+    ("who is albert einstein", "who was albert einstein", False),
+    ("what is python", "who is python", False),
+    ("what is the capital of france", "what is the capital of germany", False),
+]
+
+def CheckAnswerCache():
+    # Replays CACHE_CHECKS on a fresh cache; returns True when every pair behaves
+    failures = 0
+    for cached, asked, expected in CACHE_CHECKS:
+        cache = AnswerCache()
+        cache.Put(cached, "answer")
+        reused = cache.Get(asked) is not None
+        if reused != expected:
+            failures += 1
+        print(f"{'ok' if reused == expected else 'FAIL':<6}{cached!r} -> {asked!r}: {'reused' if reused else 'miss'}")
+    print(f"[Chatbot] answer cache: {len(CACHE_CHECKS) - failures}/{len(CACHE_CHECKS)} checks passed")
+    return failures == 0
+
+ErrorMessage = "An error occurred. Please try again."
+
+# Appends a finished turn to the chat log and, when allowed, to the answer cache
+def RecordTurn(Query, Answer, cache=True):
+    # Only the new user/assistant pair is appended to the log
+    AppendMessages([
+        {"role": "user", "content": Query},
+        {"role": "assistant", "content": Answer}
+    ])
+    if cache:
+        Answers.Put(Query, Answer)
+
+# Streaming chatbot: yields ("delta", text) and ("sentence", text) events
+# while the answer is generated and returns the answer, or None on failure.
+# With log=False the caller records the turn itself, and save_summary lets it
+# hold back the rolling summary update too (see Speculation.py).
+# Cancelling token closes the completion stream (see Cancellation.py).
+def ChatBotStream(Query, retry=False, log=True, token=None, save_summary=None):
+    token = Cancellable(token)
+    # A cached answer to the same or a near-identical question skips the LLM call
+    Answer = None if retry else Answers.Get(Query)
+    if Answer is not None:
+        yield from SentenceEvents([Answer])
+        if log:
+            RecordTurn(Query, Answer, cache=False)
+        return Answer
+
+    Answer = ""
+    try:
+        # Recent turns plus a rolling summary, sized to fit the model window.
+        # The retry runs without history so a bad log can't fail the query twice.
+        messages, _ = BuildContext(
+            SystemChatBot + [{"role": "system", "content": RealtimeInformation()}],
+            Query,
+            max_tokens=1024,
+            history=not retry,
+            save_summary=save_summary
+        )
+
+        token.Check()
+        started = time.perf_counter()
+        completion = GetClient().chat.completions.create(
             model="llama3-70b-8192",
-            messages=SystemChatBot + [{"role": "system", "content": RealtimeInformation()}] + messages,
+            messages=messages,
             max_tokens=1024,
             temperature=0.7,
             top_p=1,
@@ -75,30 +323,35 @@ def ChatBot(Query, retry=False):
             stop=None
         )
 
-        Answer = ""
-        for chunk in completion:
-            if chunk.choices[0].delta.content:
-                Answer += chunk.choices[0].delta.content
-
-        Answer = Answer.replace("</s>", "")
-        messages.append({"role": "assistant", "content": Answer})
-
-        with open(r"Data\ChatLog.json", "w") as f:
-            dump(messages, f, indent=4)
-
-        return AnswerModifier(Answer)
+        for kind, text in SentenceEvents(StreamDeltas(completion, "llm.chat", started, token)):
+            if kind == "delta":
+                Answer += text
+            yield kind, text
 
     except Exception as e:
         print(f"Error: {e}")
-        if not retry:
-            with open(r"Data\ChatLog.json", "w") as f:
-                dump([], f, indent=4)
-            return ChatBot(Query, retry=True)
-        else:
-            return "An error occurred. Please try again."
+        # Once part of the answer has been shown a retry would repeat it
+        if not retry and not Answer:
+            return (yield from ChatBotStream(Query, retry=True, log=log, token=token, save_summary=save_summary))
+        elif not Answer:
+            yield "delta", ErrorMessage
+            yield "sentence", ErrorMessage
+        return None
+
+    Answer = Answer.replace("</s>", "")
+    if log:
+        # Answers from the no-history retry are not cached
+        RecordTurn(Query, Answer, cache=not retry)
+    return Answer
+
+# Main chatbot function
+def ChatBot(Query):
+    return AnswerModifier(CollectAnswer(ChatBotStream(Query)))
 
 # Run in a loop
 if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "check-cache":
+        sys.exit(0 if CheckAnswerCache() else 1)
     while True:
         user_input = input("Enter your question: ")
         if user_input.lower() in ["exit", "quit"]:
@@ -0,0 +1,205 @@
+from dotenv import dotenv_values
+import threading
+import json
+import math
+import os
+import re
+
+try:
+    from Backend.ChatStore import LoadMessages, LoadMessageRange, MessageCount
+except ModuleNotFoundError:
+    from ChatStore import LoadMessages, LoadMessageRange, MessageCount
+
+
+# Token-budgeted context assembly for ChatBot and RealtimeSearchEngine.
+#
+# Instead of sending the whole chat log, the request is built from the system
+# messages, a rolling summary of older turns and as many recent turns as fit
+# into the budget. The budget is the model window minus the tokens reserved for
+# the answer, so the request can never overflow the 8192 token window.
+
+env_vars = dotenv_values(".env")
+ContextWindow = int(env_vars.get("ContextWindow") or 8192)
+SummaryTokenBudget = int(env_vars.get("SummaryTokenBudget") or 512)
+# Upper bound on how much history is read from the store per request
+MaxHistoryMessages = int(env_vars.get("MaxHistoryMessages") or 200)
+
+SUMMARY_FILE = os.path.join("Data", "ContextSummary.json")
+MESSAGE_OVERHEAD = 4 # role and separator tokens per message
+TRUNCATION_MARK = "\n[...]"
+TRUNCATION_MARK_TOKENS = 4
+
+SummaryLock = threading.Lock()
+LastContextStats = {}
+
+# tiktoken may download its BPE file the first time an encoding is loaded, so
+# the tokenizer is set up on the first count rather than at import
+Encoding = None
+EncodingLoaded = False
+
+def GetEncoding():
+    global Encoding, EncodingLoaded
+    if not EncodingLoaded:
+        try:
+            import tiktoken
+            Encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            Encoding = None
+        EncodingLoaded = True
+    return Encoding
+
+def CountTokens(text):
+    encoding = GetEncoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    # Roughly four characters per token for English text
+    return math.ceil(len(text) / 4)
+
+def MessageTokens(message):
+    return CountTokens(message["content"]) + MESSAGE_OVERHEAD
+
+def TruncateTokens(text, max_tokens):
+    # The start of text, at most max_tokens long
+    if max_tokens <= 0:
+        return ""
+    encoding = GetEncoding()
+    if encoding is not None:
+        tokens = encoding.encode(text, disallowed_special=())
+        return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+    return text[:max_tokens * 4]
+
+def FitSystemMessages(SystemMessages, limit):
+    # Shortens the largest system message (the search results) until all of
+    # them fit into limit tokens; the caller's messages are left untouched
+    messages = list(SystemMessages)
+    for _ in range(4 * len(messages)):
+        excess = sum(MessageTokens(m) for m in messages) - limit
+        if excess <= 0:
+            break
+        index = max(range(len(messages)), key=lambda i: MessageTokens(messages[i]))
+        content = messages[index]["content"]
+        keep = CountTokens(content) - excess - TRUNCATION_MARK_TOKENS
+        if keep <= 0 and not content:
+            break  # nothing left to cut
+        messages[index] = dict(messages[index], content=(TruncateTokens(content, keep) + TRUNCATION_MARK) if keep > 0 else "")
+    return messages
+
+def CompactMessage(message, max_words=25):
+    # Keep the first sentence of a message, capped at max_words
+    text = " ".join(message["content"].split())
+    sentence = re.split(r"(?<=[.!?])\s", text, maxsplit=1)[0]
+    words = sentence.split()
+    if len(words) > max_words:
+        sentence = " ".join(words[:max_words]) + " ..."
+    speaker = "User" if message["role"] == "user" else "Assistant"
+    return f"{speaker}: {sentence}"
+
+def LoadSummary():
+    try:
+        with open(SUMMARY_FILE, "r", encoding="utf-8") as f:
+            state = json.load(f)
+            return state["covered"], state["lines"]
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        return 0, []
+
+def SaveSummary(covered, lines):
+    os.makedirs(os.path.dirname(SUMMARY_FILE), exist_ok=True)
+    temp_path = SUMMARY_FILE + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump({"covered": covered, "lines": lines}, f)
+    os.replace(temp_path, SUMMARY_FILE)
+
+def StoreSummary(covered, lines):
+    # Saves a summary computed earlier (a speculative answer that was adopted),
+    # unless the summary on disk has moved past it in the meantime
+    with SummaryLock:
+        if LoadSummary()[0] <= covered:
+            SaveSummary(covered, lines)
+
+def RollSummary(upto, loaded, loaded_start, save=SaveSummary):
+    # Extend the rolling summary so it covers every message before index `upto`.
+    # Messages already in memory are reused; older gaps are read from the store.
+    # save(covered, lines) is called with the SummaryLock held.
+    with SummaryLock:
+        covered, lines = LoadSummary()
+        if covered > upto:
+            # The log was reset underneath the summary
+            covered, lines = 0, []
+        if covered == upto:
+            return lines
+
+        # Only the newest messages can survive in a capped summary anyway
+        covered = max(covered, upto - MaxHistoryMessages)
+        if covered < loaded_start:
+            pending = LoadMessageRange(covered, upto)
+        else:
+            pending = loaded[covered - loaded_start:upto - loaded_start]
+        lines = lines + [CompactMessage(m) for m in pending]
+
+        # Drop the oldest lines once the summary outgrows its own budget
+        total = sum(CountTokens(line) + 1 for line in lines)
+        while lines and total > SummaryTokenBudget:
+            total -= CountTokens(lines[0]) + 1
+            lines = lines[1:]
+
+        save(upto, lines)
+        return lines
+
+def BuildContext(SystemMessages, Query, max_tokens=1024, budget=None, history=True, save_summary=None):
+    # Returns (messages, stats) where messages fit into `budget` prompt tokens.
+    # save_summary replaces SaveSummary for the rolled summary (see Speculation.py).
+    if budget is None:
+        budget = ContextWindow - max_tokens
+    query_message = {"role": "user", "content": Query}
+    # Oversized search results are cut so that the prompt itself fits
+    SystemMessages = FitSystemMessages(SystemMessages, budget - MessageTokens(query_message))
+    fixed_tokens = sum(MessageTokens(m) for m in SystemMessages) + MessageTokens(query_message)
+
+    total = MessageCount() if history else 0
+    loaded = LoadMessages(last=MaxHistoryMessages) if total else []
+    loaded_start = total - len(loaded)
+
+    # Fill the window with the newest turns first
+    available = max(0, budget - fixed_tokens - SummaryTokenBudget)
+    window_start = len(loaded)
+    window_tokens = 0
+    while window_start > 0:
+        tokens = MessageTokens(loaded[window_start - 1])
+        if window_tokens + tokens > available:
+            break
+        window_tokens += tokens
+        window_start -= 1
+    # Never start the window on an assistant reply without its question
+    if window_start < len(loaded) and loaded[window_start]["role"] == "assistant":
+        window_tokens -= MessageTokens(loaded[window_start])
+        window_start += 1
+    window = loaded[window_start:]
+
+    trimmed_messages = loaded_start + window_start
+    trimmed_tokens = sum(MessageTokens(m) for m in loaded[:window_start])
+
+    summary = []
+    if trimmed_messages:
+        lines = RollSummary(trimmed_messages, loaded, loaded_start, save=save_summary or SaveSummary)
+        if lines:
+            summary = [{"role": "system", "content": "Summary of the earlier conversation:\n" + "\n".join(lines)}]
+    summary_tokens = sum(MessageTokens(m) for m in summary)
+    if fixed_tokens + summary_tokens + window_tokens > budget:
+        # No room left next to large search results
+        summary, summary_tokens = [], 0
+
+    messages = SystemMessages + summary + window + [query_message]
+    stats = {
+        "budget": budget,
+        "prompt_tokens": fixed_tokens + summary_tokens + window_tokens,
+        "history_messages": len(window),
+        "summary_tokens": summary_tokens,
+        "trimmed_messages": trimmed_messages,
+        # Only counts the trimmed turns that were read for this request
+        "trimmed_tokens": trimmed_tokens,
+    }
+    LastContextStats.clear()
+    LastContextStats.update(stats)
+    print(f"[Context] {stats['prompt_tokens']}/{budget} tokens, {len(window)} recent messages, "
+          f"trimmed {trimmed_messages} messages ({trimmed_tokens} tokens) into a {summary_tokens} token summary")
+    return messages, stats
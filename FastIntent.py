@@ -0,0 +1,274 @@
+from collections import Counter, defaultdict
+from dotenv import dotenv_values
+import threading
+import json
+import sys
+import math
+import os
+import re
+
+# Local fast path in front of Model.FirstLayerDMM.
+#
+# Tier 1 is a compiled rule set for unambiguous commands (open x, close x,
+# system volume up, play x song, exit). Tier 2 is a small word n-gram naive
+# Bayes classifier trained on the decisions the Cohere model has made before,
+# which separates 'general' from 'realtime' questions. Its confidence threshold
+# is measured: the logged decisions are cross-validated and the threshold is the
+# lowest one whose held-out answers agree with the LLM at least
+# FastIntentPrecision of the time. Anything the local tiers are not confident
+# about returns None so the caller falls back to the LLM.
+#
+#   python FastIntent.py calibrate   prints the measured threshold
+
+env_vars = dotenv_values(".env")
+Assistantname = (env_vars.get("Assistantname") or "jarvis").lower()
+
+DECISION_LOG_FILE = os.path.join("Data", "DecisionLog.jsonl")
+# The classifier only answers when it has seen enough examples and is above a
+# threshold measured on held-out decisions; FastIntentConfidence fixes it instead
+NGRAM_CONFIDENCE = float(env_vars["FastIntentConfidence"]) if env_vars.get("FastIntentConfidence") else None
+NGRAM_PRECISION = float(env_vars.get("FastIntentPrecision") or 0.99)
+NGRAM_MIN_EXAMPLES = int(env_vars.get("FastIntentMinExamples") or 50)
+# Held-out answers that must back a threshold, folds, and new decisions between calibrations
+NGRAM_MIN_SUPPORT = 20
+NGRAM_FOLDS = 5
+NGRAM_RECALIBRATE = 100
+NGRAM_LABELS = ("general", "realtime")
+
+FILLER = re.compile(rf"^(?:(?:hey |ok |okay )?{re.escape(Assistantname)}[, ]+)?(?:please |can you |could you |would you )*", re.I)
+TRAILING = re.compile(r"(?:[, ]+(?:please|now|for me|" + re.escape(Assistantname) + r"))*[.!?]*$", re.I)
+
+EXIT_RULE = re.compile(r"^(?:bye|bye bye|goodbye|good bye|exit|quit|see you|see you later|that's all|stop listening)$")
+VOLUME_RULES = [
+    (re.compile(r"^(?:(?:turn |increase |raise )(?:the )?volume(?: up)?|volume up|turn up the volume|louder)$"), "system volume up"),
+    (re.compile(r"^(?:(?:turn |decrease |lower |reduce )(?:the )?volume(?: down)?|volume down|turn down the volume|quieter)$"), "system volume down"),
+    (re.compile(r"^(?:unmute|unmute (?:the )?(?:volume|sound|audio))$"), "system unmute"),
+    (re.compile(r"^(?:mute|mute (?:the )?(?:volume|sound|audio))$"), "system mute"),
+]
+APP_RULE = re.compile(r"^(open|close) (.+)$")
+# "play" only goes to automation for something that is clearly a song or a
+# video; "play a game with me" or "play twenty questions" is left to the LLM
+MEDIA = r"(?:song|track|video|music video|album|playlist)"
+PLAY_RULES = [
+    re.compile(rf"^play (?:the |a )?{MEDIA} (?:called |named )?(.+)$"),
+    re.compile(rf"^play (.+?) (?:{MEDIA}|on youtube)$"),
+    re.compile(r"^play (.+ by .+)$"),
+]
+NOT_MEDIA_WORDS = {"game", "games", "quiz", "questions", "chess", "cards", "trivia", "with", "me", "us"}
+APP_NAME = re.compile(r"^(?:the )?([a-z0-9][a-z0-9 .+&'-]{0,30}?)(?: app| application| website)?$")
+# Words that mean the request is more than a plain app name
+NOT_APP_WORDS = {
+    "and", "tell", "what", "who", "how", "why", "when", "where", "write", "search", "about",
+    "then", "play", "close", "open", "generate", "remind", "me", "my", "it", "this", "that", "all",
+}
+
+def Normalize(prompt):
+    text = " ".join(prompt.lower().split())
+    text = FILLER.sub("", text)
+    text = TRAILING.sub("", text)
+    return text.strip(" ,")
+
+def SplitAppNames(text):
+    # "chrome, firefox and notepad" -> ["chrome", "firefox", "notepad"]
+    names = []
+    for part in re.split(r",|\band\b", text):
+        match = APP_NAME.match(part.strip())
+        if not match:
+            return None
+        name = match.group(1).strip()
+        if not name or len(name.split()) > 3 or set(name.split()) & NOT_APP_WORDS:
+            return None
+        names.append(name)
+    return names
+
+def RuleDecision(text):
+    if EXIT_RULE.match(text):
+        return ["exit"]
+    for rule, decision in VOLUME_RULES:
+        if rule.match(text):
+            return [decision]
+    match = APP_RULE.match(text)
+    if match:
+        names = SplitAppNames(match.group(2))
+        if names:
+            return [f"{match.group(1)} {name}" for name in names]
+        return None
+    for rule in PLAY_RULES:
+        match = rule.match(text)
+        if match:
+            name = match.group(1)
+            if " and " in name or set(name.split()) & NOT_MEDIA_WORDS:
+                return None
+            return [f"play {name}"]
+    return None
+
+def Features(text):
+    words = re.findall(r"[a-z0-9']+", text)
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+# Multinomial naive Bayes over word unigrams and bigrams
+class NgramClassifier:
+    def __init__(self):
+        self.label_counts = Counter()
+        self.feature_counts = defaultdict(Counter)
+        self.feature_totals = Counter()
+        self.vocabulary = set()
+        self.examples = []
+        # Measured by Calibrate; None means the classifier never answers
+        self.threshold = NGRAM_CONFIDENCE
+
+    def Learn(self, text, label):
+        self.examples.append((text, label))
+        features = Features(text)
+        self.label_counts[label] += 1
+        self.feature_counts[label].update(features)
+        self.feature_totals[label] += len(features)
+        self.vocabulary.update(features)
+
+    def Predict(self, text):
+        total = sum(self.label_counts.values())
+        if total < NGRAM_MIN_EXAMPLES or len(self.label_counts) < 2:
+            return None, 0.0
+        features = Features(text)
+        vocabulary_size = len(self.vocabulary) + 1
+        scores = {}
+        for label, count in self.label_counts.items():
+            score = math.log(count / total)
+            denominator = self.feature_totals[label] + vocabulary_size
+            for feature in features:
+                score += math.log((self.feature_counts[label][feature] + 1) / denominator)
+            scores[label] = score
+        best = max(scores, key=scores.get)
+        # Softmax over the log scores gives the posterior of the best label
+        top = scores[best]
+        confidence = 1.0 / sum(math.exp(s - top) for s in scores.values())
+        return best, confidence
+
+def HeldOutPredictions(examples, folds=NGRAM_FOLDS):
+    # (confidence, agrees with the LLM) for every example, each one predicted by
+    # a classifier trained on the other folds
+    predictions = []
+    for fold in range(folds):
+        model = NgramClassifier()
+        for i, (text, label) in enumerate(examples):
+            if i % folds != fold:
+                model.Learn(text, label)
+        for text, label in examples[fold::folds]:
+            predicted, confidence = model.Predict(text)
+            if predicted:
+                predictions.append((confidence, predicted == label))
+    return predictions
+
+def MeasureThreshold(examples, precision=NGRAM_PRECISION):
+    # Lowest confidence whose held-out answers at or above it reach the precision;
+    # returns (threshold, precision, coverage), threshold None when none does
+    predictions = sorted(HeldOutPredictions(examples), reverse=True)
+    best = (None, 0.0, 0.0)
+    correct = 0
+    for count, (confidence, agrees) in enumerate(predictions, 1):
+        correct += agrees
+        next_confidence = predictions[count][0] if count < len(predictions) else None
+        if confidence == next_confidence:
+            continue
+        if count >= NGRAM_MIN_SUPPORT and correct / count >= precision:
+            best = (confidence, correct / count, count / len(examples))
+    return best
+
+def Calibrate(classifier):
+    if NGRAM_CONFIDENCE is not None:
+        return
+    threshold, precision, coverage = MeasureThreshold(classifier.examples)
+    classifier.threshold = threshold
+    if threshold is None:
+        print(f"[FastIntent] No classifier threshold reaches {NGRAM_PRECISION:.0%} precision on {len(classifier.examples)} decisions")
+    else:
+        print(f"[FastIntent] Classifier threshold {threshold:.4f}: {precision:.1%} held-out precision, {coverage:.0%} coverage")
+
+Classifier = None
+ClassifierLock = threading.Lock()
+Stats = Counter()
+
+def TrainingLabel(text, decision):
+    # Only single general/realtime decisions that echo the query are learnable,
+    # because those are the ones the fast path can reproduce exactly.
+    if len(decision) != 1:
+        return None
+    label, _, rest = decision[0].partition(" ")
+    if label in NGRAM_LABELS and Normalize(rest) == text:
+        return label
+    return None
+
+def GetClassifier():
+    global Classifier
+    with ClassifierLock:
+        if Classifier is None:
+            Classifier = NgramClassifier()
+            try:
+                with open(DECISION_LOG_FILE, "r", encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                        except json.JSONDecodeError:
+                            continue
+                        text = Normalize(entry["query"])
+                        label = TrainingLabel(text, entry["decision"])
+                        if label:
+                            Classifier.Learn(text, label)
+            except FileNotFoundError:
+                pass
+            Calibrate(Classifier)
+        return Classifier
+
+def FastDecision(prompt):
+    # Returns a decision list like FirstLayerDMM, or None to fall back to the LLM
+    text = Normalize(prompt)
+    if not text:
+        return None
+    decision = RuleDecision(text)
+    if decision:
+        Stats["rules"] += 1
+        return decision
+    classifier = GetClassifier()
+    with ClassifierLock:
+        label, confidence = classifier.Predict(text)
+    if label and classifier.threshold is not None and confidence >= classifier.threshold:
+        Stats["ngram"] += 1
+        return [f"{label} {prompt.strip()}"]
+    Stats["fallback"] += 1
+    return None
+
+def LearnDecision(prompt, decision):
+    # Logs an LLM decision and feeds it to the classifier
+    os.makedirs(os.path.dirname(DECISION_LOG_FILE), exist_ok=True)
+    with open(DECISION_LOG_FILE, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"query": prompt, "decision": decision}, ensure_ascii=False) + "\n")
+    text = Normalize(prompt)
+    label = TrainingLabel(text, decision)
+    if label:
+        classifier = GetClassifier()
+        with ClassifierLock:
+            classifier.Learn(text, label)
+            if len(classifier.examples) % NGRAM_RECALIBRATE == 0:
+                Calibrate(classifier)
+
+def FastPathStats():
+    total = sum(Stats.values())
+    hits = Stats["rules"] + Stats["ngram"]
+    return {
+        "rules": Stats["rules"],
+        "ngram": Stats["ngram"],
+        "fallback": Stats["fallback"],
+        "hit_rate": hits / total if total else 0.0,
+    }
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "calibrate":
+        examples = GetClassifier().examples
+        threshold, precision, coverage = MeasureThreshold(examples)
+        print(f"{len(examples)} logged decisions, target precision {NGRAM_PRECISION:.0%}")
+        print("no threshold reaches it" if threshold is None else
+              f"threshold {threshold:.4f}: {precision:.1%} precision, {coverage:.0%} of decisions answered locally")
+        sys.exit(0)
+    while True:
+        user_input = input(">>> ")
+        print(FastDecision(user_input), FastPathStats())
@@ -0,0 +1,8 @@
+# Text clean-up shared by the chat view and the transcript snapshot. No Qt
+# here, so the backend can format messages without loading the GUI.
+
+def AnswerModifier(Answer):
+    # Drops the blank lines of an answer
+    lines = Answer.split('\n')
+    non_empty_lines = [line for line in lines if line.strip()]
+    return '\n'.join(non_empty_lines)
@@ -1,24 +1,27 @@
-from PyQt5.QtWidgets import QApplication, QMainWindow, QTextEdit, QStackedWidget, QWidget, QLineEdit, QGridLayout, QVBoxLayout, QHBoxLayout, QPushButton, QFrame, QLabel, QSizePolicy
-from PyQt5.QtGui import QIcon, QPainter, QMovie, QColor, QTextCharFormat, QFont, QPixmap, QTextBlockFormat
-from PyQt5.QtCore import Qt, QSize, QTimer
+from PyQt5.QtWidgets import QApplication, QMainWindow, QStackedWidget, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QFrame, QLabel, QSizePolicy, QListWidget, QListWidgetItem, QListView, QDialog, QStyledItemDelegate, QAbstractItemView
+from PyQt5.QtGui import QIcon, QPainter, QMovie, QColor, QFont, QPixmap
+from PyQt5.QtCore import Qt, QSize, QRect, QObject, QTimer, QModelIndex, QAbstractListModel, pyqtSignal
 from dotenv import dotenv_values
+import threading
 import sys
 import os
 
+try:
+    from Backend.Formatting import AnswerModifier
+except ModuleNotFoundError:
+    from Formatting import AnswerModifier
+
 
 env_vars=dotenv_values(".env")
 Assistantname =env_vars.get("Assistantname")
+# Most chat messages kept in the transcript view; older ones are re-read when scrolled to
+TranscriptResident = int(env_vars.get("TranscriptResident") or 300)
+TRANSCRIPT_PAGE = 50
 current_dir = os.getcwd()
 old_chat_message =""
 TempDirPath = rf"{current_dir}\Frontend\Files"
 GraphicsDirPath = rf"{current_dir}\Frontend\Graphics"
 
-def AnswerModifier(Answer):
-    lines =Answer.split('\n')
-    non_empty_lines =[line for line in lines if line.strip()]
-    modified_answer = '\n'.join(non_empty_lines)
-    return modified_answer
-
 def QueryModifier(Query):
     new_query = Query.lower().strip()
     query_words = new_query.split()
@@ -35,23 +38,73 @@ def QueryModifier(Query):
             new_query += "."
     return new_query.capitalize()
 
+# --- In-process status/response bus ---
+# Backend threads publish into this bus and the GUI receives the updates through
+# Qt signals, so nothing has to poll the Frontend\Files\*.data files any more.
+# The .data files are still written so the last state survives a restart.
+BusSubscribers = {}
+BusLastValues = {}
+BusLock = threading.Lock()
+
+def Subscribe(Topic, Callback, Replay=True):
+    with BusLock:
+        BusSubscribers.setdefault(Topic, []).append(Callback)
+        has_value = Topic in BusLastValues
+        last_value = BusLastValues.get(Topic)
+    # Late subscribers immediately get the current value of the topic
+    if Replay and has_value:
+        Callback(last_value)
+
+def Unsubscribe(Topic, Callback):
+    with BusLock:
+        callbacks = BusSubscribers.get(Topic, [])
+        if Callback in callbacks:
+            callbacks.remove(Callback)
+
+def Publish(Topic, Value):
+    with BusLock:
+        BusLastValues[Topic] = Value
+        callbacks = list(BusSubscribers.get(Topic, []))
+    for callback in callbacks:
+        try:
+            callback(Value)
+        except Exception as e:
+            print(f"[GUI] Bus subscriber error on '{Topic}': {e}")
+
+def LastValue(Topic, Default=None):
+    with BusLock:
+        return BusLastValues.get(Topic, Default)
+
+def WriteDataFile(Filename, Text):
+    with open(rf'{TempDirPath}\{Filename}', "w", encoding='utf-8') as file:
+        file.write(Text)
+
+def ReadDataFile(Filename):
+    try:
+        with open(rf'{TempDirPath}\{Filename}', "r", encoding='utf-8') as file:
+            return file.read()
+    except FileNotFoundError:
+        return ""
+
 def SetMicrophoneStatus(Command):
-    with open(rf'{TempDirPath}\Mic.data', "w", encoding='utf-8') as file:
-            file.write(Command)
+    WriteDataFile('Mic.data', Command)
+    Publish("mic", Command)
 
 def GetMicrophoneStatus():
-    with open(rf'{TempDirPath}\Mic.data', "r", encoding='utf-8') as file:
-        Status = file.read()
+    Status = LastValue("mic")
+    if Status is None:
+        Status = ReadDataFile('Mic.data')
     return Status
 
 def SetAssistantStatus(Status):
-    with open(rf'{TempDirPath}\Status.data', "w", encoding='utf-8') as file:
-        file.write(Status)
+    WriteDataFile('Status.data', Status)
+    Publish("status", Status)
 
 
 def GetAssistantStatus():
-    with open(rf'{TempDirPath}\Status.data', "r", encoding='utf-8') as file:
-        Status = file.read()
+    Status = LastValue("status")
+    if Status is None:
+        Status = ReadDataFile('Status.data')
     return Status
 
 # --- REMOVED --- MicButtonInitialed() and MicButtonClosed() are no longer needed
@@ -66,8 +119,286 @@ def TempDirectoryPath(Filename):
     return Path
 
 def ShowTextToScreen(Text):
-    with open(rf'{TempDirPath}\Responses.data', "w", encoding='utf-8') as file:
-        file.write(Text)
+    WriteDataFile('Responses.data', Text)
+    Publish("response", Text)
+
+# Partial answers are only published on the bus; the GUI keeps replacing the
+# in-progress message until ShowTextToScreen delivers the final text.
+def ShowPartialTextToScreen(Text):
+    Publish("response.partial", Text)
+
+# Bridges bus topics onto Qt signals. Signals emitted from the backend thread are
+# queued onto the GUI thread by Qt, so widgets update without any timers.
+class GuiBridge(QObject):
+    StatusChanged = pyqtSignal(str)
+    ResponseChanged = pyqtSignal(str)
+    PartialResponseChanged = pyqtSignal(str)
+    MicChanged = pyqtSignal(str)
+    ImageJobChanged = pyqtSignal(object)
+    TranscriptSourceChanged = pyqtSignal(object)
+
+    def __init__(self):
+        super().__init__()
+        Subscribe("status", self.StatusChanged.emit, Replay=False)
+        Subscribe("response", self.ResponseChanged.emit, Replay=False)
+        Subscribe("response.partial", self.PartialResponseChanged.emit, Replay=False)
+        Subscribe("mic", self.MicChanged.emit, Replay=False)
+        Subscribe("image.job", self.ImageJobChanged.emit, Replay=False)
+        Subscribe("transcript.source", self.TranscriptSourceChanged.emit, Replay=False)
+
+Bridge = None
+
+def GetGuiBridge():
+    global Bridge
+    if Bridge is None:
+        Bridge = GuiBridge()
+    return Bridge
+
+# Strip of generated-image thumbnails under the chat. Only the small cached
+# thumbnails are decoded here; the full-resolution file is loaded on click.
+class ImageGallery(QListWidget):
+    THUMBNAIL_SIZE = 128
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setViewMode(QListView.IconMode)
+        self.setFlow(QListView.LeftToRight)
+        self.setWrapping(False)
+        self.setMovement(QListView.Static)
+        self.setIconSize(QSize(self.THUMBNAIL_SIZE, self.THUMBNAIL_SIZE))
+        self.setFixedHeight(self.THUMBNAIL_SIZE + 30)
+        self.setSpacing(6)
+        self.setFrameStyle(QFrame.NoFrame)
+        self.setStyleSheet("background-color: black; border: none;")
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAsNeeded)
+        self.seen = set()
+        self.viewer = None
+        self.itemClicked.connect(self.openImage)
+        GetGuiBridge().ImageJobChanged.connect(self.onImageJob)
+        self.hide()
+
+    def onImageJob(self, event):
+        if event.get("event") != "completed":
+            return
+        for entry in event.get("result") or []:
+            self.addImage(entry.get("image"), entry.get("thumbnail"), event.get("prompt", ""))
+
+    def addImage(self, image_path, thumbnail_path, prompt=""):
+        if not image_path or image_path in self.seen:
+            return
+        pixmap = QPixmap(thumbnail_path or "")
+        if pixmap.isNull():
+            return
+        self.seen.add(image_path)
+        item = QListWidgetItem(QIcon(pixmap), "")
+        item.setToolTip(prompt)
+        item.setData(Qt.UserRole, image_path)
+        # Newest images first
+        self.insertItem(0, item)
+        self.scrollToTop()
+        self.show()
+
+    def openImage(self, item):
+        image_path = item.data(Qt.UserRole)
+        pixmap = QPixmap(image_path)
+        if pixmap.isNull():
+            print(f"[GUI] Unable to open image {image_path}")
+            return
+        screen = QApplication.desktop().availableGeometry(self)
+        if pixmap.width() > screen.width() * 0.9 or pixmap.height() > screen.height() * 0.9:
+            pixmap = pixmap.scaled(int(screen.width() * 0.9), int(screen.height() * 0.9), Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        self.viewer = QDialog(self)
+        self.viewer.setWindowTitle(item.toolTip() or os.path.basename(image_path))
+        self.viewer.setStyleSheet("background-color: black;")
+        layout = QVBoxLayout(self.viewer)
+        layout.setContentsMargins(0, 0, 0, 0)
+        label = QLabel()
+        label.setPixmap(pixmap)
+        label.setAlignment(Qt.AlignCenter)
+        layout.addWidget(label)
+        self.viewer.show()
+
+# --- Chat transcript ---
+# The conversation is a QListView over TranscriptModel, so only the rows on
+# screen are painted and an append only lays out the resident rows, however
+# long the history is. History comes from a transcript source published on the
+# "transcript.source" topic (Count() and LoadRange(start, stop) -> formatted
+# messages): the newest page is shown first, and older pages are read when the
+# view is scrolled to the top. At most TranscriptResident rows stay loaded;
+# history rows dropped from either end are read again when scrolled back to.
+# Messages shown in this session are only held here, so once they are trimmed
+# from the top they are gone from the view until the next start.
+class TranscriptModel(QAbstractListModel):
+    def __init__(self, resident=TranscriptResident, page=TRANSCRIPT_PAGE):
+        super().__init__()
+        self.resident = max(resident, page * 2)
+        self.page = page
+        self.source = None
+        # Each row is [text, cached width, cached height]; the first
+        # (bottom - top) rows are history, the rest were shown in this session
+        self.rows = []
+        self.top = 0
+        self.bottom = 0
+        self.history_end = 0
+        self.partial = False
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            return self.rows[index.row()][0]
+        if role == Qt.UserRole:
+            return self.rows[index.row()]
+        return None
+
+    def HistoryRows(self):
+        return self.bottom - self.top
+
+    def SetSource(self, source):
+        # Shows the newest page of the source's history
+        self.beginResetModel()
+        self.source = source
+        self.history_end = source.Count()
+        self.bottom = self.history_end
+        self.top = max(0, self.bottom - self.page)
+        self.rows = [[text, None, None] for text in source.LoadRange(self.top, self.bottom)]
+        self.partial = False
+        self.endResetModel()
+
+    def Append(self, text):
+        # A final message; it replaces the streamed one if there is one
+        if self.partial:
+            self.SetPartial(text)
+            self.partial = False
+        else:
+            self.Insert(len(self.rows), [[text, None, None]])
+        self.Trim(from_top=True)
+
+    def SetPartial(self, text):
+        if self.partial:
+            row = len(self.rows) - 1
+            self.rows[row] = [text, None, None]
+            index = self.index(row)
+            self.dataChanged.emit(index, index)
+        else:
+            self.Insert(len(self.rows), [[text, None, None]])
+            self.partial = True
+
+    def ClearPartial(self):
+        if self.partial:
+            self.Remove(len(self.rows) - 1, 1)
+            self.partial = False
+
+    def LoadOlder(self):
+        # Returns the number of rows inserted at the top
+        if self.source is None or self.top == 0:
+            return 0
+        start = max(0, self.top - self.page)
+        texts = self.source.LoadRange(start, self.top)
+        self.Insert(0, [[text, None, None] for text in texts])
+        self.top = start
+        self.Trim(from_top=False)
+        return len(texts)
+
+    def LoadNewer(self):
+        # Refills history rows that were dropped from the bottom
+        if self.source is None or self.bottom >= self.history_end:
+            return 0
+        stop = min(self.history_end, self.bottom + self.page)
+        texts = self.source.LoadRange(self.bottom, stop)
+        self.Insert(self.HistoryRows(), [[text, None, None] for text in texts])
+        self.bottom = stop
+        self.Trim(from_top=True)
+        return len(texts)
+
+    def Trim(self, from_top):
+        surplus = len(self.rows) - self.resident
+        if surplus <= 0:
+            return
+        if from_top:
+            history = min(surplus, self.HistoryRows())
+            self.Remove(0, surplus)
+            self.top += history
+            if surplus > history:
+                # Session rows were dropped too; history can only be paged from its end now
+                self.top = self.bottom = self.history_end
+        else:
+            # Only history rows can be dropped from the bottom, they can be read again
+            count = min(surplus, self.HistoryRows())
+            if count:
+                self.Remove(self.HistoryRows() - count, count)
+                self.bottom -= count
+
+    def Insert(self, row, rows):
+        if not rows:
+            return
+        self.beginInsertRows(QModelIndex(), row, row + len(rows) - 1)
+        self.rows[row:row] = rows
+        self.endInsertRows()
+
+    def Remove(self, row, count):
+        self.beginRemoveRows(QModelIndex(), row, row + count - 1)
+        del self.rows[row:row + count]
+        self.endRemoveRows()
+
+class MessageDelegate(QStyledItemDelegate):
+    MARGIN = 10
+
+    def paint(self, painter, option, index):
+        painter.save()
+        painter.setFont(option.font)
+        painter.setPen(QColor("white"))
+        rect = option.rect.adjusted(self.MARGIN, self.MARGIN, -self.MARGIN, 0)
+        painter.drawText(rect, Qt.TextWordWrap, index.data(Qt.DisplayRole))
+        painter.restore()
+
+    def sizeHint(self, option, index):
+        # Heights are cached per row and width, so a relayout doesn't measure every text again
+        row = index.data(Qt.UserRole)
+        width = option.rect.width() if option.rect.width() > 0 else 600
+        if row[1] != width:
+            bounds = option.fontMetrics.boundingRect(QRect(0, 0, width - 2 * self.MARGIN, 0), Qt.TextWordWrap, row[0])
+            row[1], row[2] = width, bounds.height() + self.MARGIN
+        return QSize(width, row[2])
+
+class TranscriptView(QListView):
+    def __init__(self, model, parent=None):
+        super().__init__(parent)
+        self.setModel(model)
+        self.setItemDelegate(MessageDelegate(self))
+        self.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.setResizeMode(QListView.Adjust)
+        self.setSelectionMode(QAbstractItemView.NoSelection)
+        self.setFocusPolicy(Qt.NoFocus)
+        self.setFrameStyle(QFrame.NoFrame)
+        self.follow = True
+        self.verticalScrollBar().valueChanged.connect(self.onScroll)
+        self.verticalScrollBar().rangeChanged.connect(self.onRangeChanged)
+        model.modelReset.connect(self.scrollToBottom)
+
+    def onScroll(self, value):
+        bar = self.verticalScrollBar()
+        # New messages keep the view at the bottom unless the user scrolled away
+        self.follow = value >= bar.maximum() - 4
+        model = self.model()
+        if value == bar.minimum() and model.top > 0:
+            # Keep the same message at the top while older ones are inserted above it
+            anchor = self.indexAt(self.viewport().rect().topLeft()).row()
+            inserted = model.LoadOlder()
+            if inserted and anchor >= 0:
+                self.scrollTo(model.index(anchor + inserted), QAbstractItemView.PositionAtTop)
+        elif model.bottom < model.history_end:
+            last = self.indexAt(self.viewport().rect().bottomLeft()).row()
+            if last >= model.HistoryRows() - 1:
+                model.LoadNewer()
+
+    def onRangeChanged(self, minimum, maximum):
+        if self.follow:
+            self.verticalScrollBar().setValue(maximum)
 
 class ChatSection(QWidget):
 
@@ -76,19 +407,13 @@ class ChatSection(QWidget):
         layout = QVBoxLayout(self)
         layout.setSpacing(10)
         layout.setContentsMargins(10, 40, 40, 100)
-        self.chat_text_edit = QTextEdit()
-        self.chat_text_edit.setReadOnly(True)
-        self.chat_text_edit.setTextInteractionFlags(Qt.NoTextInteraction)
-        self.chat_text_edit.setFrameStyle(QFrame.NoFrame)
-        layout.addWidget(self.chat_text_edit)
+        self.transcript = TranscriptModel()
+        self.chat_view = TranscriptView(self.transcript)
+        layout.addWidget(self.chat_view)
         self.setStyleSheet("background-color: black;")
         layout.setSizeConstraint(QVBoxLayout.SetDefaultConstraint)
         layout.setStretch(1, 1)
         self.setSizePolicy(QSizePolicy(QSizePolicy.Expanding,QSizePolicy.Expanding))
-        text_color = QColor(Qt.blue)
-        text_color_text = QTextCharFormat()
-        text_color_text.setForeground(text_color)
-        self.chat_text_edit.setCurrentCharFormat(text_color_text)
         self.gif_label = QLabel()
         self.gif_label.setStyleSheet ("border: none;")
         movie = QMovie(GraphicsDirectoryPath('Jarvis.gif'))
@@ -105,14 +430,19 @@ class ChatSection(QWidget):
         layout.addWidget(self.label)
         layout.setSpacing(-10)
         layout.addWidget(self.gif_label)
+        # Generated images sit right under the conversation
+        self.gallery = ImageGallery()
+        layout.insertWidget(1, self.gallery)
         font =QFont()
         font.setPointSize(13)
-        self.chat_text_edit.setFont(font)
-        self.timer = QTimer(self)
-        self.timer.timeout.connect(self.loadMessages)
-        self.timer.timeout.connect(self.SpeechRecogText)
-        self.timer.start(5)
-        self.chat_text_edit.viewport().installEventFilter(self)
+        self.chat_view.setFont(font)
+        bridge = GetGuiBridge()
+        bridge.ResponseChanged.connect(self.loadMessages)
+        bridge.PartialResponseChanged.connect(self.loadPartialMessage)
+        bridge.StatusChanged.connect(self.SpeechRecogText)
+        bridge.TranscriptSourceChanged.connect(self.transcript.SetSource)
+        self.loadMessages(LastValue("response", ReadDataFile('Responses.data')))
+        self.SpeechRecogText(GetAssistantStatus())
         self.setStyleSheet("""
     QScrollBar:vertical {
         border: none;
@@ -146,25 +476,28 @@ class ChatSection(QWidget):
     }
 """)
 
-    def loadMessages(self):
+    def loadMessages(self, messages):
         global old_chat_message
-        with open(TempDirectoryPath('Responses.data'), "r", encoding='utf-8') as file:
-            messages = file.read()
-            if None==messages:
-                pass
-            elif len(messages) < 1:
-               pass
-            elif str(old_chat_message)==str(messages):
-               pass
-            else:
-               self.addMessage(message=messages, color='White')
-               old_chat_message = messages
-        
+        if self.transcript.partial:
+            # The final text always replaces the streamed one
+            old_chat_message = ""
+        if None==messages:
+            pass
+        elif len(messages) < 1:
+           pass
+        elif str(old_chat_message)==str(messages):
+           pass
+        else:
+           self.transcript.Append(messages)
+           old_chat_message = messages
+        self.transcript.ClearPartial()
+
+    def loadPartialMessage(self, message):
+        # Replaces the in-progress message with the latest streamed text
+        self.transcript.SetPartial(message)
 
-    def SpeechRecogText(self):
-        with open(TempDirectoryPath('Status.data'), "r", encoding='utf-8') as file:
-            messages = file.read()
-            self.label.setText(messages)
+    def SpeechRecogText(self, messages):
+        self.label.setText(messages)
 
     def load_icon(self, path, width=60, height=60):
         pixmap = QPixmap(path)
@@ -178,18 +511,6 @@ class ChatSection(QWidget):
        else:
            self.load_icon(GraphicsDirectoryPath('Mic_off.png'), 60, 60)
        self.toggled = not self.toggled
-    
-    def addMessage(self, message, color):
-        cursor = self.chat_text_edit.textCursor()
-        format = QTextCharFormat()
-        formatm = QTextBlockFormat()
-        formatm.setTopMargin(10) 
-        formatm.setLeftMargin(10)
-        format.setForeground(QColor(color))
-        cursor.setCharFormat(format)
-        cursor.setBlockFormat(formatm)
-        cursor.insertText(message +"\n") 
-        self.chat_text_edit.setTextCursor(cursor)   
 
 class InitialScreen (QWidget):
     # --- MODIFIED --- to accept the callback function
@@ -233,17 +554,17 @@ class InitialScreen (QWidget):
         self.setFixedHeight(screen_height)
         self.setFixedWidth(screen_width)
         self.setStyleSheet("background-color: black;")
-        self.timer = QTimer(self)
-        self.timer.timeout.connect(self.update_ui)
-        self.timer.start(100) # Check 10 times per second
-
-    def update_ui(self):
-        # This function updates the text label and the mic icon based on data files
-        with open(TempDirectoryPath('Status.data'), "r", encoding='utf-8') as file:
-            messages = file.read()
-            self.label.setText(messages)
-        
-        mic_status = GetMicrophoneStatus()
+        bridge = GetGuiBridge()
+        bridge.StatusChanged.connect(self.update_status)
+        bridge.MicChanged.connect(self.update_mic_icon)
+        self.update_status(GetAssistantStatus())
+        self.update_mic_icon(GetMicrophoneStatus())
+
+    def update_status(self, messages):
+        # Called through the bridge whenever the assistant status changes
+        self.label.setText(messages)
+
+    def update_mic_icon(self, mic_status):
         if mic_status == "True":
             self.icon_label.setPixmap(self.mic_on_pixmap)
         else:
@@ -409,6 +730,8 @@ def GraphicalUserInterface(toggle_callback=None):
     # --- MODIFIED --- Pass the callback to the MainWindow
     window = MainWindow(toggle_callback=toggle_callback)
     window.show()
+    # Fires once the event loop has painted the window for the first time
+    QTimer.singleShot(0, lambda: Publish("gui.shown", True))
     sys.exit(app.exec_())
 
 if __name__=="__main__":
@@ -1,12 +1,21 @@
 import asyncio
-from random import randint
+from concurrent.futures import ProcessPoolExecutor
+from random import randint, random
 from PIL import Image
 import requests
+import requests.adapters
 from dotenv import load_dotenv, get_key
-from time import sleep
+from time import sleep, time
 import os
 import sys # For sys.exit() and general process control
 
+try:
+    from Backend.ImageJobs import ImageJobServer
+    from Backend.ImageStore import GetImageStore, ImageStoreReuse
+except ModuleNotFoundError:
+    from ImageJobs import ImageJobServer
+    from ImageStore import GetImageStore, ImageStoreReuse
+
 # --- IMPORTANT PATH SETUP ---
 # When this script is run as a subprocess with cwd=project_root_dir,
 # os.getcwd() will return the project root.
@@ -19,42 +28,46 @@ load_dotenv()
 
 # Define base directories relative to the project root (which is the cwd of this script)
 DATA_FOLDER = "Data"
-FRONTEND_FILES_FOLDER = os.path.join("Frontend", "Files")
-IMAGE_GENERATION_DATA_FILE = os.path.join(FRONTEND_FILES_FOLDER, "ImageGeneration.data")
-
-# Function to open and display images based on a given prompt
-def open_images(prompt):
-    # Path to the Data folder, now correctly relative to the project root
-    folder_path = DATA_FOLDER
-    
-    # Sanitize prompt for filename to remove problematic characters
-    # This creates a more robust filename.
-    prompt_filename = "".join(c if c.isalnum() else "_" for c in prompt).replace("__", "_").strip("_")
-    if not prompt_filename: # Fallback if prompt becomes empty after sanitization
-        prompt_filename = "generated_image"
-
-    # Generate the filenames for the images
-    files = [f"{prompt_filename}_{i}.jpg" for i in range(1, 5)]
-
-    print(f"\n[ImageGen] Attempting to open images for prompt: '{prompt}' (PID: {os.getpid()})")
-    for jpg_file in files:
-        image_path = os.path.join(folder_path, jpg_file)
-
-        try:
-            img = Image.open(image_path)
-            print(f"[ImageGen] Opening image: {image_path}")
-            img.show()
-            sleep(1) # Pause for 1 second before showing the next image
-
-        except FileNotFoundError:
-            print(f"[ImageGen] Error: Image not found at {image_path}. Was it generated correctly?")
-        except IOError:
-            print(f"[ImageGen] Error: Unable to open {image_path}. It might be corrupted or not a valid image file.")
-        except Exception as e:
-            print(f"[ImageGen] An unexpected error occurred while opening {image_path}: {e}")
 
-# API details for the Hugging Face Stable Diffusion model
-API_URL = "https://api-inference.huggingface.co/models/stabilityai/stable-diffusion-xl-base-1.0"
+# --- Thumbnail post-processing ---
+# Generated images are decoded and downscaled in a process pool, off the job
+# thread, and the GUI gallery only ever loads the small cached thumbnails.
+THUMBNAIL_FOLDER = os.path.join(DATA_FOLDER, "Thumbnails")
+THUMBNAIL_SIZE = (256, 256)
+ThumbnailPool = None
+
+def CreateThumbnail(image_path, size=THUMBNAIL_SIZE):
+    # Runs in a pool process; returns the cached thumbnail path or None
+    name = os.path.splitext(os.path.basename(image_path))[0]
+    thumbnail_path = os.path.join(THUMBNAIL_FOLDER, f"{name}_{size[0]}x{size[1]}.jpg")
+    try:
+        if os.path.exists(thumbnail_path) and os.path.getmtime(thumbnail_path) >= os.path.getmtime(image_path):
+            return thumbnail_path
+        os.makedirs(THUMBNAIL_FOLDER, exist_ok=True)
+        with Image.open(image_path) as img:
+            # draft() lets the JPEG decoder skip most of the full-resolution work
+            img.draft("RGB", size)
+            img = img.convert("RGB")
+            img.thumbnail(size)
+            img.save(thumbnail_path, "JPEG", quality=85)
+        return thumbnail_path
+    except (FileNotFoundError, IOError) as e:
+        print(f"[ImageGen] Error: Unable to create a thumbnail for {image_path}: {e}")
+        return None
+
+def CreateThumbnails(image_paths):
+    global ThumbnailPool
+    if ThumbnailPool is None:
+        ThumbnailPool = ProcessPoolExecutor(max_workers=min(4, os.cpu_count() or 1))
+    thumbnails = list(ThumbnailPool.map(CreateThumbnail, image_paths))
+    return [
+        {"image": os.path.abspath(image), "thumbnail": os.path.abspath(thumbnail)}
+        for image, thumbnail in zip(image_paths, thumbnails) if thumbnail
+    ]
+
+# API details for the Hugging Face Stable Diffusion model.
+# HuggingFaceAPIURL can point the worker at a local stand-in server for testing.
+API_URL = os.getenv('HuggingFaceAPIURL') or "https://api-inference.huggingface.co/models/stabilityai/stable-diffusion-xl-base-1.0"
 hf_api_key = get_key('.env', 'HuggingFaceAPIKey') # Looks for .env in current working directory (project root)
 
 if not hf_api_key:
@@ -67,154 +80,163 @@ if not hf_api_key:
     hf_api_key = "dummy_key_if_missing" # Use a dummy key to prevent header errors, but API calls will fail
 headers = {"Authorization": f"Bearer {hf_api_key}"}
 
-# Async function to send a query to the Hugging Face API
-async def query(payload ):
+# --- HTTP settings ---
+# One keep-alive session is shared by every request, so the TCP+TLS handshake is
+# paid once per connection instead of once per image.
+IMAGE_CONCURRENCY = int(os.getenv('ImageConcurrency') or 4)
+REQUEST_TIMEOUT = (10, 120) # (connect, read) seconds
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 1.0 # seconds, doubled on every attempt
+BACKOFF_MAX = 30.0
+RETRY_STATUS = {429, 502, 503, 504} # 503 is "model loading" on the inference API
+CHUNK_SIZE = 64 * 1024
+
+session = requests.Session()
+adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=IMAGE_CONCURRENCY)
+session.mount("https://", adapter)
+session.mount("http://", adapter)
+session.headers.update(headers)
+
+def RetryDelay(attempt, response=None):
+    # Full jitter on an exponential backoff, unless a 503 says how long loading takes
+    delay = random() * min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)
+    if response is not None:
+        try:
+            estimated = float(response.json().get("estimated_time", 0))
+        except (ValueError, AttributeError):
+            estimated = 0
+        if estimated:
+            delay = min(BACKOFF_MAX, estimated * (1 + 0.25 * random()))
+    return delay
+
+def DownloadImage(payload, file_path):
+    # Posts one request and streams the image body straight to file_path.
+    # The body goes to a temporary file first so a failed download never leaves a partial image.
+    temp_path = file_path + ".part"
+    for attempt in range(MAX_ATTEMPTS):
+        response = None
+        try:
+            response = session.post(API_URL, json=payload, timeout=REQUEST_TIMEOUT, stream=True)
+            if response.status_code in RETRY_STATUS and attempt + 1 < MAX_ATTEMPTS:
+                delay = RetryDelay(attempt, response)
+                print(f"[ImageGen] API returned {response.status_code}, retrying in {delay:.1f}s (attempt {attempt + 1}/{MAX_ATTEMPTS})")
+                sleep(delay)
+                continue
+
+            if response.status_code != 200:
+                print(f"[ImageGen] API Error: {response.status_code} - {response.text}")
+                return False
+
+            content_type = response.headers.get('Content-Type', '')
+            if 'image' not in content_type:
+                print(f"[ImageGen] Warning: API response content type is not an image. Content-Type: {content_type}")
+                print(f"[ImageGen] Response content (first 200 chars): {response.text[:200]}...")
+                return False
+
+            with open(temp_path, "wb") as f:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    f.write(chunk)
+            os.replace(temp_path, file_path)
+            return True
+
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            if attempt + 1 >= MAX_ATTEMPTS:
+                print(f"[ImageGen] Network or API request error: {e}")
+                return False
+            delay = RetryDelay(attempt)
+            print(f"[ImageGen] Network error ({e}), retrying in {delay:.1f}s")
+            sleep(delay)
+        except requests.exceptions.RequestException as e:
+            print(f"[ImageGen] Network or API request error: {e}")
+            return False
+        except IOError:
+            print(f"[ImageGen] Error: Could not write image file to {file_path}. Check directory permissions.")
+            return False
+        finally:
+            if response is not None:
+                response.close()
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+    return False
+
+# Async function to send a query to the Hugging Face API and save the image
+async def query(payload, file_path, limiter):
     if hf_api_key == "dummy_key_if_missing":
         print("[ImageGen] Skipping API call: API Key is missing/invalid.")
-        return b""
-    try:
-        response = await asyncio.to_thread(requests.post, API_URL, headers=headers, json=payload)
-
-        if response.status_code != 200:
-            print(f"[ImageGen] API Error: {response.status_code} - {response.text}")
-            return b""
-        
-        content_type = response.headers.get('Content-Type', '')
-        if 'image' not in content_type:
-            print(f"[ImageGen] Warning: API response content type is not an image. Content-Type: {content_type}")
-            print(f"[ImageGen] Response content (first 200 chars): {response.text[:200]}...")
-            return b""
-
-        return response.content
-    except requests.exceptions.RequestException as e:
-        print(f"[ImageGen] Network or API request error: {e}")
-        return b""
-    except Exception as e:
-        print(f"[ImageGen] An unexpected error occurred during API query: {e}")
-        return b""
-
-# Async function to generate images based on the given prompt
-async def generate_images(prompt: str):
-    tasks = []
-    prompt_filename = "".join(c if c.isalnum() else "_" for c in prompt).replace("__", "_").strip("_")
-    if not prompt_filename:
-        prompt_filename = "generated_image"
-
-    print(f"[ImageGen] Starting image generation for prompt: '{prompt}'")
-    for i in range(4):
-        payload = {
-            "inputs": f"{prompt}, quality=4K, sharpness=maximum, Ultra High details, high resolution, seed= {randint(0, 1000000)}",
-        }
-        task = asyncio.create_task(query(payload))
-        tasks.append(task)
-        await asyncio.sleep(0.1) 
-
-    image_bytes_list = await asyncio.gather(*tasks)
-    
-    # Path to the Data directory, relative to project root
-    data_dir_path = DATA_FOLDER
-    os.makedirs(data_dir_path, exist_ok=True) # Ensure the Data directory exists
-
-    generated_count = 0
-    for i, image_bytes in enumerate(image_bytes_list):
-        if image_bytes:
-            file_path = os.path.join(data_dir_path, f"{prompt_filename}_{i+1}.jpg")
-            try:
-                with open(file_path, "wb") as f:
-                    f.write(image_bytes)
-                print(f"[ImageGen] Saved image: {file_path}")
-                generated_count += 1
-            except IOError:
-                print(f"[ImageGen] Error: Could not write image file to {file_path}. Check directory permissions.")
-            except Exception as e:
-                print(f"[ImageGen] An unexpected error occurred while saving image {file_path}: {e}")
-        else:
-            print(f"[ImageGen] Skipping saving image {i+1} due to empty/invalid response from API.")
-    
-    if generated_count > 0:
-        print(f"[ImageGen] Successfully generated and saved {generated_count} images.")
-        return True
-    else:
-        print("[ImageGen] No images were successfully generated or saved.")
         return False
+    async with limiter:
+        try:
+            return await asyncio.to_thread(DownloadImage, payload, file_path)
+        except Exception as e:
+            print(f"[ImageGen] An unexpected error occurred during API query: {e}")
+            return False
 
-# Wrapper function to generate and open images
-def GenerateImages(prompt: str):
-    print(f"[ImageGen] Initiating image generation and display for: '{prompt}'")
-    generation_successful = asyncio.run(generate_images(prompt)) 
-    if generation_successful:
-        open_images(prompt)
-    else:
-        print("[ImageGen] Image generation failed, not attempting to open images.")
-
-# --- Main loop to check for image generation requests ---
-# Path to ImageGeneration.data, correctly relative to project root
-FRONTEND_DATA_FILE_PATH = IMAGE_GENERATION_DATA_FILE
-
-# Ensure Frontend\Files directory exists for the data file
-os.makedirs(os.path.dirname(FRONTEND_DATA_FILE_PATH), exist_ok=True)
-
-# Initialize the data file if it doesn't exist or is empty
-if not os.path.exists(FRONTEND_DATA_FILE_PATH) or os.stat(FRONTEND_DATA_FILE_PATH).st_size == 0:
-    print(f"[ImageGen] Initializing {FRONTEND_DATA_FILE_PATH} with default content 'False, False'.")
-    try:
-        with open(FRONTEND_DATA_FILE_PATH, "w") as f:
-            f.write("False, False")
-    except Exception as e:
-        print(f"[ImageGen] Error initializing data file: {e}")
-
-print(f"[ImageGen] Monitoring '{FRONTEND_DATA_FILE_PATH}' for image generation requests...")
-
-# Add a marker to show this script started
-print(f"[ImageGen] ImageGeneration.py process started. PID: {os.getpid()}")
+# Parameters that change what the API returns; part of the image store key
+IMAGE_COUNT = 4
+PROMPT_SUFFIX = "quality=4K, sharpness=maximum, Ultra High details, high resolution"
 
-while True:
-    try:
-        # Read the status and prompt from the data file
-        with open(FRONTEND_DATA_FILE_PATH, "r") as f:
-            data_content: str = f.read().strip()
+def ImageParams():
+    return {"model": API_URL, "suffix": PROMPT_SUFFIX}
 
-        if not data_content:
-            print(f"[ImageGen] Warning: {FRONTEND_DATA_FILE_PATH} is empty. Re-initializing.")
-            with open(FRONTEND_DATA_FILE_PATH, "w") as f:
-                f.write("False, False")
-            sleep(1)
-            continue
+# Async function to generate images based on the given prompt.
+# Images are downloaded into the store's incoming folder and then moved into
+# the content-addressed store; the stored paths are returned.
+async def generate_images(prompt: str):
+    store = GetImageStore()
+    print(f"[ImageGen] Starting image generation for prompt: '{prompt}'")
+    limiter = asyncio.Semaphore(IMAGE_CONCURRENCY)
+    job_name = f"{os.getpid()}_{int(time() * 1000)}"
+    file_paths = [store.IncomingPath(f"{job_name}_{i+1}.jpg") for i in range(IMAGE_COUNT)]
+    tasks = []
+    for file_path in file_paths:
+        payload = {
+            "inputs": f"{prompt}, {PROMPT_SUFFIX}, seed= {randint(0, 1000000)}",
+        }
+        tasks.append(asyncio.create_task(query(payload, file_path, limiter)))
 
-        try:
-            prompt, status = data_content.split(",", 1)
-            prompt = prompt.strip()
-            status = status.strip()
-        except ValueError:
-            print(f"[ImageGen] Error: Invalid format in {FRONTEND_DATA_FILE_PATH}. Expected 'Prompt,Status'. Content: '{data_content}'")
-            print("[ImageGen] Resetting file to 'False, False' and waiting...")
-            with open(FRONTEND_DATA_FILE_PATH, "w") as f:
-                f.write("False, False")
-            sleep(5)
-            continue
-
-        if status.lower() == "true":
-            print(f"\n[ImageGen] --- Detected request to generate images for prompt: '{prompt}' ---")
-            GenerateImages(prompt=prompt)
-            
-            print(f"[ImageGen] Resetting status in {FRONTEND_DATA_FILE_PATH} to 'False, False'.")
-            with open(FRONTEND_DATA_FILE_PATH, "w") as f:
-                f.write("False, False")
-            
-            sleep(0.5) # Small pause after processing a request
-            continue # Continue loop to check for next request
+    results = await asyncio.gather(*tasks)
 
+    saved_files = []
+    for i, (file_path, saved) in enumerate(zip(file_paths, results)):
+        if saved:
+            stored_path = store.Put(file_path)
+            print(f"[ImageGen] Saved image: {stored_path}")
+            if stored_path not in saved_files:
+                saved_files.append(stored_path)
         else:
-            sleep(1) # Wait for 1 second before checking again
-    
-    except FileNotFoundError:
-        print(f"[ImageGen] Error: The data file '{FRONTEND_DATA_FILE_PATH}' was not found.")
-        print(f"[ImageGen] Please ensure the 'Frontend\\Files' directory exists relative to the project root.")
-        os.makedirs(os.path.dirname(FRONTEND_DATA_FILE_PATH), exist_ok=True)
-        with open(FRONTEND_DATA_FILE_PATH, "w") as f:
-            f.write("False, False")
-        sleep(5)
-    except Exception as e:
-        print(f"[ImageGen] An unexpected error occurred in the main loop: {e}")
-        print("[ImageGen] Waiting for 5 seconds before retrying...")
-        sleep(5)
\ No newline at end of file
+            print(f"[ImageGen] Skipping image {i+1} due to empty/invalid response from API.")
+
+    if saved_files:
+        store.Record(prompt, ImageParams(), saved_files)
+        print(f"[ImageGen] Successfully generated and saved {len(saved_files)} images.")
+    else:
+        print("[ImageGen] No images were successfully generated or saved.")
+    return saved_files
+
+# Wrapper function to generate images and their thumbnails.
+# A prompt that was generated before is served from the image store unless
+# fresh is set (the user asked for new variations).
+# Returns [{"image": path, "thumbnail": path}, ...] for the GUI gallery.
+def GenerateImages(prompt: str, fresh=False):
+    if ImageStoreReuse and not fresh:
+        stored_files = GetImageStore().Lookup(prompt, ImageParams(), limit=IMAGE_COUNT)
+        if stored_files:
+            print(f"[ImageGen] Serving {len(stored_files)} stored images for: '{prompt}'")
+            return CreateThumbnails(stored_files)
+    print(f"[ImageGen] Initiating image generation for: '{prompt}'")
+    saved_files = asyncio.run(generate_images(prompt)) 
+    if not saved_files:
+        print("[ImageGen] Image generation failed, no thumbnails to create.")
+        return []
+    return CreateThumbnails(saved_files)
+
+# --- Job handler and worker entry point ---
+# Main.py submits jobs over the ImageJobs socket; each job runs here as soon as
+# it reaches the front of the queue, and its images and thumbnails are reported back.
+def HandleImageJob(prompt, options):
+    print(f"\n[ImageGen] --- Running image job for prompt: '{prompt}' ---")
+    return GenerateImages(prompt=prompt, fresh=bool(options.get("fresh")))
+
+if __name__ == "__main__":
+    print(f"[ImageGen] ImageGeneration.py process started. PID: {os.getpid()}")
+    ImageJobServer(HandleImageJob).Serve()
@@ -0,0 +1,219 @@
+from queue import PriorityQueue, Queue
+from dotenv import dotenv_values
+import itertools
+import threading
+import socket
+import json
+import time
+import uuid
+
+# Job queue between Main.py and the ImageGeneration.py worker process.
+#
+# The worker runs an ImageJobServer on a localhost TCP port; Main.py talks to it
+# through an ImageJobClient. Messages are JSON lines:
+#   client -> server  {"op": "submit", "job": id, "prompt": ..., "priority": n, "options": {...}}
+#                     {"op": "cancel", "job": id}
+#                     {"op": "list"}
+#   server -> clients {"event": "queued" | "started" | "completed" | "failed" | "cancelled", "job": id, ...}
+#                     {"event": "jobs", "jobs": [...]}
+# Jobs are picked up as soon as they arrive, several can wait in the queue, and
+# lower priority numbers run first.
+
+env_vars = dotenv_values(".env")
+HOST = "127.0.0.1"
+ImageJobPort = int(env_vars.get("ImageJobPort") or 5057)
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+class ImageJobServer:
+    def __init__(self, handler, host=HOST, port=ImageJobPort):
+        # handler(prompt, options) runs a job and returns a JSON-serialisable result
+        self.handler = handler
+        self.host = host
+        self.port = port
+        self.queue = PriorityQueue()
+        self.sequence = itertools.count()
+        self.jobs = {}
+        self.clients = []  # one outbox per connected client
+        self.lock = threading.Lock()
+
+    def Serve(self):
+        worker = threading.Thread(target=self.Work, daemon=True, name="ImageJobWorker")
+        worker.start()
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind((self.host, self.port))
+        listener.listen()
+        print(f"[ImageJobs] Listening for image jobs on {self.host}:{self.port}")
+        while True:
+            connection, _ = listener.accept()
+            threading.Thread(target=self.HandleClient, args=(connection,), daemon=True).start()
+
+    def HandleClient(self, connection):
+        # Events for this client go through its own outbox and writer thread, so
+        # a client that reads slowly never holds up the others or the worker
+        outbox = Queue()
+        threading.Thread(target=self.Deliver, args=(connection, outbox), daemon=True).start()
+        with self.lock:
+            self.clients.append(outbox)
+        try:
+            for line in connection.makefile("r", encoding="utf-8"):
+                try:
+                    message = json.loads(line)
+                except json.JSONDecodeError:
+                    print(f"[ImageJobs] Ignoring malformed message: {line.strip()}")
+                    continue
+                op = message.get("op")
+                if op == "submit":
+                    self.Submit(message["job"], message["prompt"], message.get("priority", PRIORITY_NORMAL), message.get("options", {}))
+                elif op == "cancel":
+                    self.Cancel(message["job"])
+                elif op == "list":
+                    self.Send(outbox, {"event": "jobs", "jobs": self.Snapshot()})
+        except OSError:
+            pass
+        finally:
+            with self.lock:
+                if outbox in self.clients:
+                    self.clients.remove(outbox)
+            outbox.put(None)
+
+    def Deliver(self, connection, outbox):
+        # Writes a client's events until HandleClient is done with it (None)
+        writer = connection.makefile("w", encoding="utf-8")
+        try:
+            while True:
+                event = outbox.get()
+                if event is None:
+                    break
+                writer.write(json.dumps(event) + "\n")
+                writer.flush()
+        except OSError:
+            # Unblocks the read loop in HandleClient, which drops the client
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        finally:
+            connection.close()
+
+    def Send(self, outbox, event):
+        outbox.put(event)
+
+    def Broadcast(self, event):
+        with self.lock:
+            clients = list(self.clients)
+        for outbox in clients:
+            self.Send(outbox, event)
+
+    def Submit(self, job_id, prompt, priority=PRIORITY_NORMAL, options=None):
+        job = {"job": job_id, "prompt": prompt, "priority": priority, "options": options or {}, "status": "queued", "submitted": time.time()}
+        with self.lock:
+            self.jobs[job_id] = job
+        self.queue.put((priority, next(self.sequence), job_id))
+        self.Broadcast({"event": "queued", "job": job_id, "prompt": prompt, "position": self.queue.qsize()})
+
+    def Cancel(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if not job or job["status"] in ("completed", "failed", "cancelled"):
+                return
+            # A running job finishes its current request, but its result is dropped
+            job["status"] = "cancelled"
+        self.Broadcast({"event": "cancelled", "job": job_id})
+
+    def Snapshot(self):
+        with self.lock:
+            return [{k: v for k, v in job.items() if k != "options"} for job in self.jobs.values()]
+
+    def Work(self):
+        while True:
+            _, _, job_id = self.queue.get()
+            with self.lock:
+                job = self.jobs[job_id]
+                if job["status"] != "queued":
+                    continue
+                job["status"] = "running"
+            self.Broadcast({"event": "started", "job": job_id, "prompt": job["prompt"]})
+            started = time.perf_counter()
+            try:
+                result = self.handler(job["prompt"], job["options"])
+                status = "completed" if result else "failed"
+            except Exception as e:
+                print(f"[ImageJobs] Job {job_id} failed: {e}")
+                result, status = None, "failed"
+            with self.lock:
+                if job["status"] == "cancelled":
+                    continue
+                job["status"] = status
+                # Finished jobs only need to be remembered for a while
+                for old_id in [i for i, j in self.jobs.items() if j["status"] in ("completed", "failed", "cancelled")][:-100]:
+                    del self.jobs[old_id]
+            self.Broadcast({"event": status, "job": job_id, "prompt": job["prompt"], "result": result,
+                            "seconds": round(time.perf_counter() - started, 3)})
+
+class ImageJobClient:
+    def __init__(self, on_event=None, host=HOST, port=ImageJobPort):
+        self.on_event = on_event
+        self.host = host
+        self.port = port
+        self.connection = None
+        self.writer = None
+        self.lock = threading.Lock()
+
+    def Connect(self, timeout=10.0):
+        # The worker process may still be starting, so keep trying until the timeout
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                connection = socket.create_connection((self.host, self.port), timeout=1.0)
+                break
+            except OSError:
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(0.1)
+        connection.settimeout(None)
+        self.connection = connection
+        self.writer = connection.makefile("w", encoding="utf-8")
+        threading.Thread(target=self.Listen, args=(connection,), daemon=True, name="ImageJobEvents").start()
+
+    def Listen(self, connection):
+        try:
+            for line in connection.makefile("r", encoding="utf-8"):
+                if self.on_event:
+                    try:
+                        self.on_event(json.loads(line))
+                    except Exception as e:
+                        print(f"[ImageJobs] Event handler error: {e}")
+        except OSError:
+            pass
+        with self.lock:
+            if self.connection is connection:
+                self.connection = self.writer = None
+
+    def Send(self, message):
+        with self.lock:
+            if self.writer is None:
+                self.Connect()
+            try:
+                self.writer.write(json.dumps(message) + "\n")
+                self.writer.flush()
+            except OSError:
+                # The worker was restarted; reconnect once and resend
+                self.Connect()
+                self.writer.write(json.dumps(message) + "\n")
+                self.writer.flush()
+
+    def Submit(self, prompt, priority=PRIORITY_NORMAL, **options):
+        job_id = uuid.uuid4().hex[:12]
+        self.Send({"op": "submit", "job": job_id, "prompt": prompt, "priority": priority, "options": options})
+        return job_id
+
+    def Cancel(self, job_id):
+        self.Send({"op": "cancel", "job": job_id})
+
+    def List(self):
+        # The answer arrives as a "jobs" event
+        self.Send({"op": "list"})
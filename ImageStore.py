@@ -0,0 +1,154 @@
+from dotenv import dotenv_values
+import threading
+import hashlib
+import sqlite3
+import shutil
+import json
+import time
+import sys
+import os
+import re
+
+# Content-addressed store for generated images.
+#
+# Every image is kept once under Data/ImageStore/objects/<ab>/<sha256>.jpg, so
+# identical bytes are never stored twice and prompts can no longer collide on
+# a sanitized file name. An SQLite index maps a normalized prompt plus the
+# generation parameters to the images made for it, which lets a repeated
+# prompt be answered from disk instead of calling the API again.
+
+env_vars = dotenv_values(".env")
+ImageStoreReuse = (env_vars.get("ImageStoreReuse") or "True").lower() == "true"
+IMAGE_STORE_FOLDER = os.path.join("Data", "ImageStore")
+HASH_CHUNK_SIZE = 64 * 1024
+
+# A request that starts by asking for new pictures rather than the ones already
+# made ("another one", "regenerate ...", "generate another image of ..."). Only
+# the start counts, after politeness and a drawing verb: "a new york skyline" is
+# an ordinary prompt.
+VARIATION_CUE = (
+    r"another\s+one\b|regenerate\b|redo\b|variations?\s+of\b"
+    r"|(?:another|(?:a\s+)?(?:new|different|fresh)|more)\s+(?:image|picture|photo|version|variation)s?\s+of\b"
+)
+VARIATION_REQUEST = re.compile(
+    r"^\s*(?:please\s+)?(?:(?:can|could|would|will)\s+you\s+)?(?:please\s+)?"
+    r"(?:(?:generate|create|make|draw|paint|render|show\s+me|give\s+me)\s+(?:me\s+)?(?:another\b|" + VARIATION_CUE + r")"
+    r"|" + VARIATION_CUE + r")", re.I)
+FILLER_WORDS = re.compile(r"\b(an?|the|of|image|images|picture|pictures|photo|photos|please)\b")
+
+def NormalizePrompt(prompt):
+    text = re.sub(r"[^\w\s]", " ", prompt.lower())
+    text = FILLER_WORDS.sub(" ", text)
+    return " ".join(text.split())
+
+def WantsVariations(prompt):
+    return bool(VARIATION_REQUEST.match(prompt))
+
+# (request, should it skip the stored images)
+VARIATION_CHECKS = [
+    ("another one", True),
+    ("please regenerate a cat", True),
+    ("generate another image of a cat", True),
+    ("create a different picture of a dog", True),
+    ("make more images of a cat", True),
+    ("can you draw another cat", True),
+    ("generate a new image of a sunset", True),
+    ("new variations of a cat", True),
+    ("a new york skyline", False),
+    ("generate a new york skyline", False),
+    ("generate image of a different planet", False),
+    ("another day in paris", False),
+]
+
+def CheckVariationRequests():
+    failures = [(prompt, expected) for prompt, expected in VARIATION_CHECKS if WantsVariations(prompt) != expected]
+    for prompt, expected in failures:
+        print(f"FAIL  {prompt!r}: expected {'fresh images' if expected else 'stored images'}")
+    print(f"[ImageStore] variation requests: {len(VARIATION_CHECKS) - len(failures)}/{len(VARIATION_CHECKS)} checks passed")
+    return not failures
+
+def PromptKey(prompt, params=None):
+    # Same prompt with different parameters (model, size, ...) is a different entry
+    material = json.dumps([NormalizePrompt(prompt), params or {}], sort_keys=True)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+def FileDigest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class ImageStore:
+    def __init__(self, folder=IMAGE_STORE_FOLDER):
+        self.objects = os.path.join(folder, "objects")
+        self.incoming = os.path.join(folder, "incoming")
+        os.makedirs(self.objects, exist_ok=True)
+        os.makedirs(self.incoming, exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(os.path.join(folder, "index.sqlite3"), check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS objects (hash TEXT PRIMARY KEY, bytes INTEGER, created REAL)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS prompts (key TEXT, prompt TEXT, params TEXT, hash TEXT, created REAL, PRIMARY KEY (key, hash))")
+        self.db.commit()
+
+    def ObjectPath(self, digest):
+        return os.path.join(self.objects, digest[:2], digest + ".jpg")
+
+    def IncomingPath(self, name):
+        # Downloads land here first and are moved into the store by Put
+        return os.path.join(self.incoming, name)
+
+    def Put(self, path):
+        # Moves a finished file into the store and returns its object path.
+        # If the same bytes are already stored the new copy is simply dropped.
+        digest = FileDigest(path)
+        target = self.ObjectPath(digest)
+        with self.lock:
+            if os.path.exists(target):
+                os.remove(path)
+            else:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                size = os.path.getsize(path)
+                shutil.move(path, target)
+                self.db.execute("INSERT OR IGNORE INTO objects VALUES (?, ?, ?)", (digest, size, time.time()))
+                self.db.commit()
+        return target
+
+    def Record(self, prompt, params, paths):
+        key = PromptKey(prompt, params)
+        now = time.time()
+        with self.lock:
+            for path in paths:
+                digest = os.path.splitext(os.path.basename(path))[0]
+                self.db.execute("INSERT OR REPLACE INTO prompts VALUES (?, ?, ?, ?, ?)",
+                                (key, prompt, json.dumps(params or {}, sort_keys=True), digest, now))
+            self.db.commit()
+
+    def Lookup(self, prompt, params=None, limit=4):
+        # Newest images stored for this prompt, skipping objects deleted from disk
+        key = PromptKey(prompt, params)
+        with self.lock:
+            rows = self.db.execute("SELECT hash FROM prompts WHERE key = ? ORDER BY created DESC", (key,)).fetchall()
+        paths = [self.ObjectPath(digest) for (digest,) in rows]
+        return [path for path in paths if os.path.exists(path)][:limit]
+
+    def Stats(self):
+        with self.lock:
+            objects, size = self.db.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM objects").fetchone()
+            prompts = self.db.execute("SELECT COUNT(DISTINCT key) FROM prompts").fetchone()[0]
+        return {"objects": objects, "bytes": size, "prompts": prompts}
+
+Store = None
+StoreLock = threading.Lock()
+
+def GetImageStore():
+    global Store
+    with StoreLock:
+        if Store is None:
+            Store = ImageStore()
+        return Store
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "check-variations":
+        sys.exit(0 if CheckVariationRequests() else 1)
+    print("usage: python ImageStore.py check-variations")
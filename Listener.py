@@ -0,0 +1,284 @@
+from collections import deque
+from queue import Queue, Empty
+from array import array
+import speech_recognition as sr
+import threading
+import time
+import math
+import sys
+
+try:
+    from Backend.Tracing import RecordSpan, Span
+    from Backend.Cancellation import Cancellable
+except ModuleNotFoundError:
+    from Tracing import RecordSpan, Span
+    from Cancellation import Cancellable
+
+try:
+    import audioop
+except ImportError:
+    audioop = None
+
+# Long-lived microphone capture for takecommand().
+#
+# The input stream is opened once and read continuously on a capture thread.
+# The last PRE_ROLL seconds are kept in a ring buffer, and while nobody is
+# listening the energy threshold keeps adapting to the room (the same damped
+# update speech_recognition uses for dynamic_energy_threshold). Arming the
+# listener therefore costs one audio chunk instead of a device open plus a
+# second of adjust_for_ambient_noise, and speech that starts right at the
+# toggle is still captured thanks to the pre-roll.
+#
+# Finished utterances go through a queue to a recognizer thread, and the text
+# comes back through a second queue. Any speech_recognition AudioSource works,
+# so sr.AudioFile("fixture.wav") can be fed in place of the live device.
+#
+# For the always-listening mode a vad (WakeWord.VoiceActivityDetector) decides
+# which chunks are speech instead of the energy threshold, and a gate
+# (WakeWord.WakeWordGate) drops utterances before they reach the recognizer.
+#
+#   python Listener.py fixture.wav [--no-recognize]
+
+PRE_ROLL = 0.5             # seconds of audio kept from before speech started
+CALIBRATION_SECONDS = 0.5  # one-time calibration when the stream is opened
+DYNAMIC_RATIO = 1.5        # speech must be this much louder than the room
+DYNAMIC_DAMPING = 0.15     # per-second damping of the background recalibration
+LISTEN_TIMEOUT = 10        # seconds to wait for speech to start
+PHRASE_TIME_LIMIT = 6      # longest utterance, in seconds
+PAUSE_THRESHOLD = 1.0      # seconds of silence that end an utterance
+RECOGNITION_TIMEOUT = 15   # seconds allowed for the recognizer on top of the audio
+CAPTURE_DONE = object()    # passed through both queues when the input ends
+LISTEN_CANCELLED = object()  # wakes up Listen() when its turn is cancelled
+
+def FrameEnergy(data, width):
+    # RMS of one chunk of little-endian PCM
+    if audioop is not None:
+        return audioop.rms(data, width)
+    if width != 2:
+        raise ValueError("Only 16-bit audio is supported without audioop")
+    samples = array("h", data[:len(data) // 2 * 2])
+    if sys.byteorder == "big":
+        samples.byteswap()
+    return math.sqrt(sum(s * s for s in samples) / len(samples)) if samples else 0.0
+
+def GoogleRecognizer(language="en-in"):
+    recognizer = sr.Recognizer()
+
+    def Recognize(audio):
+        try:
+            return recognizer.recognize_google(audio, language=language).lower()
+        except (sr.UnknownValueError, sr.RequestError) as e:
+            print(f"[Listener] Recognition failed: {e!r}")
+            return ""
+    return Recognize
+
+class MicrophoneListener(threading.Thread):
+    def __init__(self, source=None, recognize=None, pause_threshold=PAUSE_THRESHOLD,
+                 phrase_time_limit=PHRASE_TIME_LIMIT, listen_timeout=LISTEN_TIMEOUT, vad=None, gate=None):
+        super().__init__(daemon=True, name="MicrophoneListener")
+        self.source = source if source is not None else sr.Microphone()
+        # recognize(AudioData) -> text; None passes the AudioData through (tests, benchmarks)
+        self.recognize = recognize
+        self.vad = vad
+        # gate(AudioData) -> bool; utterances it rejects are never recognized
+        self.gate = gate
+        self.gate_open_until = 0.0
+        self.gated = 0
+        self.pause_threshold = pause_threshold
+        self.phrase_time_limit = phrase_time_limit
+        self.listen_timeout = listen_timeout
+        self.energy_threshold = 300.0
+        self.calibrated = False
+        self.calibration = []
+        self.ring = deque()
+        self.phrase = None
+        self.silence = 0.0
+        self.armed = threading.Event()
+        self.armed_at = None
+        self.armed_audio = 0.0
+        self.continuous = False
+        self.utterances = Queue()
+        self.results = Queue()
+        self.ready = threading.Event()
+        self.finished = threading.Event()
+        self.stopped = threading.Event()
+        self.frames = 0
+        self.recognizer_thread = threading.Thread(target=self.Recognize, daemon=True, name="SpeechRecognizer")
+
+    def run(self):
+        self.recognizer_thread.start()
+        try:
+            with self.source as source:
+                self.rate = source.SAMPLE_RATE
+                self.width = source.SAMPLE_WIDTH
+                self.chunk = source.CHUNK
+                self.seconds_per_chunk = self.chunk / self.rate
+                if self.vad is not None:
+                    self.vad.rate = self.rate
+                self.ring = deque(maxlen=max(1, int(math.ceil(PRE_ROLL / self.seconds_per_chunk))))
+                self.ready.set()
+                while not self.stopped.is_set():
+                    data = source.stream.read(self.chunk)
+                    if not data:
+                        break  # end of an audio file
+                    self.Process(data)
+                # Whatever was being said when the input ended is still an utterance
+                if self.phrase:
+                    self.Emit()
+        except Exception as e:
+            print(f"[Listener] Capture stopped: {e}")
+        finally:
+            self.ready.set()
+            self.finished.set()
+            self.utterances.put(CAPTURE_DONE)
+
+    def Process(self, data):
+        self.frames += 1
+        if self.vad is not None:
+            # The VAD tracks its own noise floor, so no threshold calibration is needed
+            self.calibrated = True
+            energy = 0.0
+            speech = self.vad.IsSpeech(data, self.width)
+        else:
+            energy = FrameEnergy(data, self.width)
+            speech = energy > self.energy_threshold
+        if self.phrase is not None:
+            self.phrase.append(data)
+            self.silence = 0.0 if speech else self.silence + self.seconds_per_chunk
+            if self.silence >= self.pause_threshold or len(self.phrase) * self.seconds_per_chunk >= self.phrase_time_limit:
+                self.Emit()
+            return
+
+        self.ring.append(data)
+        if not self.calibrated:
+            # One-time calibration from the first moments after the stream opens
+            self.calibration.append(energy)
+            if len(self.calibration) * self.seconds_per_chunk >= CALIBRATION_SECONDS:
+                self.energy_threshold = max(50.0, sum(self.calibration) / len(self.calibration) * DYNAMIC_RATIO)
+                self.calibrated = True
+            return
+
+        if self.armed.is_set():
+            if self.armed_audio == 0.0:
+                RecordSpan("listen.arm_latency", time.perf_counter() - self.armed_at)
+            self.armed_audio += self.seconds_per_chunk
+            if speech:
+                self.phrase = list(self.ring)
+                self.silence = 0.0
+                return
+            if self.listen_timeout and self.armed_audio >= self.listen_timeout:
+                self.armed.clear()
+                self.utterances.put(None)
+                return
+
+        # Background recalibration on audio that isn't speech
+        if self.vad is not None:
+            return
+        damping = DYNAMIC_DAMPING ** self.seconds_per_chunk
+        target = energy * DYNAMIC_RATIO
+        self.energy_threshold = max(50.0, self.energy_threshold * damping + target * (1 - damping))
+
+    def Emit(self):
+        audio = sr.AudioData(b"".join(self.phrase), self.rate, self.width)
+        self.phrase = None
+        self.silence = 0.0
+        self.ring.clear()
+        if self.armed_at is not None:
+            RecordSpan("listen", time.perf_counter() - self.armed_at)
+        if not self.continuous:
+            self.armed.clear()
+        else:
+            self.armed_at = time.perf_counter()
+            self.armed_audio = 0.0
+        self.utterances.put(audio)
+
+    def Recognize(self):
+        while True:
+            audio = self.utterances.get()
+            if audio is CAPTURE_DONE:
+                self.results.put(CAPTURE_DONE)
+                return
+            if audio is None:
+                self.results.put("")
+                continue
+            if self.gate is not None and time.monotonic() >= self.gate_open_until and not self.gate(audio):
+                self.gated += 1
+                continue
+            if self.recognize is None:
+                self.results.put(audio)
+                continue
+            with Span("recognize", audio_seconds=round(len(audio.frame_data) / (audio.sample_rate * audio.sample_width), 2)):
+                text = self.recognize(audio)
+            print(f"[Listener] User said: {text}")
+            self.results.put(text)
+
+    def Arm(self, continuous=False):
+        # Starts capturing the next utterance; results from earlier turns are dropped
+        while True:
+            try:
+                self.results.get_nowait()
+            except Empty:
+                break
+        self.continuous = continuous
+        self.armed_at = time.perf_counter()
+        self.armed_audio = 0.0
+        self.armed.set()
+
+    def OpenGate(self, seconds):
+        # Lets utterances through without the wake word for a while (after "Jarvis" alone)
+        self.gate_open_until = time.monotonic() + seconds
+
+    def Disarm(self):
+        self.continuous = False
+        self.armed.clear()
+
+    def Listen(self, token=None):
+        # Waits for one utterance and returns its text ("" if nothing was said).
+        # Cancelling token disarms the listener and raises TurnCancelled.
+        token = Cancellable(token)
+        self.ready.wait()
+        if self.finished.is_set():
+            return ""
+        # A continuous (wake word) stream is resumed afterwards instead of being left off
+        continuous = self.continuous
+        self.Arm()
+        detach = token.OnCancel(lambda: (self.Disarm(), self.results.put(LISTEN_CANCELLED)))
+        try:
+            result = self.results.get(timeout=self.listen_timeout + self.phrase_time_limit + RECOGNITION_TIMEOUT)
+        except Empty:
+            self.Disarm()
+            return ""
+        finally:
+            detach()
+            if continuous:
+                self.Arm(continuous=True)
+        token.Check()
+        return "" if result is CAPTURE_DONE or result is LISTEN_CANCELLED else result
+
+    def Results(self):
+        # Every result until the input ends; used with audio files
+        while True:
+            result = self.results.get()
+            if result is CAPTURE_DONE:
+                return
+            yield result
+
+    def Stop(self):
+        self.stopped.set()
+
+if __name__ == "__main__":
+    # Feeds a WAV file through the listener in continuous mode and prints every utterance
+    if len(sys.argv) < 2:
+        print("usage: python Listener.py file.wav [--no-recognize]")
+        sys.exit(1)
+    recognize = None if "--no-recognize" in sys.argv else GoogleRecognizer()
+    listener = MicrophoneListener(sr.AudioFile(sys.argv[1]), recognize=recognize, listen_timeout=0)
+    listener.Arm(continuous=True)
+    listener.start()
+    for result in listener.Results():
+        if isinstance(result, sr.AudioData):
+            seconds = len(result.frame_data) / (result.sample_rate * result.sample_width)
+            print(f"[Listener] Utterance of {seconds:.2f}s")
+        elif result:
+            print(f"[Listener] {result}")
+    print(f"[Listener] Final energy threshold: {listener.energy_threshold:.0f}")
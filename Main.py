@@ -1,24 +1,48 @@
+# Startup instrumentation comes first so the GUI and backend imports are timed
+from Backend.Startup import StartImportTimer, StopImportTimer, Mark, StartupReport, LazyFunction, Preload
+StartImportTimer()
+
 from Frontend.GUI import (
     GraphicalUserInterface,
     SetAssistantStatus,
     ShowTextToScreen,
-    TempDirectoryPath,
+    ShowPartialTextToScreen,
     SetMicrophoneStatus,
     AnswerModifier,
-    QueryModifier
+    QueryModifier,
+    Publish,
+    Subscribe
 )
 
-from Backend.Model import FirstLayerDMM
-from Backend.RealtimeSearchEngine import RealtimeSearchEngine
-from Backend.Automation import Automation
-from Backend.Speech import takecommand, speak
-from Backend.Chatbot import ChatBot
+# The modules behind these facades pull in groq, cohere, AppOpener, pywhatkit,
+# speech_recognition and pyttsx3; they are imported on first use, or by
+# Preload() on the backend thread once the window is up.
+FirstLayerDMM = LazyFunction("Backend.Model", "FirstLayerDMM")
+RealtimeSearchEngineStream = LazyFunction("Backend.RealtimeSearchEngine", "RealtimeSearchEngineStream")
+RecordSearchTurn = LazyFunction("Backend.RealtimeSearchEngine", "RecordSearchTurn")
+Automation = LazyFunction("Backend.Automation", "Automation")
+takecommand = LazyFunction("Backend.Speech", "takecommand")
+speak = LazyFunction("Backend.Speech", "speak")
+FlushSpeech = LazyFunction("Backend.Speech", "FlushSpeech")
+StartListener = LazyFunction("Backend.Speech", "StartListener")
+WakeWordCommands = LazyFunction("Backend.Speech", "WakeWordCommands")
+OpenFollowUp = LazyFunction("Backend.Speech", "OpenFollowUp")
+ChatBotStream = LazyFunction("Backend.Chatbot", "ChatBotStream")
+RecordTurn = LazyFunction("Backend.Chatbot", "RecordTurn")
+
+from Backend.Speculation import Speculation, SpeculationStats
+from Backend.Streaming import BufferedStream
+from Backend.ImageJobs import ImageJobClient
+from Backend.ImageStore import WantsVariations
+from Backend.Tracing import StartTrace, Span, StartMetricsServer
+from Backend.Cancellation import TurnScheduler, TurnCancelled, Cancellable
+from Backend.ChatStore import MessageCount
+from Backend.Transcript import GetTranscript
 from dotenv import dotenv_values
 from asyncio import run
-from time import sleep
 import subprocess
 import threading
-import json
+import time
 import os
 import sys # Import sys for platform-specific subprocess creation
 
@@ -26,6 +50,14 @@ import sys # Import sys for platform-specific subprocess creation
 env_vars = dotenv_values(".env")
 Username = env_vars.get("Username")
 Assistantname = env_vars.get("Assistantname")
+# Start the general answer while the decision model is still running
+SpeculativeMode = str(env_vars.get("SpeculativeMode", "False")).lower() == "true"
+# Print the import-time and time-to-window report once the window is up
+ShowStartupReport = str(env_vars.get("StartupReport", "True")).lower() == "true"
+# Listen all the time and react to the wake word instead of the mic button
+AlwaysListening = str(env_vars.get("AlwaysListening", "False")).lower() == "true"
+# Shortest gap between two renders of a streaming answer, in seconds
+PARTIAL_INTERVAL = 0.05
 DefaultMessage = f"""{Username} : Hello {Assistantname}, How are you?
 {Assistantname} : Welcome {Username}. I am doing well. How may I help you?"""
 
@@ -38,66 +70,20 @@ image_gen_log_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "i
 
 Functions = ["open", "close", "play", "system", "content", "google search", "Youtube"]
 
+# True while the running turn is waiting for the user to speak
 ListeningFlag = False
 
 def ShowDefaultChatIfNoChats():
-    try:
-        with open(r'Data\ChatLog.json', "r", encoding='utf-8') as File:
-            file_content = File.read().strip()
-            if not file_content or file_content == "[]":
-                os.makedirs(os.path.dirname(TempDirectoryPath('Database.data')), exist_ok=True)
-
-                with open(TempDirectoryPath('Database.data'), 'w', encoding='utf-8') as file:
-                    file.write("")
-                with open(TempDirectoryPath('Responses.data'), 'w', encoding='utf-8') as file:
-                    file.write(DefaultMessage)
-                if not file_content:
-                    with open(r'Data\ChatLog.json', 'w', encoding='utf-8') as f:
-                        json.dump([], f)
-    except FileNotFoundError:
-        os.makedirs('Data', exist_ok=True)
-        with open(r'Data\ChatLog.json', 'w', encoding='utf-8') as f:
-            json.dump([], f)
-        ShowDefaultChatIfNoChats()
-
-def ReadChatLogJson():
-    try:
-        with open(r'Data\ChatLog.json', 'r', encoding='utf-8') as file:
-            return json.load(file)
-    except (FileNotFoundError, json.JSONDecodeError):
-        print(f"ChatLog.json not found or corrupted. Creating empty file.")
-        with open(r'Data\ChatLog.json', 'w', encoding='utf-8') as f:
-            json.dump([], f)
-        return []
-
-def ChatLogIntegration():
-    json_data = ReadChatLogJson()
-    formatted_chatlog = ""
-    for entry in json_data:
-        if entry["role"] == "user":
-            formatted_chatlog += f"User: {entry['content']}\n"
-        elif entry["role"] == "assistant":
-            formatted_chatlog += f"Assistant: {entry['content']}\n"
-
-    formatted_chatlog = formatted_chatlog.replace("User", Username + "")
-    formatted_chatlog = formatted_chatlog.replace("Assistant", Assistantname + "")
-
-    with open(TempDirectoryPath('Database.data'), 'w', encoding='utf-8') as file:
-        file.write(AnswerModifier(formatted_chatlog))
-
-def ShowChatsOnGUI():
-    with open(TempDirectoryPath('Database.data'), "r", encoding='utf-8') as File:
-        Data = File.read()
-        if len(str(Data)) > 0:
-            with open(TempDirectoryPath('Responses.data'), "w", encoding='utf-8') as f:
-                f.write('\n'.join(Data.split('\n')))
+    if MessageCount() == 0:
+        ShowTextToScreen(DefaultMessage)
 
 def InitialExecution():
     SetMicrophoneStatus("False")
     ShowTextToScreen("")
+    # The chat view pages the pre-formatted transcript (Data\Transcript) on
+    # demand; only messages logged since the last sync are formatted here
+    Publish("transcript.source", GetTranscript())
     ShowDefaultChatIfNoChats()
-    ChatLogIntegration()
-    ShowChatsOnGUI()
     SetAssistantStatus("Available ...")
     start_image_generation_process() # This is where the image gen script is launched!
 
@@ -156,14 +142,133 @@ def start_image_generation_process():
         print(f"[Main] Error starting image generation script subprocess: {e}")
         log_file_handle.close()
 
-def MainExecution():
+# --- Streams an answer to the screen and the speaker as it is generated ---
+def StreamAnswer(Events, token):
+    # Partial text is rendered when a sentence completes, and otherwise at most
+    # every PARTIAL_INTERVAL, so a long answer isn't reformatted and redrawn on
+    # every token. Each completed sentence is queued on the speech worker while
+    # the model keeps generating the rest.
+    Answer = ""
+    spoken = None
+    rendered = 0.0
+    try:
+        for kind, text in Events:
+            token.Check()
+            if kind == "delta":
+                if not Answer:
+                    SetAssistantStatus("Answering ...")
+                Answer += text
+                now = time.monotonic()
+                if now - rendered >= PARTIAL_INTERVAL:
+                    ShowPartialTextToScreen(f"{Assistantname} : {AnswerModifier(Answer)}")
+                    rendered = now
+            elif kind == "sentence":
+                ShowPartialTextToScreen(f"{Assistantname} : {AnswerModifier(Answer)}")
+                rendered = time.monotonic()
+                spoken = speak(text)
+    finally:
+        ShowTextToScreen(f"{Assistantname} : {AnswerModifier(Answer)}")
+    # The turn ends once the last sentence has been spoken, or when it is cancelled
+    if spoken is not None:
+        token.Wait(spoken)
+    return Answer
+
+# --- Fans out general/realtime sub-queries and combines their answers ---
+def DispatchQueries(SubQueries, token, speculation=None):
+    # Each sub-query gets its own search and completion on a background stream,
+    # so the turn takes as long as the slowest one. The answers are streamed to
+    # the user in decision order and logged in the same order afterwards.
+    # The streams share the turn's token, so a cancel closes all of them.
+    streams = []
+    for kind, text in SubQueries:
+        query = QueryModifier(text)
+        if kind == "general" and speculation is not None and speculation.Query == query:
+            # The speculative answer was for exactly this question
+            speculation.Commit()
+            print(f"[Main] Speculation committed: {SpeculationStats()}")
+            streams.append((kind, speculation))
+            speculation = None
+        elif kind == "realtime":
+            streams.append((kind, BufferedStream(query, lambda q, token: RealtimeSearchEngineStream(q, log=False, token=token), token)))
+        else:
+            streams.append((kind, BufferedStream(query, lambda q, token: ChatBotStream(q, log=False, token=token), token)))
+    if speculation is not None:
+        speculation.Cancel()
+        print(f"[Main] Speculation cancelled: {SpeculationStats()}")
+
+    if any(kind == "realtime" for kind, _ in streams):
+        SetAssistantStatus("Searching ...")
+
+    def CombinedEvents():
+        for index, (_, stream) in enumerate(streams):
+            if index:
+                yield "delta", "\n"
+            yield from stream.Events()
+
+    try:
+        StreamAnswer(CombinedEvents(), token)
+    except BaseException:
+        # Stop the remaining background streams (without counting them as wasted speculation)
+        for _, stream in streams:
+            BufferedStream.Cancel(stream)
+        raise
+
+    for kind, stream in streams:
+        Answer = stream.Wait()
+        if Answer is None:
+            continue
+        if kind == "realtime":
+            RecordSearchTurn(stream.Query, Answer)
+        else:
+            RecordTurn(stream.Query, Answer)
+    # Format just this turn's messages into the transcript snapshot
+    GetTranscript()
+
+# --- Image job queue client ---
+ImageJobs = None
+
+def GetImageJobClient():
+    global ImageJobs
+    if ImageJobs is None:
+        ImageJobs = ImageJobClient(on_event=OnImageJobEvent)
+    return ImageJobs
+
+def OnImageJobEvent(event):
+    # Called on the client's listener thread for every job update from the worker
+    print(f"[Main] Image job {event.get('job')}: {event['event']}")
+    Publish("image.job", event)
+
+def MainExecution(Query=None, token=None):
+    # Runs on the turn scheduler. Every turn gets its own trace ID; its stages
+    # are recorded as spans. A cancelled turn just stops where it was.
+    global ListeningFlag
+    token = Cancellable(token)
+    trace_id = StartTrace()
+    try:
+        with Span("turn"):
+            ExecuteTurn(Query, token)
+    except TurnCancelled as e:
+        print(f"[Main] Turn {trace_id} cancelled: {e}")
+        ListeningFlag = False
+        SetMicrophoneStatus("False")
+        SetAssistantStatus("Available ...")
+    finally:
+        if AlwaysListening:
+            SetAssistantStatus(f"Say \"{Assistantname}\" ...")
+    print(f"[Main] Turn traced as {trace_id}")
+
+def ExecuteTurn(Query, token):
     global ListeningFlag
     TaskExecution = False
-    ImageExecution = False
-    ImageGenerationQuery = ""
+    # Barge-in: cancelling the turn also cuts off whatever it is saying
+    token.OnCancel(lambda: FlushSpeech(interrupt=True))
 
-    SetAssistantStatus("Listening ...")
-    Query = takecommand()
+    # In always-listening mode the query was already heard after the wake word
+    if Query is None:
+        ListeningFlag = True
+        SetMicrophoneStatus("True")
+        SetAssistantStatus("Listening ...")
+        Query = takecommand(token)
     if not Query:
         SetAssistantStatus("Available ...")
         ListeningFlag = False
@@ -175,23 +280,27 @@ def MainExecution():
 
     ShowTextToScreen(f"{Username} : {Query}")
     SetAssistantStatus("Thinking ...")
-    Decision = FirstLayerDMM(Query)
+    speculation = None
 
-    print(f"\nDecision: {Decision}\n")
+    def Speculate():
+        nonlocal speculation
+        if SpeculativeMode:
+            speculation = Speculation(QueryModifier(Query), lambda q, token, save_summary: ChatBotStream(q, log=False, token=token, save_summary=save_summary), token)
+
+    with Span("decision"):
+        Decision = FirstLayerDMM(Query, on_fallback=Speculate, token=token)
 
-    G = any(i.startswith("general") for i in Decision)
-    R = any(i.startswith("realtime") for i in Decision)
+    print(f"\nDecision: {Decision}\n")
 
-    Merged_query = " and ".join(
-        [" ".join(i.split()[1:]) for i in Decision if i.startswith("general") or i.startswith("realtime")]
-    )
+    # Every general and realtime item is answered; none are merged or dropped
+    SubQueries = [
+        (i.split()[0], " ".join(i.split()[1:])) for i in Decision if i.startswith("general") or i.startswith("realtime")
+    ]
 
-    # Check for image generation request
-    for queries in Decision:
-        if "generate image" in queries:
-            ImageGenerationQuery = queries.replace("generate image", "").strip()
-            ImageExecution = True
-            break # Only need to find one "generate image" decision
+    # Check for image generation requests; each one becomes its own job
+    ImageGenerationQueries = [
+        queries.replace("generate image", "").strip() for queries in Decision if "generate image" in queries
+    ]
 
     # Handle Automation commands (open, close, play, etc.)
     for queries in Decision:
@@ -200,72 +309,50 @@ def MainExecution():
                 try:
                     # Note: Automation itself might run async code.
                     # Ensure 'Automation' is compatible with threading or called on the main thread if needed.
-                    run(Automation(Decision)) # Automation takes the whole decision list
+                    with Span("automation"):
+                        run(Automation(Decision, token)) # Automation takes the whole decision list
                     TaskExecution = True
                 except Exception as e:
                     print(f"[Main] Automation Error on '{queries}': {e}")
                 
-    # If an image generation request was detected
-    if ImageExecution:
-        # Construct the absolute path to the data file (relative to project root)
-        image_data_file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), r"Frontend\Files\ImageGeneration.data")
-        os.makedirs(os.path.dirname(image_data_file_path), exist_ok=True) # Ensure directory exists
-        
-        try:
-            # Write the command to the file. ImageGeneration.py (running in background) will pick it up.
-            with open(image_data_file_path, "w") as file:
-                file.write(f"{ImageGenerationQuery},True")
-            print(f"[Main] Wrote '{ImageGenerationQuery},True' to {image_data_file_path}")
-            speak(f"Generating image for {ImageGenerationQuery}.")
-        except Exception as e:
-            print(f"[Main] Error writing to ImageGeneration.data: {e}")
-            speak("Sorry, I couldn't set up image generation.")
-        
-        SetAssistantStatus("Available ...")
-        return # Exit MainExecution after handling image request
+    # If image generation requests were detected, queue them on the image worker
+    if ImageGenerationQueries:
+        for ImageGenerationQuery in ImageGenerationQueries:
+            try:
+                # "another one", "regenerate ..." ask for fresh images instead of stored ones
+                fresh = WantsVariations(Query)
+                job_id = GetImageJobClient().Submit(ImageGenerationQuery, fresh=fresh)
+                print(f"[Main] Queued image job {job_id} for '{ImageGenerationQuery}'")
+                speak(f"Generating image for {ImageGenerationQuery}.")
+            except OSError as e:
+                print(f"[Main] Error submitting image job: {e}")
+                speak("Sorry, I couldn't set up image generation.")
+
+        if not SubQueries:
+            if speculation is not None:
+                speculation.Cancel()
+            SetAssistantStatus("Available ...")
+            return # Exit MainExecution after handling image request
 
-    # Handle combined General and Realtime search, or just Realtime
-    if G and R or R:
+    # Answer every general/realtime item concurrently, in decision order
+    if SubQueries:
         try:
-            SetAssistantStatus("Searching ...")
-            Answer = RealtimeSearchEngine(QueryModifier(Merged_query))
-            ShowTextToScreen(f"{Assistantname} : {Answer}")
-            SetAssistantStatus("Answering ...")
-            speak(Answer)
+            DispatchQueries(SubQueries, token, speculation)
         except Exception as e:
-            print("[Main] RealtimeSearch Error:", e)
-            speak("Sorry, I had trouble with the search.")
+            print("[Main] Dispatch Error:", e)
+            speak("Sorry, I had trouble answering that.")
         SetAssistantStatus("Available ...")
         return
 
-    # Handle individual General or Realtime commands, or exit
-    for Queries in Decision: # Loop through decisions again for general/realtime/exit if not handled above
-        if "general" in Queries:
-            SetAssistantStatus("Thinking ...")
-            QueryFinal = Queries.replace("general ", "")
-            Answer = ChatBot(QueryModifier(QueryFinal))
-            ShowTextToScreen(f"{Assistantname} : {Answer}")
-            SetAssistantStatus("Answering ...")
-            speak(Answer)
-            SetAssistantStatus("Available ...")
-            return
-
-        elif "realtime" in Queries:
-            SetAssistantStatus("Searching ...")
-            QueryFinal = Queries.replace("realtime ", "")
-            Answer = RealtimeSearchEngine(QueryModifier(QueryFinal))
-            ShowTextToScreen(f"{Assistantname} : {Answer}")
-            SetAssistantStatus("Answering ...")
-            speak(Answer)
-            SetAssistantStatus("Available ...")
-            return
+    if speculation is not None:
+        speculation.Cancel()
+        print(f"[Main] Speculation cancelled: {SpeculationStats()}")
 
-        elif "exit" in Queries:
+    # Handle exit
+    for Queries in Decision:
+        if "exit" in Queries:
             QueryFinal = "Okay, Bye!"
-            Answer = ChatBot(QueryModifier(QueryFinal))
-            ShowTextToScreen(f"{Assistantname} : {Answer}")
-            SetAssistantStatus("Answering ...")
-            speak(Answer)
+            StreamAnswer(ChatBotStream(QueryModifier(QueryFinal), token=token), token)
             SetAssistantStatus("Available ...")
             # Terminate the image generation child process gracefully
             if image_generation_process and image_generation_process.poll() is None:
@@ -287,34 +374,79 @@ def MainExecution():
             os._exit(0)
 
 # --- This is the backend logic loop. ---
+# --- Startup ---
+WindowShown = threading.Event()
+
+def OnWindowShown(_):
+    # Runs on the GUI thread after the first paint of the main window
+    Mark("window shown")
+    StopImportTimer()
+    WindowShown.set()
+    if ShowStartupReport:
+        print(StartupReport())
+
+Subscribe("gui.shown", OnWindowShown)
+
 def FirstThread():
+    # Backend work waits for the window so it doesn't compete with GUI startup
+    WindowShown.wait(timeout=30)
     InitialExecution() # This launches the image generation subprocess
-    
-    while True:
-        if ListeningFlag:
-            MainExecution()
-        else:
-            sleep(0.1)
+    StartMetricsServer() # Per-stage latency histograms on localhost
+    # Warm the backend modules now, so the first turn doesn't pay for the imports
+    Preload(FirstLayerDMM, ChatBotStream, RealtimeSearchEngineStream, takecommand, Automation)
+    # Open the microphone now so it is calibrated before the first mic click
+    global AlwaysListening
+    try:
+        StartListener(always_on=AlwaysListening)
+    except Exception as e:
+        print(f"[Main] Unable to open the microphone: {e}")
+
+    if AlwaysListening:
+        # Hearing the wake word interrupts the running turn right away; the
+        # command that follows it becomes the next turn
+        SetAssistantStatus(f"Say \"{Assistantname}\" ...")
+        try:
+            for Query in WakeWordCommands(on_wake=lambda: Scheduler.Interrupt("wake word")):
+                SetMicrophoneStatus("True")
+                Scheduler.Submit(Query, reason="wake word")
+        except Exception as e:
+            print(f"[Main] Always-listening mode stopped: {e}")
+        # No microphone (or it went away): the mic button still works
+        AlwaysListening = False
+        SetAssistantStatus("Available ...")
+
+# --- Turns run one at a time on the scheduler thread; it sleeps until one is submitted ---
+Scheduler = TurnScheduler(MainExecution)
 
 # --- This function is the controller for the microphone. ---
 def ToggleListening():
-    global ListeningFlag
-    ListeningFlag = not ListeningFlag
-    if ListeningFlag:
-        SetMicrophoneStatus("True") # For GUI icon
+    # A press while listening stops listening. Any other press starts a new
+    # turn, cutting off the one that is thinking or speaking (barge-in).
+    if AlwaysListening:
+        # The wake word stream owns the microphone; a press lets the next
+        # utterance through without the wake word, and it becomes the turn
+        Scheduler.Interrupt("mic")
+        OpenFollowUp()
+        SetMicrophoneStatus("True")
         SetAssistantStatus("Listening ...")
-    else:
+    elif ListeningFlag:
+        Scheduler.Interrupt("mic")
         SetMicrophoneStatus("False") # For GUI icon
         SetAssistantStatus("Available ...")
+    else:
+        SetMicrophoneStatus("True") # For GUI icon
+        SetAssistantStatus("Listening ...")
+        Scheduler.Submit(reason="mic")
 
 
 if __name__ == "__main__":
     # The GUI must run on the main thread.
     # The backend logic will run in a separate, non-blocking "daemon" thread.
 
-    # 1. Create and start the backend thread.
+    # 1. Create and start the backend thread and the turn scheduler.
     backend_thread = threading.Thread(target=FirstThread, daemon=True)
     backend_thread.start()
+    Scheduler.start()
 
     # 2. Run the GUI on the main thread, passing it the function to call when the mic is clicked.
     GraphicalUserInterface(toggle_callback=ToggleListening)
\ No newline at end of file
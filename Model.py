@@ -1,11 +1,29 @@
-import cohere
 from rich import print
 from dotenv import dotenv_values
 
+try:
+    from Backend.FastIntent import FastDecision, LearnDecision, FastPathStats
+    from Backend.Startup import Mark
+    from Backend.Cancellation import Cancellable
+except ModuleNotFoundError:
+    from FastIntent import FastDecision, LearnDecision, FastPathStats
+    from Startup import Mark
+    from Cancellation import Cancellable
+
 # Load environment variables
 env_vars = dotenv_values(".env")
 CohereAPIKey = env_vars.get("CohereAPIKey")
-co = cohere.Client(api_key=CohereAPIKey)
+co = None
+
+def GetCohereClient():
+    # Built on first use so that importing the module stays offline; the
+    # fast path answers many prompts without ever needing it
+    global co
+    if co is None:
+        import cohere
+        Mark("client: cohere (Model)")
+        co = cohere.Client(api_key=CohereAPIKey)
+    return co
 
 # List of command types
 funcs = [
@@ -51,11 +69,28 @@ You will decide whether a query is a 'general' query, a 'realtime' query, or is
 *** Respond with 'general (query)' if you can't decide the kind of query or if a query is asking to perform a task which is not mentioned above. ***
 """  # [USE YOUR LONG PREAMBLE STRING HERE, KEEP SAME]
 
-def FirstLayerDMM(prompt: str = "test", depth: int = 0, max_depth: int = 2):
+def FirstLayerDMM(prompt: str = "test", on_fallback=None, token=None):
+    # Unambiguous commands are decided locally; only low-confidence queries reach Cohere
+    decision = FastDecision(prompt)
+    if decision:
+        return decision
+
+    # Lets the caller start work (e.g. a speculative answer) while Cohere decides
+    if on_fallback:
+        on_fallback()
+    # The Cohere stream can't be closed from another thread, so a cancelled
+    # turn stops waiting for it; the stream itself stops at its next event
+    token = Cancellable(token)
+    decision = token.Await(CohereDMM, prompt, token=token)
+    LearnDecision(prompt, decision)
+    return decision
+
+def CohereDMM(prompt: str = "test", depth: int = 0, max_depth: int = 2, token=None):
+    token = Cancellable(token)
     if depth >= max_depth:
         return [f"general {prompt}"]
 
-    stream = co.chat_stream(
+    stream = GetCohereClient().chat_stream(
         model='command-r-plus',
         message=prompt,
         temperature=0.7,
@@ -67,6 +102,7 @@ def FirstLayerDMM(prompt: str = "test", depth: int = 0, max_depth: int = 2):
 
     response = ""
     for event in stream:
+        token.Check()
         if event.event_type == "text-generation":
             response += event.text
 
@@ -78,7 +114,7 @@ def FirstLayerDMM(prompt: str = "test", depth: int = 0, max_depth: int = 2):
     filtered = [r for r in response_parts if any(r.startswith(func) for func in funcs)]
 
     if any("(query)" in r for r in filtered):
-        return FirstLayerDMM(prompt=prompt, depth=depth+1)
+        return CohereDMM(prompt=prompt, depth=depth+1, token=token)
     
     return filtered if filtered else [f"general {prompt}"]
 
@@ -86,4 +122,4 @@ if __name__ == "__main__":
     while True:
         user_input = input(">>> ")
         result = FirstLayerDMM(prompt=user_input)
-        print(result)
+        print(result, FastPathStats())
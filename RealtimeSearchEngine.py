@@ -1,8 +1,25 @@
-from googlesearch import search
-from groq import Groq # Importing the Groq library to use 
-from json import load, dump # Importing functions to rean 
 from dotenv import dotenv_values #Importing doteny_value I
+import threading
+import time
 import datetime # Importing the datetime module for real-
+
+try:
+    from Backend.ChatStore import AppendMessages
+    from Backend.ContextBuilder import BuildContext
+    from Backend.Streaming import StreamDeltas, SentenceEvents, CollectAnswer
+    from Backend.SearchCache import CachedSearch
+    from Backend.Tracing import Span
+    from Backend.Startup import Mark
+    from Backend.Cancellation import Cancellable
+except ModuleNotFoundError:
+    from ChatStore import AppendMessages
+    from ContextBuilder import BuildContext
+    from Streaming import StreamDeltas, SentenceEvents, CollectAnswer
+    from SearchCache import CachedSearch
+    from Tracing import Span
+    from Startup import Mark
+    from Cancellation import Cancellable
+
 #Load environment variables from the env file. 
 env_vars =dotenv_values(".env")
 #Retrieve environment variables for the chatbot configura
@@ -10,27 +27,41 @@ Username = env_vars.get("Username")
 Assistantname =env_vars.get("Assistantname")
 GroqAPIKey =env_vars.get("GroqAPIKey")
 
-# Initialize the Groq client with the provided API key.
-client =Groq(api_key=GroqAPIKey)
+# Groq client, created with the provided API key on first use.
+Client = None
+ClientLock = threading.Lock()
+
+def GetClient():
+    # The Groq client is built on first use instead of at import, so importing
+    # this module never touches the network
+    global Client
+    with ClientLock:
+        if Client is None:
+            from groq import Groq
+            Mark("client: groq (RealtimeSearchEngine)")
+            Client = Groq(api_key=GroqAPIKey)
+        return Client
 
 System = f"""Hello, I am {Username}, You are a very accurate and advanced AI chatbot named {Assistantname} which has real-time up-to-date information from the internet.
 *** Provide Answers In a Professional Way, make sure to add full stops, commas, question marks, and use proper grammar.***
 *** Just answer the question from the provided data in a professional way. ***"""
 
-try:
-    with open(r"Data\ChatLog.json", "r") as f:
-         messages = load(f)
-except:
-    with open(r"Data\ChatLog.json", "w") as f: 
-        dump([], f)
 #Function to perform a Google search and format the results.
 
-def GoogleSearch(query):
-    results = list(search(query, advanced=True, num_results=5)) 
+def FetchSearchResults(query):
+    # googlesearch pulls in requests and bs4, so it is imported on the first search
+    from googlesearch import search
+    return [[i.title, i.description] for i in search(query, advanced=True, num_results=5)]
+
+#Repeated questions are answered from the search cache instead of a new scrape.
+#The scrape can't be interrupted, so a cancelled turn stops waiting for it.
+def GoogleSearch(query, token=None):
+    with Span("search"):
+        results = Cancellable(token).Await(CachedSearch, query, FetchSearchResults)
     Answer =f"The search results for '{query}' are:\n[start]\n"
 
-    for i in results:
-        Answer += f"Title: {i.title}\nDescription: {i.description}\n\n"
+    for title, description in results:
+        Answer += f"Title: {title}\nDescription: {description}\n\n"
     Answer += "[end]"
     return Answer
 
@@ -67,21 +98,35 @@ def Information():
     data +=f"Time: {hour} hours, {minute} minutes, {second} seconds.\n"
     return data
 
-#Function to handle real-time search and response generation.
+#Function to append a finished search turn to the chat log.
 
-def RealtimeSearchEngine(prompt):
-    global SystemChatBot, messages
-    with open(r"Data\ChatLog.json", "r") as f: 
-        messages= load(f) 
-    messages.append({"role": "user", "content": f" {prompt}"})
+def RecordSearchTurn(prompt, Answer):
+    AppendMessages([
+        {"role": "user", "content": f" {prompt}"},
+        {"role": "assistant", "content": Answer}
+    ])
 
-#Add Google search results to the system chatbot messages.
-    SystemChatBot.append({"role": "system", "content": GoogleSearch(prompt)})
+#Function to handle real-time search and stream the response as
+#("delta", text) and ("sentence", text) events. Returns the answer; with
+#log=False the caller records the turn itself.
+
+def RealtimeSearchEngineStream(prompt, log=True, token=None):
+    token = Cancellable(token)
+#Add Google search results to a per-call copy of the system messages.
+    SystemMessages = SystemChatBot + [
+        {"role": "system", "content": GoogleSearch(prompt, token)},
+        {"role": "system", "content": Information()}
+    ]
+
+#Keep the request within the model window: recent turns plus a rolling summary.
+    messages, _ = BuildContext(SystemMessages, f" {prompt}", max_tokens=2048)
 
 #Generate a response using the Groq client. 
-    completion = client.chat.completions.create (
+    token.Check()
+    started = time.perf_counter()
+    completion = GetClient().chat.completions.create (
          model ="llama3-70b-8192",
-         messages =SystemChatBot + [{"role": "system", "content": Information()}] + messages,
+         messages =messages,
          temperature=0.7,
          max_tokens=2048,
          top_p=1,
@@ -91,21 +136,23 @@ def RealtimeSearchEngine(prompt):
 
     Answer =""
 
-    for chunk in completion: 
-        if chunk.choices[0].delta.content: 
-            Answer += chunk.choices[0].delta.content
+    for kind, text in SentenceEvents(StreamDeltas(completion, "llm.realtime", started, token)):
+        if kind == "delta":
+            Answer += text
+        yield kind, text
 
 #Clean up the response.
     Answer= Answer.strip().replace("</s>", "") 
-    messages.append({"role": "assistant", "content": Answer})
 
-#Save the updated chat log back to the JSON file. 
-    with open(r"Data\ChatLog.json", "w") as f:
-         dump(messages, f, indent=4)
+#Append the new user/assistant pair to the chat log.
+    if log:
+        RecordSearchTurn(prompt, Answer)
+    return Answer
 
-# Remove the most recent system message from the chatbot conversation.
-    SystemChatBot.pop()
-    return AnswerModifier (Answer=Answer)
+#Function to handle real-time search and return the full response.
+
+def RealtimeSearchEngine(prompt):
+    return AnswerModifier (Answer=CollectAnswer(RealtimeSearchEngineStream(prompt)).strip())
 
 #Main entry point of the program for interactive querying.
 if __name__=="__main__":
@@ -0,0 +1,160 @@
+from collections import OrderedDict, Counter
+from dotenv import dotenv_values
+import threading
+import sqlite3
+import json
+import time
+import os
+import re
+
+# Cache for RealtimeSearchEngine.GoogleSearch results.
+#
+# Queries are normalized ("What's today's news?" and "what is todays news" share
+# a key) and each entry gets a TTL from its query class, so news expires within
+# minutes while biographies are kept for days; questions about the clock
+# ("what is the time in tokyo") are never cached. Entries live in a bounded LRU in
+# memory, backed by an optional SQLite tier that survives restarts.
+
+env_vars = dotenv_values(".env")
+SearchCacheSize = int(env_vars.get("SearchCacheSize") or 256)
+SearchCacheDisk = (env_vars.get("SearchCacheDisk") or "True").lower() == "true"
+Assistantname = (env_vars.get("Assistantname") or "jarvis").lower()
+SEARCH_CACHE_FILE = os.path.join("Data", "SearchCache.sqlite3")
+
+MINUTE = 60
+HOUR = 60 * MINUTE
+DAY = 24 * HOUR
+
+# (class, pattern, ttl) checked in order; the first match wins, a ttl of 0 is never cached
+QUERY_CLASSES = [
+    ("clock", re.compile(r"\b(time|clock|date|what day)\b"), 0),
+    ("news", re.compile(r"\b(news|headlines?|latest|breaking|today|tonight|now|current|currently|recent|recently|"
+                        r"live|score|match|won|winner)\b"), 10 * MINUTE),
+    ("market", re.compile(r"\b(price|stock|share|shares|rate|sensex|nifty|bitcoin|crypto)\b"), 15 * MINUTE),
+    ("weather", re.compile(r"\b(weather|temperature|forecast|rain)\b"), 30 * MINUTE),
+    # A named person ("who is elon musk"), not a role ("who is the ceo of twitter")
+    ("biography", re.compile(r"^(who is|who was|tell me about|biography of) (?!(the|a|an|my|your|our|this|that)\b)"), 7 * DAY),
+]
+DEFAULT_CLASS = ("default", 6 * HOUR)
+
+CONTRACTIONS = {"what's": "what is", "who's": "who is", "where's": "where is", "how's": "how is", "todays": "today's"}
+FILLER_WORDS = re.compile(rf"\b(please|can you|could you|tell me|search for|search|google|{re.escape(Assistantname)}|the|a|an)\b")
+
+def NormalizeQuery(query):
+    text = query.lower().strip()
+    for short, full in CONTRACTIONS.items():
+        text = re.sub(rf"\b{re.escape(short)}", full, text)
+    text = re.sub(r"[^\w\s']", " ", text)
+    return " ".join(text.split())
+
+def CacheKey(query):
+    # Filler words are dropped from the key only; the class is chosen on the full text
+    return " ".join(FILLER_WORDS.sub(" ", NormalizeQuery(query)).split())
+
+def QueryClass(query):
+    text = NormalizeQuery(query)
+    for name, pattern, ttl in QUERY_CLASSES:
+        if pattern.search(text):
+            return name, ttl
+    return DEFAULT_CLASS
+
+class SearchCache:
+    def __init__(self, size=SearchCacheSize, disk_path=SEARCH_CACHE_FILE if SearchCacheDisk else None):
+        self.size = size
+        self.memory = OrderedDict()  # key -> (expires_at, results)
+        self.lock = threading.Lock()
+        self.stats = Counter()
+        self.db = None
+        if disk_path:
+            os.makedirs(os.path.dirname(disk_path) or ".", exist_ok=True)
+            self.db = sqlite3.connect(disk_path, check_same_thread=False)
+            self.db.execute("CREATE TABLE IF NOT EXISTS search (key TEXT PRIMARY KEY, expires REAL, results TEXT)")
+            self.db.execute("DELETE FROM search WHERE expires < ?", (time.time(),))
+            self.db.commit()
+
+    def _remember(self, key, expires, results):
+        self.memory[key] = (expires, results)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.size:
+            self.memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def Get(self, query):
+        key = CacheKey(query)
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry:
+                if entry[0] > now:
+                    self.memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    return entry[1]
+                del self.memory[key]
+                self.stats["expired"] += 1
+            if self.db is not None:
+                row = self.db.execute("SELECT expires, results FROM search WHERE key = ?", (key,)).fetchone()
+                if row and row[0] > now:
+                    results = json.loads(row[1])
+                    self._remember(key, row[0], results)
+                    self.stats["disk_hits"] += 1
+                    return results
+                if row:
+                    self.stats["expired"] += 1
+            self.stats["misses"] += 1
+            return None
+
+    def Put(self, query, results):
+        key = CacheKey(query)
+        _, ttl = QueryClass(query)
+        if ttl <= 0:
+            return
+        expires = time.time() + ttl
+        with self.lock:
+            self._remember(key, expires, results)
+            if self.db is not None:
+                self.db.execute("INSERT OR REPLACE INTO search VALUES (?, ?, ?)", (key, expires, json.dumps(results)))
+                self.db.commit()
+
+    def Clear(self):
+        with self.lock:
+            self.memory.clear()
+            if self.db is not None:
+                self.db.execute("DELETE FROM search")
+                self.db.commit()
+
+    def Stats(self):
+        with self.lock:
+            hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+            lookups = hits + self.stats["misses"]
+            return {
+                "memory_hits": self.stats["memory_hits"],
+                "disk_hits": self.stats["disk_hits"],
+                "misses": self.stats["misses"],
+                "expired": self.stats["expired"],
+                "evictions": self.stats["evictions"],
+                "entries": len(self.memory),
+                "hit_rate": hits / lookups if lookups else 0.0,
+            }
+
+Cache = None
+CacheLock = threading.Lock()
+
+def GetSearchCache():
+    global Cache
+    with CacheLock:
+        if Cache is None:
+            Cache = SearchCache()
+        return Cache
+
+def CachedSearch(query, fetch):
+    # Returns cached results for the query, calling fetch(query) on a miss
+    cache = GetSearchCache()
+    results = cache.Get(query)
+    if results is None:
+        results = fetch(query)
+        if results:
+            cache.Put(query, results)
+    return results
+
+def SearchCacheStats():
+    return GetSearchCache().Stats()
@@ -0,0 +1,59 @@
+from collections import Counter
+import threading
+
+try:
+    from Backend.Streaming import BufferedStream
+    from Backend.ContextBuilder import SaveSummary, StoreSummary
+except ModuleNotFoundError:
+    from Streaming import BufferedStream
+    from ContextBuilder import SaveSummary, StoreSummary
+
+# Speculative execution of a streamed answer while the decision model is
+# still deciding. The stream runs on its own thread and buffers its events;
+# if the decision confirms the guess the buffered and remaining events are
+# replayed to the caller, otherwise the stream is closed and thrown away.
+# The rolling summary the stream's context built is only saved once the
+# guess is committed, so a cancelled guess leaves no trace.
+
+Stats = Counter()
+StatsLock = threading.Lock()
+
+class Speculation(BufferedStream):
+    def __init__(self, Query, StreamFactory, token=None):
+        # StreamFactory(Query, token=..., save_summary=...) must route its
+        # summary update through save_summary
+        self.summary_lock = threading.Lock()
+        self.committed = False
+        self.pending_summary = None
+        super().__init__(Query, lambda query, token: StreamFactory(query, token=token, save_summary=self.SaveSummary), token)
+
+    def SaveSummary(self, covered, lines):
+        # Called with ContextBuilder's SummaryLock held
+        with self.summary_lock:
+            if not self.committed:
+                self.pending_summary = (covered, lines)
+                return
+        SaveSummary(covered, lines)
+
+    def Commit(self):
+        with self.summary_lock:
+            self.committed = True
+            pending, self.pending_summary = self.pending_summary, None
+        if pending is not None:
+            StoreSummary(*pending)
+        # Work done before the decision arrived is time the user no longer waits for
+        with StatsLock:
+            Stats["committed"] += 1
+            Stats["saved_ms"] += int(self.Elapsed() * 1000)
+
+    def Cancel(self):
+        super().Cancel()
+        with self.summary_lock:
+            self.pending_summary = None
+        with StatsLock:
+            Stats["cancelled"] += 1
+            Stats["wasted_ms"] += int(self.Elapsed() * 1000)
+
+def SpeculationStats():
+    with StatsLock:
+        return dict(Stats)
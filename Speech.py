@@ -1,33 +1,208 @@
-import pyttsx3
-import speech_recognition as sr
-
-def speak(text):
-    engine = pyttsx3.init('sapi5')
-    voices = engine.getProperty('voices')
-    engine.setProperty('voice', voices[0].id)
-    engine.setProperty('rate', 174)
-    print(voices)
-    engine.say(text)
-    engine.runAndWait()
-
-def takecommand():
-    Ir = sr.Recognizer()
-    print("[Speech] Starting to listen")
-    
-    with sr.Microphone() as source:
-        print('listening....')
-        r = sr.Recognizer()
-        r.pause_threshold = 1
-        r.adjust_for_ambient_noise(source)
-        audio = r.listen(source, 10, 6)
+import itertools
+import threading
+import time
+from queue import PriorityQueue
+
+try:
+    from Backend.Tracing import Span, RecordSpan
+except ModuleNotFoundError:
+    from Tracing import Span, RecordSpan
+
+# Utterance priorities, lower is spoken first
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+# Long-lived speech worker. It owns the only pyttsx3 engine, so the engine and
+# its voices are set up once instead of on every utterance.
+class SpeechWorker(threading.Thread):
+    def __init__(self, voice_index=0, rate=174):
+        super().__init__(daemon=True, name="SpeechWorker")
+        self.voice_index = voice_index
+        self.rate = rate
+        self.queue = PriorityQueue()
+        self.sequence = itertools.count()
+        # Utterances queued before the last flush belong to an older generation
+        self.generation = 0
+        self.lock = threading.Lock()
+        self.engine = None
+        self.ready = threading.Event()
+        self.utterances = 0
+        self.total_latency = 0.0
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+        self.started_at = None
+        self.dequeued_at = None
+
+    def run(self):
+        # The TTS engine is loaded on the worker thread, not when the module is imported
         try:
-            print('recognizing')
-            query = r.recognize_google(audio, language='en-in')
-            print(f"user said: {query}")
+            import pyttsx3
+            engine = pyttsx3.init('sapi5')
+            voices = engine.getProperty('voices')
+            engine.setProperty('voice', voices[self.voice_index].id)
+            engine.setProperty('rate', self.rate)
+            engine.connect('started-utterance', self.OnStarted)
+            self.engine = engine
         except Exception as e:
-            return ""
-        return query.lower()
+            # Without a voice the queue is still drained, so nobody waiting
+            # on an utterance (speak(block=True), a streamed answer) hangs
+            print(f"[Speech] Text to speech unavailable: {e}")
+        self.ready.set()
+
+        while True:
+            priority, _, generation, text, done = self.queue.get()
+            try:
+                if generation < self.generation or not text or self.engine is None:
+                    continue
+                self.dequeued_at = time.perf_counter()
+                self.started_at = None
+                with Span("speak", chars=len(text)):
+                    self.engine.say(text)
+                    self.engine.runAndWait()
+                self.RecordLatency()
+            except Exception as e:
+                print(f"[Speech] Error while speaking: {e}")
+            finally:
+                done.set()
+
+    def OnStarted(self, name):
+        self.started_at = time.perf_counter()
+
+    def RecordLatency(self):
+        # Synthesis latency: from taking the utterance off the queue to audio start
+        if self.started_at is None:
+            return
+        latency = self.started_at - self.dequeued_at
+        RecordSpan("speak.latency", latency)
+        with self.lock:
+            self.utterances += 1
+            self.total_latency += latency
+            self.last_latency = latency
+            self.max_latency = max(self.max_latency, latency)
+
+    def Say(self, text, priority=PRIORITY_NORMAL):
+        done = threading.Event()
+        self.queue.put((priority, next(self.sequence), self.generation, text, done))
+        return done
+
+    def Flush(self, interrupt=False):
+        # Drops every queued utterance; interrupt also cuts off the current one
+        with self.lock:
+            self.generation += 1
+        while not self.queue.empty():
+            try:
+                *_, done = self.queue.get_nowait()
+            except Exception:
+                break
+            done.set()
+        if interrupt and self.engine is not None:
+            self.engine.stop()
+
+    def Stats(self):
+        with self.lock:
+            return {
+                "queue_depth": self.queue.qsize(),
+                "utterances": self.utterances,
+                "last_latency": self.last_latency,
+                "avg_latency": self.total_latency / self.utterances if self.utterances else 0.0,
+                "max_latency": self.max_latency,
+            }
+
+Worker = None
+WorkerLock = threading.Lock()
+
+def GetSpeechWorker():
+    global Worker
+    with WorkerLock:
+        if Worker is None:
+            Worker = SpeechWorker()
+            Worker.start()
+        return Worker
+
+def speak(text, priority=PRIORITY_NORMAL, block=False):
+    # Queues the text and returns an Event that is set once it has been spoken
+    done = GetSpeechWorker().Say(text, priority)
+    if block:
+        done.wait()
+    return done
+
+def FlushSpeech(interrupt=False):
+    GetSpeechWorker().Flush(interrupt)
+
+def SpeechStats():
+    return GetSpeechWorker().Stats()
+
+# --- Speech recognition ---
+# One MicrophoneListener keeps the input stream open for the whole session, so
+# takecommand() only arms it instead of opening the device and calibrating.
+Listener = None
+ListenerLock = threading.Lock()
+FOLLOW_UP_SECONDS = 8  # how long an utterance is taken without the wake word
+
+def StartListener(source=None, recognize=None, always_on=False):
+    # source defaults to the microphone; pass sr.AudioFile(...) to feed a WAV instead.
+    # always_on puts the VAD and wake word gate in front of the recognizer.
+    global Listener
+    with ListenerLock:
+        if Listener is None or Listener.finished.is_set():
+            try:
+                from Backend.Listener import MicrophoneListener, GoogleRecognizer
+            except ModuleNotFoundError:
+                from Listener import MicrophoneListener, GoogleRecognizer
+            if always_on:
+                try:
+                    from Backend.WakeWord import VoiceActivityDetector, WakeWordGate
+                except ModuleNotFoundError:
+                    from WakeWord import VoiceActivityDetector, WakeWordGate
+                Listener = MicrophoneListener(source, recognize=recognize or GoogleRecognizer(), listen_timeout=0,
+                                              vad=VoiceActivityDetector(), gate=WakeWordGate())
+            else:
+                Listener = MicrophoneListener(source, recognize=recognize or GoogleRecognizer())
+            Listener.start()
+        return Listener
+
+def takecommand(token=None):
+    print("[Speech] Starting to listen")
+    query = StartListener().Listen(token)
+    if query:
+        print(f"user said: {query}")
+    return query
+
+def OpenFollowUp(seconds=FOLLOW_UP_SECONDS):
+    # Always-listening mode: the next utterance is taken without the wake word
+    # and comes out of WakeWordCommands() like any other command (mic button)
+    StartListener(always_on=True).OpenGate(seconds)
 
-text = takecommand()
+def WakeWordCommands(source=None, follow_up=FOLLOW_UP_SECONDS, on_wake=None):
+    # Always-listening mode: yields the command from every utterance addressed
+    # to the assistant. "Jarvis" on its own opens the gate for a follow-up.
+    # on_wake() is called as soon as the assistant is addressed (barge-in).
+    try:
+        from Backend.WakeWord import StripWakeWord
+    except ModuleNotFoundError:
+        from WakeWord import StripWakeWord
+    listener = StartListener(source, always_on=True)
+    acoustic = listener.gate is not None and listener.gate.acoustic
+    listener.Arm(continuous=True)
+    for text in listener.Results():
+        if not text:
+            continue
+        follow_up_open = time.monotonic() < listener.gate_open_until
+        # Without enrolled templates the wake word has to be in the recognized text
+        query = StripWakeWord(text, required=not (acoustic or follow_up_open))
+        if query is None:
+            continue
+        if on_wake:
+            on_wake()
+        if not query:
+            listener.OpenGate(follow_up)
+            speak("Yes?", PRIORITY_HIGH)
+            continue
+        listener.gate_open_until = 0.0
+        print(f"user said: {query}")
+        yield query
 
-speak(text)
\ No newline at end of file
+if __name__ == "__main__":
+    text = takecommand()
+    speak(text, block=True)
@@ -0,0 +1,115 @@
+from importlib import import_module
+import threading
+import builtins
+import time
+import sys
+
+# Startup instrumentation and lazy loading for Main.py.
+#
+# StartImportTimer() wraps __import__ so every module imported afterwards is
+# timed, like `python -X importtime` but inside the app: cumulative time
+# (including the modules it pulled in) and self time. Mark() records
+# milestones such as the window appearing and the first network client being
+# built, and StartupReport() prints both.
+#
+# LazyFunction("Backend.Model", "FirstLayerDMM") is a thin facade: the module
+# is only imported when the function is first called (or on Preload()), so
+# the heavy SDKs stay out of the way until the GUI is up.
+
+ProcessStart = time.perf_counter()
+ImportTimes = {}  # module -> [cumulative seconds, self seconds, nesting depth, import order]
+Milestones = []   # (name, seconds since start)
+TimerLock = threading.Lock()
+TimerThread = None
+OriginalImport = builtins.__import__
+ImportStack = []
+
+def TimedImport(name, globals=None, locals=None, fromlist=(), level=0):
+    # Only the thread that installed the timer is measured; its nesting gives self time
+    if threading.get_ident() != TimerThread or level or name in sys.modules:
+        return OriginalImport(name, globals, locals, fromlist, level)
+    started = time.perf_counter()
+    ImportStack.append(0.0)
+    try:
+        return OriginalImport(name, globals, locals, fromlist, level)
+    finally:
+        elapsed = time.perf_counter() - started
+        children = ImportStack.pop()
+        if ImportStack:
+            ImportStack[-1] += elapsed
+        with TimerLock:
+            if name not in ImportTimes:
+                ImportTimes[name] = [elapsed, elapsed - children, len(ImportStack), len(ImportTimes)]
+
+def StartImportTimer():
+    global TimerThread
+    if builtins.__import__ is TimedImport:
+        return
+    TimerThread = threading.get_ident()
+    builtins.__import__ = TimedImport
+
+def StopImportTimer():
+    if builtins.__import__ is TimedImport:
+        builtins.__import__ = OriginalImport
+
+def Mark(name):
+    # Records a milestone once; later calls with the same name are ignored
+    with TimerLock:
+        if not any(existing == name for existing, _ in Milestones):
+            Milestones.append((name, time.perf_counter() - ProcessStart))
+
+def MilestoneTime(name):
+    with TimerLock:
+        for existing, seconds in Milestones:
+            if existing == name:
+                return seconds
+    return None
+
+def StartupReport(top=25):
+    with TimerLock:
+        imports = sorted(ImportTimes.items(), key=lambda item: -item[1][0])
+        milestones = list(Milestones)
+    lines = ["[Startup] Imports by cumulative time (ms), nested imports indented:",
+             f"{'cumulative':>12}{'self':>10}  module"]
+    for name, (cumulative, own, depth, _) in imports[:top]:
+        lines.append(f"{cumulative * 1000:>12.1f}{own * 1000:>10.1f}  {'  ' * depth}{name}")
+    lines.append("[Startup] Milestones (ms since start):")
+    for name, seconds in milestones:
+        lines.append(f"{seconds * 1000:>12.1f}  {name}")
+    window = MilestoneTime("window shown")
+    client = min((s for n, s in milestones if n.startswith("client:")), default=None)
+    if window is not None:
+        if client is None or client > window:
+            lines.append("[Startup] No network client was built before the window appeared.")
+        else:
+            lines.append(f"[Startup] WARNING: a network client was built {(window - client) * 1000:.0f} ms before the window appeared.")
+    return "\n".join(lines)
+
+class LazyFunction:
+    def __init__(self, module, name):
+        self.module = module
+        self.name = name
+        self.function = None
+        self.lock = threading.Lock()
+
+    def Load(self):
+        if self.function is None:
+            with self.lock:
+                if self.function is None:
+                    self.function = getattr(import_module(self.module), self.name)
+        return self.function
+
+    def __call__(self, *args, **kwargs):
+        return self.Load()(*args, **kwargs)
+
+    def __repr__(self):
+        return f"<lazy {self.module}.{self.name}>"
+
+def Preload(*facades):
+    # Imports the modules behind the given facades, e.g. on a background thread once the GUI is up
+    for facade in facades:
+        try:
+            facade.Load()
+        except Exception as e:
+            print(f"[Startup] Unable to preload {facade.module}.{facade.name}: {e}")
+    Mark("backend preloaded")
@@ -0,0 +1,136 @@
+from queue import Queue
+import threading
+import time
+import re
+
+try:
+    from Backend.Tracing import RecordSpan
+    from Backend.Cancellation import Cancellable, CancelToken, TurnCancelled
+except ModuleNotFoundError:
+    from Tracing import RecordSpan
+    from Cancellation import Cancellable, CancelToken, TurnCancelled
+
+# Helpers for turning a streamed chat completion into events the frontend can use
+# while the model is still generating:
+#   ("delta", text)     - raw text as it arrives, for rendering partial answers
+#   ("sentence", text)  - each completed sentence, for starting speech early
+
+# A sentence ends at . ! or ? followed by whitespace, or at a line break.
+# "3.5" and "e.g.," stay intact because no whitespace follows the dot.
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n+")
+MIN_SENTENCE_CHARS = 12
+
+def StreamDeltas(completion, stage=None, started=None, token=None):
+    # Yields the text of every chunk of a Groq/OpenAI style streamed completion.
+    # With a stage name, time-to-first-token and total time are traced from
+    # started (taken just before the request was sent). Cancelling the token
+    # closes the HTTP stream from the cancelling thread, which ends the read.
+    started = started if started is not None else time.perf_counter()
+    token = Cancellable(token)
+    first = None
+    close = getattr(completion, "close", None)
+    detach = token.OnCancel(close) if close else lambda: None
+    try:
+        for chunk in completion:
+            token.Check()
+            if chunk.choices and chunk.choices[0].delta.content:
+                text = chunk.choices[0].delta.content.replace("</s>", "")
+                if text:
+                    if first is None:
+                        first = time.perf_counter()
+                        if stage:
+                            RecordSpan(f"{stage}.ttft", first - started)
+                    yield text
+        token.Check()
+    except Exception:
+        # A stream closed by a cancel fails with a connection error
+        token.Check()
+        raise
+    finally:
+        detach()
+        if stage:
+            RecordSpan(f"{stage}.total", time.perf_counter() - started, completed=first is not None, cancelled=token.cancelled)
+        # Closing the stream releases the HTTP connection if the consumer stops early
+        if close:
+            close()
+
+def SentenceEvents(deltas):
+    pending = ""
+    for text in deltas:
+        yield "delta", text
+        pending += text
+        start = 0
+        for match in SENTENCE_END.finditer(pending):
+            sentence = pending[start:match.start()].strip()
+            # Very short fragments ("1." in a list) are merged into the next sentence
+            if len(sentence) < MIN_SENTENCE_CHARS:
+                continue
+            yield "sentence", sentence
+            start = match.end()
+        pending = pending[start:]
+    if pending.strip():
+        yield "sentence", pending.strip()
+
+def CollectAnswer(events):
+    # Consumes an event stream and returns the full answer text
+    return "".join(text for kind, text in events if kind == "delta")
+
+# Runs an event stream on a background thread and buffers its events, so several
+# answers can be generated at once and still be replayed to the user in order.
+# StreamFactory(Query, token=...) must return a generator; its return value ends
+# up in result. The stream's own token is cancelled by Cancel() or by the turn's.
+STREAM_DONE = object()
+
+class BufferedStream:
+    def __init__(self, Query, StreamFactory, token=None):
+        self.Query = Query
+        self.events = Queue()
+        self.token = CancelToken(parent=token)
+        self.cancelled = self.token.event
+        # A cancel wakes up a consumer waiting in Events()
+        self.token.OnCancel(lambda: self.events.put(STREAM_DONE))
+        self.result = None
+        self.started = time.perf_counter()
+        self.finished = None
+        self.thread = threading.Thread(target=self.Run, args=(StreamFactory,), daemon=True)
+        self.thread.start()
+
+    def Run(self, StreamFactory):
+        stream = StreamFactory(self.Query, token=self.token)
+        try:
+            while not self.cancelled.is_set():
+                self.events.put(next(stream))
+        except StopIteration as stop:
+            self.result = stop.value
+        except TurnCancelled:
+            pass
+        except Exception as e:
+            print(f"[Streaming] Background stream error: {e}")
+        finally:
+            # Closing the generator also closes the underlying HTTP stream
+            stream.close()
+            self.finished = time.perf_counter()
+            self.events.put(STREAM_DONE)
+            self.token.Finish()
+
+    def Elapsed(self):
+        end = self.finished if self.finished is not None else time.perf_counter()
+        return end - self.started
+
+    def Cancel(self):
+        self.token.Cancel("stream cancelled")
+
+    def Events(self):
+        # Replays buffered events, then the rest of the stream as it arrives;
+        # raises TurnCancelled if the stream was cancelled before it finished
+        while True:
+            event = self.events.get()
+            if event is STREAM_DONE:
+                if self.cancelled.is_set() and self.result is None:
+                    raise TurnCancelled(self.token.reason)
+                return
+            yield event
+
+    def Wait(self):
+        self.thread.join()
+        return self.result
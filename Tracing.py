@@ -0,0 +1,209 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logging.handlers import RotatingFileHandler
+from contextlib import contextmanager
+from collections import defaultdict
+from dotenv import dotenv_values
+import threading
+import logging
+import math
+import glob
+import json
+import time
+import uuid
+import sys
+import os
+
+# Per-stage latency tracing for the voice pipeline.
+#
+# Every turn gets a trace ID from StartTrace(); the stages of that turn (listen,
+# recognize, decision, search, LLM time-to-first-token and total, speak,
+# automation, ...) are recorded as spans. Spans go to a rotating JSON-lines file
+# under Data/Traces and into in-memory histograms that are served as Prometheus
+# text on http://127.0.0.1:<TraceMetricsPort>/metrics.
+#
+#   python Tracing.py [--last N] [trace files...]
+# prints p50/p95/p99 per stage from the trace files.
+
+env_vars = dotenv_values(".env")
+TracingEnabled = (env_vars.get("TracingEnabled") or "True").lower() == "true"
+TraceMetricsPort = int(env_vars.get("TraceMetricsPort") or 9464)
+TRACE_FOLDER = os.path.join("Data", "Traces")
+TRACE_FILE = os.path.join(TRACE_FOLDER, "trace.jsonl")
+TraceFileMaxBytes = int(env_vars.get("TraceFileMaxBytes") or 5 * 1024 * 1024)
+TraceFileBackups = int(env_vars.get("TraceFileBackups") or 5)
+
+# Histogram bucket bounds in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Turns run one at a time, so the current trace ID is shared by every thread
+# working on the turn (background answer streams, the speech worker, ...).
+CurrentTrace = None
+Histograms = defaultdict(lambda: [0] * (len(BUCKETS) + 1))
+Totals = defaultdict(float)
+MetricsLock = threading.Lock()
+TraceLogger = None
+TraceLoggerLock = threading.Lock()
+
+def StartTrace():
+    global CurrentTrace
+    CurrentTrace = uuid.uuid4().hex[:12]
+    return CurrentTrace
+
+def CurrentTraceId():
+    return CurrentTrace
+
+def GetTraceLogger():
+    global TraceLogger
+    with TraceLoggerLock:
+        if TraceLogger is None:
+            os.makedirs(TRACE_FOLDER, exist_ok=True)
+            TraceLogger = logging.getLogger("jarvis.trace")
+            TraceLogger.setLevel(logging.INFO)
+            TraceLogger.propagate = False
+            handler = RotatingFileHandler(TRACE_FILE, maxBytes=TraceFileMaxBytes, backupCount=TraceFileBackups, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            TraceLogger.addHandler(handler)
+        return TraceLogger
+
+def RecordSpan(stage, seconds, trace_id=None, **attrs):
+    # Records an already measured duration, e.g. a time-to-first-token
+    if not TracingEnabled:
+        return
+    with MetricsLock:
+        counts = Histograms[stage]
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                counts[i] += 1
+                break
+        else:
+            counts[-1] += 1
+        Totals[stage] += seconds
+    span = {"trace": trace_id or CurrentTrace, "stage": stage, "ts": round(time.time(), 3), "ms": round(seconds * 1000, 2)}
+    if attrs:
+        span["attrs"] = attrs
+    try:
+        GetTraceLogger().info(json.dumps(span, ensure_ascii=False))
+    except OSError as e:
+        print(f"[Tracing] Unable to write span: {e}")
+
+@contextmanager
+def Span(stage, **attrs):
+    # with Span("search"): ...  records how long the block took
+    trace_id = CurrentTrace
+    started = time.perf_counter()
+    try:
+        yield attrs
+    except BaseException as e:
+        attrs["error"] = type(e).__name__
+        raise
+    finally:
+        RecordSpan(stage, time.perf_counter() - started, trace_id, **attrs)
+
+# --- Prometheus text exporter ---
+def MetricsText():
+    lines = [
+        "# HELP jarvis_stage_seconds Time spent in each stage of a voice turn.",
+        "# TYPE jarvis_stage_seconds histogram",
+    ]
+    with MetricsLock:
+        for stage in sorted(Histograms):
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ("+Inf",), Histograms[stage]):
+                cumulative += count
+                lines.append(f'jarvis_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'jarvis_stage_seconds_sum{{stage="{stage}"}} {Totals[stage]:.6f}')
+            lines.append(f'jarvis_stage_seconds_count{{stage="{stage}"}} {cumulative}')
+    return "\n".join(lines) + "\n"
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = MetricsText().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+MetricsServer = None
+
+def StartMetricsServer(port=TraceMetricsPort):
+    # Serves /metrics on localhost only; port 0 in .env turns the exporter off
+    global MetricsServer
+    if not TracingEnabled or not port or MetricsServer is not None:
+        return MetricsServer
+    try:
+        MetricsServer = ThreadingHTTPServer(("127.0.0.1", port), MetricsHandler)
+    except OSError as e:
+        print(f"[Tracing] Unable to start the metrics exporter on port {port}: {e}")
+        return None
+    threading.Thread(target=MetricsServer.serve_forever, daemon=True, name="MetricsExporter").start()
+    print(f"[Tracing] Metrics available at http://127.0.0.1:{port}/metrics")
+    return MetricsServer
+
+# --- Report ---
+def Percentile(values, fraction):
+    # Nearest-rank percentile of an already sorted list
+    index = max(0, min(len(values) - 1, math.ceil(fraction * len(values)) - 1))
+    return values[index]
+
+def LoadSpans(paths=None):
+    if not paths:
+        # Oldest rotated file first, the live file last
+        paths = sorted(glob.glob(TRACE_FILE + ".*"), key=lambda p: -int(p.rsplit(".", 1)[1]) if p.rsplit(".", 1)[1].isdigit() else 0)
+        paths.append(TRACE_FILE)
+    spans = []
+    for path in paths:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        spans.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        continue
+        except FileNotFoundError:
+            continue
+    return spans
+
+def StageReport(spans):
+    durations = defaultdict(list)
+    for span in spans:
+        durations[span["stage"]].append(span["ms"])
+    report = {}
+    for stage, values in durations.items():
+        values.sort()
+        report[stage] = {
+            "count": len(values),
+            "p50": Percentile(values, 0.50),
+            "p95": Percentile(values, 0.95),
+            "p99": Percentile(values, 0.99),
+            "max": values[-1],
+        }
+    return report
+
+def PrintReport(report):
+    print(f"{'stage':<24}{'count':>8}{'p50 ms':>12}{'p95 ms':>12}{'p99 ms':>12}{'max ms':>12}")
+    for stage in sorted(report):
+        row = report[stage]
+        print(f"{stage:<24}{row['count']:>8}{row['p50']:>12.1f}{row['p95']:>12.1f}{row['p99']:>12.1f}{row['max']:>12.1f}")
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    last = None
+    if len(args) >= 2 and args[0] == "--last":
+        last = int(args[1])
+        args = args[2:]
+    spans = LoadSpans(args)
+    if last:
+        # Only the spans of the last N turns
+        traces = list(dict.fromkeys(span.get("trace") for span in spans))[-last:]
+        spans = [span for span in spans if span.get("trace") in set(traces)]
+    if not spans:
+        print("[Tracing] No spans found.")
+    else:
+        PrintReport(StageReport(spans))
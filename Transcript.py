@@ -0,0 +1,104 @@
+from dotenv import dotenv_values
+import threading
+import shutil
+import json
+import os
+import sys
+
+try:
+    from Backend.ChatStore import ChatStore, LoadMessageRange, MessageCount
+    from Backend.Formatting import AnswerModifier
+except ModuleNotFoundError:
+    from ChatStore import ChatStore, LoadMessageRange, MessageCount
+    from Formatting import AnswerModifier
+
+# Pre-formatted transcript of the chat log for the chat view.
+#
+# Every chat log message is formatted once ("Name : text") and kept in its own
+# append-only store under Data\Transcript, with the same segment and offset
+# index layout as the chat log, so the view can read any page by seeking.
+# Sync() only formats the messages appended to the chat log since the last
+# sync, i.e. the tail of the last turn; at startup that is usually nothing.
+# The snapshot is rebuilt from scratch when the names or the format change,
+# or when the chat log is shorter than the snapshot (it was cleared).
+
+env_vars = dotenv_values(".env")
+Username = env_vars.get("Username")
+Assistantname = env_vars.get("Assistantname")
+TRANSCRIPT_FOLDER = os.path.join("Data", "Transcript")
+FORMAT_FILE = "format.json"
+FORMAT_VERSION = 1
+SYNC_BATCH = 1000
+
+def FormatMessage(entry):
+    # Only the speaker prefix is replaced; the message text is left as it is
+    if entry["role"] == "user":
+        return f"{Username} : {entry['content'].strip()}"
+    return f"{Assistantname} : {AnswerModifier(entry['content'])}"
+
+class TranscriptSnapshot:
+    def __init__(self, folder=TRANSCRIPT_FOLDER):
+        self.folder = folder
+        self.lock = threading.RLock()
+        self.format = {"version": FORMAT_VERSION, "user": Username, "assistant": Assistantname}
+        self.store = self.Open()
+
+    def Open(self):
+        path = os.path.join(self.folder, FORMAT_FILE)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                current = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            current = None
+        if current != self.format:
+            # Written with other names or an older format: start over
+            shutil.rmtree(self.folder, ignore_errors=True)
+            os.makedirs(self.folder, exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(self.format, f)
+        # A cache can be rebuilt, so appends aren't fsynced
+        return ChatStore(self.folder, fsync=False)
+
+    def Sync(self):
+        # Formats and appends the chat log messages the snapshot doesn't have yet
+        with self.lock:
+            total = MessageCount()
+            done = self.store.Count()
+            if done > total:
+                print(f"[Transcript] Chat log has {total} messages but the snapshot {done}; rebuilding")
+                shutil.rmtree(self.folder, ignore_errors=True)
+                self.store = self.Open()
+                done = 0
+            for start in range(done, total, SYNC_BATCH):
+                stop = min(total, start + SYNC_BATCH)
+                self.store.AppendMany({"text": FormatMessage(entry)} for entry in LoadMessageRange(start, stop))
+            return total - done
+
+    def Count(self):
+        with self.lock:
+            return self.store.Count()
+
+    def LoadRange(self, start, stop):
+        with self.lock:
+            return [record["text"] for record in self.store.LoadRange(start, stop)]
+
+Snapshot = None
+SnapshotLock = threading.Lock()
+
+def GetTranscript():
+    # The snapshot, brought up to date with the chat log
+    global Snapshot
+    with SnapshotLock:
+        if Snapshot is None:
+            Snapshot = TranscriptSnapshot()
+    added = Snapshot.Sync()
+    if added:
+        print(f"[Transcript] Formatted {added} new messages")
+    return Snapshot
+
+if __name__ == "__main__":
+    transcript = GetTranscript()
+    count = transcript.Count()
+    last = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    for text in transcript.LoadRange(max(0, count - last), count):
+        print(text)
@@ -0,0 +1,236 @@
+from dotenv import dotenv_values
+import speech_recognition as sr
+import numpy as np
+import shutil
+import glob
+import time
+import sys
+import os
+import re
+
+# Always-listening front end: a cheap voice activity detector and a local
+# wake-word spotter that decide which utterances are worth sending to Google.
+#
+# VoiceActivityDetector classifies each audio chunk from its energy against an
+# adaptive noise floor, the share of energy in the speech band and the
+# spectral flatness, with a short hangover so word gaps don't end a phrase.
+# It replaces the plain energy threshold of the MicrophoneListener.
+#
+# WakeWordGate compares the start of each utterance against enrolled
+# recordings of the assistant name (log-mel features, subsequence DTW). With
+# no recordings enrolled every voiced utterance passes the gate and the
+# recognized text has to start with the assistant name instead.
+#
+#   python WakeWord.py enroll jarvis1.wav jarvis2.wav ...
+#   python WakeWord.py bench Fixtures/   (Fixtures/positive/*.wav, Fixtures/negative/*.wav)
+
+env_vars = dotenv_values(".env")
+Assistantname = (env_vars.get("Assistantname") or "jarvis").lower()
+WakeWordThreshold = float(env_vars.get("WakeWordThreshold") or 0)  # 0: derived from the templates
+TEMPLATE_FOLDER = os.path.join("Data", "WakeWord")
+
+FRAME_SECONDS = 0.025
+HOP_SECONDS = 0.010
+MEL_BANDS = 24
+DYNAMIC_RANGE = np.log(10 ** 4)  # 40 dB
+KWS_WINDOW = 2.0  # seconds from the start of an utterance searched for the wake word
+
+def Samples(data, width=2):
+    # 16-bit PCM bytes -> float32 samples
+    if width != 2:
+        raise ValueError("The wake word front end expects 16-bit audio")
+    return np.frombuffer(data[:len(data) // 2 * 2], dtype="<i2").astype(np.float32)
+
+class VoiceActivityDetector:
+    def __init__(self, energy_ratio=3.0, min_band_ratio=0.4, max_flatness=0.5, hangover=0.3, rate=16000):
+        self.energy_ratio = energy_ratio
+        self.min_band_ratio = min_band_ratio
+        self.max_flatness = max_flatness
+        self.hangover = hangover
+        self.rate = rate
+        self.noise = None
+        self.hold = 0.0
+        self.window = None
+        self.band = None
+
+    def IsSpeech(self, data, width=2):
+        x = Samples(data, width)
+        if not len(x):
+            return False
+        if self.window is None or len(self.window) != len(x):
+            self.window = np.hanning(len(x)).astype(np.float32)
+            freqs = np.fft.rfftfreq(len(x), 1.0 / self.rate)
+            self.band = (freqs >= 300) & (freqs <= 3400)
+        energy = float(np.mean(x * x)) + 1e-3
+        spectrum = np.abs(np.fft.rfft(x * self.window)) ** 2 + 1e-10
+        band_ratio = float(spectrum[self.band].sum() / spectrum.sum())
+        flatness = float(np.exp(np.mean(np.log(spectrum))) / np.mean(spectrum))
+        if self.noise is None:
+            self.noise = energy
+        voiced = energy > self.noise * self.energy_ratio and band_ratio >= self.min_band_ratio and flatness <= self.max_flatness
+        seconds = len(x) / self.rate
+        if voiced:
+            self.hold = self.hangover
+            return True
+        # The noise floor follows quiet audio quickly and loud non-speech slowly
+        rate = 0.3 if energy < self.noise else 0.02
+        self.noise += (energy - self.noise) * rate
+        if self.hold > 0:
+            self.hold -= seconds
+            return True
+        return False
+
+def MelFilterbank(rate, nfft, bands=MEL_BANDS, low=80.0, high=None):
+    high = high or rate / 2
+    mel = lambda f: 2595 * np.log10(1 + f / 700)
+    hz = lambda m: 700 * (10 ** (m / 2595) - 1)
+    points = hz(np.linspace(mel(low), mel(high), bands + 2))
+    bins = np.floor((nfft + 1) * points / rate).astype(int)
+    filters = np.zeros((bands, nfft // 2 + 1), dtype=np.float32)
+    for i in range(bands):
+        left, center, right = bins[i], bins[i + 1], bins[i + 2]
+        if center > left:
+            filters[i, left:center] = (np.arange(left, center) - left) / (center - left)
+        if right > center:
+            filters[i, center:right] = (right - np.arange(center, right)) / (right - center)
+    return filters
+
+FilterCache = {}
+
+def LogMelFeatures(samples, rate):
+    frame = int(rate * FRAME_SECONDS)
+    hop = int(rate * HOP_SECONDS)
+    if len(samples) < frame:
+        return np.zeros((0, MEL_BANDS), dtype=np.float32)
+    nfft = 1 << (frame - 1).bit_length()
+    frames = np.lib.stride_tricks.sliding_window_view(samples, frame)[::hop] * np.hamming(frame)
+    power = np.abs(np.fft.rfft(frames, nfft)) ** 2
+    key = (rate, nfft)
+    if key not in FilterCache:
+        FilterCache[key] = MelFilterbank(rate, nfft)
+    features = np.log(power @ FilterCache[key].T + 1e-6)
+    # Bands more than DYNAMIC_RANGE below the loudest are noise; flooring them keeps
+    # a quiet recording and a noisy room from looking different
+    features = np.maximum(features, features.max() - DYNAMIC_RANGE)
+    # Per-frame mean removal makes the features independent of the speaking volume
+    # and, unlike utterance-wide normalisation, of what else is in the window
+    return features - features.mean(axis=1, keepdims=True)
+
+def SubsequenceDtw(template, utterance):
+    # Cost of the best match of the whole template anywhere inside the utterance:
+    # RMS difference per mel band, averaged over the template frames
+    n, m = len(template), len(utterance)
+    if not n or not m:
+        return float("inf")
+    cost = np.sqrt(((template[:, None, :] - utterance[None, :, :]) ** 2).mean(axis=2))
+    previous = np.concatenate(([0.0], np.zeros(m)))
+    for i in range(n):
+        current = np.full(m + 1, np.inf)
+        row = cost[i]
+        for j in range(1, m + 1):
+            current[j] = row[j - 1] + min(previous[j], previous[j - 1], current[j - 1])
+        previous = current
+    return float(previous[1:].min() / n)
+
+def LoadAudio(path):
+    with sr.AudioFile(path) as source:
+        audio = sr.Recognizer().record(source)
+    return Samples(audio.get_raw_data(convert_width=2), 2), audio.sample_rate
+
+def TrimSilence(samples, rate, floor=0.1):
+    # Cuts an enrolled recording down to the part that is louder than floor * its peak
+    hop = int(rate * HOP_SECONDS)
+    if len(samples) < hop:
+        return samples
+    energy = np.sqrt(np.mean(samples[:len(samples) // hop * hop].reshape(-1, hop) ** 2, axis=1))
+    loud = np.nonzero(energy > energy.max() * floor)[0]
+    return samples[loud[0] * hop:(loud[-1] + 1) * hop]
+
+class WakeWordGate:
+    def __init__(self, folder=TEMPLATE_FOLDER, threshold=WakeWordThreshold):
+        self.templates = []
+        self.last_distance = None
+        for path in sorted(glob.glob(os.path.join(folder, "*.wav"))):
+            samples, rate = LoadAudio(path)
+            self.templates.append((rate, LogMelFeatures(TrimSilence(samples, rate), rate)))
+        # Without a configured threshold, accept anything about as close as the
+        # enrolled recordings are to each other
+        spread = [SubsequenceDtw(a, b) for i, (_, a) in enumerate(self.templates)
+                  for j, (_, b) in enumerate(self.templates) if i != j]
+        self.threshold = threshold or (max(spread) * 1.2 if spread else 1.0)
+        if self.templates:
+            print(f"[WakeWord] Loaded {len(self.templates)} wake word templates, threshold {self.threshold:.2f}")
+
+    @property
+    def acoustic(self):
+        return bool(self.templates)
+
+    def Distance(self, audio):
+        samples = Samples(audio.get_raw_data(convert_width=2), 2)
+        samples = samples[:int(audio.sample_rate * KWS_WINDOW)]
+        features = LogMelFeatures(samples, audio.sample_rate)
+        return min(SubsequenceDtw(template, features) for rate, template in self.templates)
+
+    def __call__(self, audio):
+        # True if the utterance should go to speech recognition
+        if not self.templates:
+            return True
+        self.last_distance = self.Distance(audio)
+        return self.last_distance <= self.threshold
+
+def StripWakeWord(text, required=True):
+    # "jarvis what's the time" -> "what's the time"; None if the name is required but missing
+    words = text.lower().split()
+    for index, word in enumerate(words[:3]):
+        if re.sub(r"[^a-z]", "", word) == Assistantname:
+            return " ".join(words[index + 1:]).strip(" ,")
+    return None if required else text.strip()
+
+def Enroll(paths, folder=TEMPLATE_FOLDER):
+    os.makedirs(folder, exist_ok=True)
+    for path in paths:
+        target = os.path.join(folder, os.path.basename(path))
+        shutil.copyfile(path, target)
+        print(f"[WakeWord] Enrolled {target}")
+
+def Benchmark(fixtures):
+    # Runs every fixture through the same listener, VAD and gate as the live mode
+    try:
+        from Backend.Listener import MicrophoneListener
+    except ModuleNotFoundError:
+        from Listener import MicrophoneListener
+    gate = WakeWordGate()
+    results = {"positive": [0, 0], "negative": [0, 0]}  # [files, accepted]
+    audio_seconds = 0.0
+    cpu_started = time.process_time()
+    for label in results:
+        for path in sorted(glob.glob(os.path.join(fixtures, label, "*.wav"))):
+            listener = MicrophoneListener(sr.AudioFile(path), recognize=None, listen_timeout=0,
+                                          vad=VoiceActivityDetector(), gate=gate)
+            gate.last_distance = None
+            listener.Arm(continuous=True)
+            listener.start()
+            accepted = sum(1 for _ in listener.Results())
+            audio_seconds += listener.frames * listener.seconds_per_chunk if listener.frames else 0.0
+            results[label][0] += 1
+            results[label][1] += 1 if accepted else 0
+            distance = f" distance={gate.last_distance:.2f}" if gate.last_distance is not None else ""
+            print(f"[WakeWord] {label:<8} {'accepted' if accepted else 'rejected'}  {os.path.basename(path)}{distance}")
+    cpu = time.process_time() - cpu_started
+    positives, accepted_positives = results["positive"]
+    negatives, accepted_negatives = results["negative"]
+    print(f"\nAudio: {audio_seconds:.1f}s  CPU: {cpu:.2f}s  = {100 * cpu / audio_seconds if audio_seconds else 0:.1f}% of one core in real time")
+    print(f"False rejects: {positives - accepted_positives}/{positives}"
+          f" ({(positives - accepted_positives) / positives if positives else 0:.1%})")
+    print(f"False accepts: {accepted_negatives}/{negatives}"
+          f" ({accepted_negatives / negatives if negatives else 0:.1%})")
+    if not gate.acoustic:
+        print("No wake word templates are enrolled, so only the VAD was measured.")
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 3 and sys.argv[1] == "enroll":
+        Enroll(sys.argv[2:])
+    elif len(sys.argv) == 3 and sys.argv[1] == "bench":
+        Benchmark(sys.argv[2])
+    else:
+        print("usage: python WakeWord.py enroll file.wav ... | bench fixtures_folder")